@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import FinancialReport, FinancialData, RiskComparison, FinancialRatio,Exchange, Security, DividendData, PriceData
+from .models import FinancialReport, FinancialData, RiskComparison, FinancialRatio,Exchange, Security, DividendData, PriceData, \
+    SavedScreen, SavedScreenEvent
 
 admin.site.register(FinancialReport)
 admin.site.register(FinancialData)
@@ -9,3 +10,5 @@ admin.site.register(Exchange)
 admin.site.register(Security)
 admin.site.register(DividendData)
 admin.site.register(PriceData)
+admin.site.register(SavedScreen)
+admin.site.register(SavedScreenEvent)
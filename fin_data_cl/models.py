@@ -1,5 +1,6 @@
 from django.db import models
 from django.db.models import Manager
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from finriv.utils.exchanges import ExchangeRegistry
@@ -124,6 +125,12 @@ class Security(models.Model):
 
     objects = SecurityManager()
 
+    def get_latest_price(self):
+        """Latest close price, None if the security has no prices"""
+        return self.pricedata_data.filter(
+            close_price__isnull=False
+        ).order_by('-date').values_list('close_price', flat=True).first()
+
     def get_analysis_data(self, start_date, end_date):
         """Get all analysis data for a security in date range"""
         price_data = self.pricedata_set.filter(
@@ -310,3 +317,60 @@ class DividendData(BaseFinancialData):
         (2, 'Type 2'),
         (3, 'Type 3')
     ])
+
+
+class SavedScreen(models.Model):
+    """
+    Screener query saved by a user. Its results are kept up to date after each
+    ratio run (see fin_data_cl.utils.saved_screens) instead of being re-run on
+    every visit.
+    """
+    user = models.ForeignKey(User, related_name='saved_screens', on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    filters = models.JSONField(default=list, help_text="'ratio:operator:value' filter strings")
+    exchange = models.ForeignKey(
+        Exchange,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        help_text="Restrict the screen to one exchange"
+    )
+    notify = models.BooleanField(default=False, help_text="Include new entries in the email digest")
+    ratio_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Ratio snapshot version the stored results reflect"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.user})"
+
+
+class SavedScreenResult(models.Model):
+    """Security currently passing a saved screen."""
+    screen = models.ForeignKey(SavedScreen, related_name='results', on_delete=models.CASCADE)
+    security = models.ForeignKey(Security, on_delete=models.CASCADE)
+    since = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('screen', 'security')
+
+
+class SavedScreenEvent(models.Model):
+    """Security entering or leaving a saved screen's results."""
+    ENTRY = 'entry'
+    EXIT = 'exit'
+
+    screen = models.ForeignKey(SavedScreen, related_name='events', on_delete=models.CASCADE)
+    security = models.ForeignKey(Security, on_delete=models.CASCADE)
+    event_type = models.CharField(max_length=10, choices=[(ENTRY, 'Entry'), (EXIT, 'Exit')])
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['notified', 'event_type'])]
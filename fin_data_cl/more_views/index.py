@@ -1,13 +1,17 @@
 # more_views/index.py
 from django.shortcuts import render
-from django.db.models import F, ExpressionWrapper, FloatField, Count, Case, When, Value
+from django.db.models import F, Window
+from django.db.models.functions import Lag
 from datetime import timedelta
-from fin_data_cl.models import PriceData, Security
+from fin_data_cl.models import PriceData
+from fin_data_cl.utils.trading_calendar import get_trading_calendar, PRICE_DATA_VERSION
 from django.conf import settings
-from django.db.models import Subquery, OuterRef
-from django.core.cache import cache
+from finriv.utils.cache import get_or_compute, get_version
 from functools import lru_cache
-import hashlib
+
+MARKET_SNAPSHOT_TIMEOUT = getattr(settings, 'MARKET_SNAPSHOT_TIMEOUT', 60 * 60)
+TIMEFRAME_LABELS = {'D': 'Daily', 'W': 'Weekly', 'M': 'Monthly'}
+
 @lru_cache(maxsize=1)
 def get_analysis_tools():
     return [
@@ -34,115 +38,6 @@ def get_analysis_tools():
     ]
 
 
-def get_cached_price_data(date, timeframe):
-    """Cache price data for frequently accessed dates and timeframes."""
-    cache_key = f'price_data_{date.isoformat()}_{timeframe}'
-    cached_data = cache.get(cache_key)
-
-    if cached_data:
-        return cached_data
-
-    previous_date = get_previous_date(date, timeframe)
-
-    # Optimize query by selecting only needed fields
-    latest_prices = (PriceData.objects
-    .filter(date=date)
-    .select_related('security')
-    .only('security__ticker', 'close_price', 'date')
-    .annotate(
-        previous_close=Subquery(
-            PriceData.objects
-            .filter(
-                security_id=OuterRef('security_id'),
-                date=previous_date
-            )
-            .values('close_price')[:1]
-        )
-    )
-    .annotate(
-        price_change=Case(
-            When(
-                previous_close__isnull=False,
-                previous_close__gt=0,
-                then=ExpressionWrapper(
-                    (F('close_price') - F('previous_close')) / F('previous_close') * 100,
-                    output_field=FloatField()
-                )
-            ),
-            default=Value(0.0),
-            output_field=FloatField(),
-        )
-    ))
-
-    # Cache for 5 minutes (adjust as needed)
-    cache.set(cache_key, latest_prices, 300)
-    return latest_prices
-
-
-def calculate_market_breadth(queryset):
-    """Calculate market breadth statistics from price data."""
-    market_stats = queryset.aggregate(
-        gainers=Count(Case(
-            When(daily_change__gt=0, then=1),
-        )),
-        losers=Count(Case(
-            When(daily_change__lt=0, then=1),
-        )),
-        unchanged=Count(Case(
-            When(daily_change=0, then=1),
-        ))
-    )
-
-    total = sum(market_stats.values())
-
-    if total == 0:
-        return {
-            'gainers': 0, 'losers': 0, 'unchanged': 0,
-            'gainers_percentage': 0,
-            'losers_percentage': 0,
-            'unchanged_percentage': 0,
-            'total': 0
-        }
-
-    return {
-        'gainers': market_stats['gainers'],
-        'losers': market_stats['losers'],
-        'unchanged': market_stats['unchanged'],
-        'gainers_percentage': (market_stats['gainers'] / total) * 100,
-        'losers_percentage': (market_stats['losers'] / total) * 100,
-        'unchanged_percentage': (market_stats['unchanged'] / total) * 100,
-        'total': total
-    }
-
-
-def get_top_movers(queryset, limit=5):
-    """Get top gainers and losers from price data."""
-    gainers = queryset.order_by('-daily_change')[:limit]
-    losers = queryset.order_by('daily_change')[:limit]
-
-    def format_mover(x):
-        try:
-            change = x.daily_change if x.daily_change is not None else 0.0
-            price = x.close_price if x.close_price is not None else 0.0
-            return {
-                'symbol': x.security.ticker,
-                'change': f"{change:+.2f}%",
-                'price': f"${price:.2f}"
-            }
-        except Exception as e:
-            # Provide default values if formatting fails
-            return {
-                'symbol': x.security.ticker,
-                'change': "0.00%",
-                'price': "$0.00"
-            }
-
-    return (
-        [format_mover(g) for g in gainers],
-        [format_mover(l) for l in losers]
-    )
-
-
 def get_previous_date(current_date, timeframe):
     """
     Calculate the reference date for price comparison based on timeframe.
@@ -157,150 +52,120 @@ def get_previous_date(current_date, timeframe):
     else:  # Monthly
         target_date = current_date - timedelta(days=30)
 
-    # Get the most recent trading day not exceeding our target date
-    return (PriceData.objects
-    .filter(date__lte=target_date)
-    .order_by('-date')
-    .values('date')
-    .first()['date'])
+    # Most recent trading day not exceeding our target date
+    return get_trading_calendar().session_on_or_before(target_date)
 
 
-def get_latest_trading_data(timeframe='D'):
+def get_price_changes(latest_date, previous_date):
     """
-    Get market data and calculate price changes based on the selected timeframe.
-    Supports daily (D), weekly (W), and monthly (M) comparisons.
+    Percentage change of every security between previous_date and latest_date.
+
+    Both dates are read in a single query; LAG over date partitioned by security
+    pairs each latest close with the same security's previous close.
+    Returns a list of (ticker, close_price, change) tuples.
     """
-    latest_data = (PriceData.objects
-                   .select_related('security')
-                   .order_by('-date')
-                   .first())
+    dates = [latest_date] if previous_date is None else [previous_date, latest_date]
+    rows = (PriceData.objects
+            .filter(date__in=dates)
+            .annotate(previous_close=Window(
+                expression=Lag('close_price'),
+                partition_by=[F('security_id')],
+                order_by=F('date').asc(),
+            ))
+            .values_list('security__ticker', 'date', 'close_price', 'previous_close'))
+
+    changes = []
+    for ticker, date, close_price, previous_close in rows:
+        if date != latest_date or close_price is None:
+            continue
+        if previous_close is not None and previous_close > 0:
+            change = float((close_price - previous_close) / previous_close * 100)
+        else:
+            change = 0.0
+        changes.append((ticker, float(close_price), change))
+    return changes
+
+
+def calculate_market_breadth(changes):
+    """Calculate market breadth statistics from (ticker, price, change) tuples."""
+    gainers = sum(1 for _, _, change in changes if change > 0)
+    losers = sum(1 for _, _, change in changes if change < 0)
+    unchanged = len(changes) - gainers - losers
+    total = len(changes)
 
-    if not latest_data:
-        return None, None, None
+    return {
+        'gainers': gainers,
+        'losers': losers,
+        'unchanged': unchanged,
+        'gainers_percentage': (gainers / total * 100) if total > 0 else 0,
+        'losers_percentage': (losers / total * 100) if total > 0 else 0,
+        'unchanged_percentage': (unchanged / total * 100) if total > 0 else 0,
+        'total': total
+    }
 
-    latest_date = latest_data.date
-    previous_date = get_previous_date(latest_date, timeframe)
 
-    # Get price changes comparing current close to previous period's close
-    latest_prices = (PriceData.objects
-    .filter(date=latest_date)
-    .select_related('security')
-    .annotate(
-        previous_close=Subquery(
-            PriceData.objects
-            .filter(
-                security_id=OuterRef('security_id'),
-                date=previous_date
-            )
-            .values('close_price')[:1]
-        )
-    )
-    .annotate(
-        daily_change=Case(
-            When(
-                previous_close__isnull=False,
-                previous_close__gt=0,
-                then=ExpressionWrapper(
-                    (F('close_price') - F('previous_close')) / F('previous_close') * 100,
-                    output_field=FloatField()
-                )
-            ),
-            default=Value(0.0),
-            output_field=FloatField(),
-        )
-    ))
+def get_top_movers(changes, limit=5):
+    """Get top gainers and losers from (ticker, price, change) tuples."""
+    format_mover = lambda x: {
+        'symbol': x[0],
+        'change': f"{x[2]:+.2f}%",
+        'price': f"${x[1]:.2f}"
+    }
+    ranked = sorted(changes, key=lambda x: x[2])
 
-    timeframe_text = {
-        'D': 'Daily',
-        'W': 'Weekly',
-        'M': 'Monthly'
-    }[timeframe]
+    return (
+        [format_mover(g) for g in ranked[::-1][:limit]],
+        [format_mover(l) for l in ranked[:limit]]
+    )
 
-    return latest_date, latest_prices, f"{timeframe_text} Change - {latest_date.strftime('%B %d, %Y')}"
 
+def build_market_snapshot(latest_date, timeframe):
+    """
+    Compute everything the dashboard shows for a trading date and timeframe.
+    The result only holds plain values so it can be cached and served as is.
+    """
+    previous_date = get_previous_date(latest_date, timeframe)
+    changes = get_price_changes(latest_date, previous_date)
+    gainers, losers = get_top_movers(changes)
 
-def calculate_market_stats(prices_queryset):
-    """Calculate market statistics with a single query."""
-    query_str = str(prices_queryset.query)
-    cache_key = 'market_stats_' + hashlib.md5(query_str.encode('utf-8')).hexdigest()
-    cached_stats = cache.get(cache_key)
+    return {
+        'date': latest_date,
+        'previous_date': previous_date,
+        'market_breadth': calculate_market_breadth(changes),
+        'top_gainers': gainers,
+        'bottom_performers': losers,
+    }
 
-    if cached_stats:
-        return cached_stats
 
-    stats = prices_queryset.aggregate(
-        gainers=Count(Case(When(price_change__gt=0, then=1))),
-        losers=Count(Case(When(price_change__lt=0, then=1))),
-        unchanged=Count(Case(When(price_change=0, then=1)))
+def get_market_snapshot(latest_date, timeframe):
+    """Market snapshot from the shared cache, computed once per date and timeframe."""
+    version = get_version(PRICE_DATA_VERSION)
+    return get_or_compute(
+        f'market_snapshot_{latest_date.isoformat()}_{timeframe}_{version}',
+        lambda: build_market_snapshot(latest_date, timeframe),
+        MARKET_SNAPSHOT_TIMEOUT
     )
 
-    total = sum(stats.values())
-
-    market_breadth = {
-        'gainers': stats['gainers'],
-        'losers': stats['losers'],
-        'unchanged': stats['unchanged'],
-        'gainers_percentage': (stats['gainers'] / total * 100) if total > 0 else 0,
-        'losers_percentage': (stats['losers'] / total * 100) if total > 0 else 0,
-        'unchanged_percentage': (stats['unchanged'] / total * 100) if total > 0 else 0
-    }
-
-    cache.set(cache_key, market_breadth, 300)
-    return market_breadth
-
 
 def index(request):
     try:
         timeframe = request.GET.get('timeframe', 'D')
-        if timeframe not in ['D', 'W', 'M']:
+        if timeframe not in TIMEFRAME_LABELS:
             timeframe = 'D'
 
-        # Get latest date from cache or database
-        latest_date_key = 'latest_trading_date'
-        latest_date = cache.get(latest_date_key)
-
+        latest_date = get_trading_calendar().latest_session()
         if not latest_date:
-            latest_data = PriceData.objects.valid().order_by('-date').first()
-            if not latest_data:
-                return render(request, 'index.html', {
-                    'error': 'No valid price data available'
-                })
-            latest_date = latest_data.date
-            cache.set(latest_date_key, latest_date, 300)
-
-        # Get price data with caching
-        latest_prices = get_cached_price_data(latest_date, timeframe)
-
-        # Calculate market statistics
-        market_breadth = calculate_market_stats(latest_prices)
-
-        # Get top movers efficiently
-        movers_cache_key = f'top_movers_{latest_date.isoformat()}_{timeframe}'
-        top_movers = cache.get(movers_cache_key)
-
-        if not top_movers:
-            gainers = latest_prices.order_by('-price_change')[:5]
-            losers = latest_prices.order_by('price_change')[:5]
-
-            format_mover = lambda x: {
-                'symbol': x.security.ticker,
-                'change': f"{x.price_change:+.2f}%",
-                'price': f"${x.close_price:.2f}"
-            }
-
-            top_movers = {
-                'gainers': [format_mover(g) for g in gainers],
-                'losers': [format_mover(l) for l in losers]
-            }
-            cache.set(movers_cache_key, top_movers, 300)
+            return render(request, 'index.html', {
+                'error': 'No valid price data available'
+            })
 
-        period_map = {'D': 'Daily', 'W': 'Weekly', 'M': 'Monthly'}
+        snapshot = get_market_snapshot(latest_date, timeframe)
 
         context = {
-            'formatted_date': f"{period_map[timeframe]} Change - {latest_date.strftime('%B %d, %Y')}",
-            'market_breadth': market_breadth,
-            'top_gainers': top_movers['gainers'],
-            'bottom_performers': top_movers['losers'],
+            'formatted_date': f"{TIMEFRAME_LABELS[timeframe]} Change - {latest_date.strftime('%B %d, %Y')}",
+            'market_breadth': snapshot['market_breadth'],
+            'top_gainers': snapshot['top_gainers'],
+            'bottom_performers': snapshot['bottom_performers'],
             'analysis_tools': get_analysis_tools(),
             'api_base_url': settings.API_BASE_URL,
             'current_timeframe': timeframe
@@ -311,4 +176,4 @@ def index(request):
     except Exception as e:
         return render(request, 'index.html', {
             'error': f'Error loading market data: {str(e)}'
-        })
\ No newline at end of file
+        })
@@ -3,8 +3,9 @@ from rest_framework import serializers
 from .models import (
     Exchange, Security, FinancialData, PriceData,
     FinancialRatio, FinancialReport, RiskComparison,
-    DividendData
+    DividendData, SavedScreen, SavedScreenEvent
 )
+from .utils.screener_engine import parse_filters
 from fin_data_cl.templatetags.text_filters import format_subsection
 
 
@@ -232,4 +233,36 @@ class DividendDataSerializer(BaseFinancialSerializer):
                 return float(obj.amount / latest_price * 100)
         except PriceData.DoesNotExist:
             pass
-        return None
\ No newline at end of file
+        return None
+
+
+class SavedScreenSerializer(serializers.ModelSerializer):
+    """
+    Saved screener query. Filters use the screener syntax 'ratio:operator:value'.
+    """
+    result_count = serializers.IntegerField(source='results.count', read_only=True)
+
+    class Meta:
+        model = SavedScreen
+        fields = [
+            'id', 'name', 'filters', 'exchange', 'notify',
+            'result_count', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['created_at', 'updated_at']
+
+    def validate_filters(self, value):
+        if not isinstance(value, list) or not value:
+            raise serializers.ValidationError("Provide a non-empty list of filters")
+        invalid = [item for item in value if not isinstance(item, str) or not parse_filters([item])]
+        if invalid:
+            raise serializers.ValidationError(f"Invalid filters: {invalid}")
+        return value
+
+
+class SavedScreenEventSerializer(serializers.ModelSerializer):
+    ticker = serializers.CharField(source='security.ticker', read_only=True)
+    full_symbol = serializers.CharField(source='security.full_symbol', read_only=True)
+
+    class Meta:
+        model = SavedScreenEvent
+        fields = ['id', 'ticker', 'full_symbol', 'event_type', 'created_at']
@@ -3,6 +3,7 @@
 from django.core.management import call_command
 from django.db import connection
 from django_q.models import Schedule, Task
+from django_q.tasks import async_task
 from django.utils import timezone
 import logging
 
@@ -50,7 +51,56 @@ def update_price_data(exchange='SCL'):
         logger.info(f"Starting price update for exchange: {exchange}")
         call_command('price_update', exchange=exchange)
         logger.info(f"Successfully updated prices for {exchange}")
-        return f"Successfully updated prices for {exchange}"
     except Exception as e:
         logger.error(f"Error updating prices for {exchange}: {str(e)}")
-        return f"Error updating prices for {exchange}: {str(e)}"
\ No newline at end of file
+        return f"Error updating prices for {exchange}: {str(e)}"
+
+    # Snapshots and risk estimates use the closes just ingested, snapshots in their own task
+    async_task('fin_data_cl.tasks.snapshot_portfolios')
+    precompute_covariances()
+    refresh_correlations()
+    return f"Successfully updated prices for {exchange}"
+
+
+def snapshot_portfolios():
+    """
+    Store today's portfolio snapshots. Enqueued by the price update, and
+    safe to run again since snapshots are upserted per portfolio and date.
+    """
+    try:
+        call_command('snapshot_portfolios')
+        logger.info("Successfully stored portfolio snapshots")
+        return "Successfully stored portfolio snapshots"
+    except Exception as e:
+        logger.error(f"Error storing portfolio snapshots: {str(e)}")
+        return f"Error storing portfolio snapshots: {str(e)}"
+
+
+def precompute_covariances():
+    """
+    Estimate the covariance of every exchange for the new price data
+    version, so portfolio optimizations do not pay for it.
+    """
+    try:
+        from portfolios.utils.optimizer import warm_covariances
+        count = warm_covariances()
+        logger.info(f"Precomputed covariances of {count} exchanges")
+        return f"Precomputed covariances of {count} exchanges"
+    except Exception as e:
+        logger.error(f"Error precomputing covariances: {str(e)}")
+        return f"Error precomputing covariances: {str(e)}"
+
+
+def refresh_correlations():
+    """
+    Add the new sessions to the correlation statistics of every exchange,
+    so the correlation endpoint serves them without recomputing.
+    """
+    try:
+        from fin_data_cl.utils.correlation import refresh_correlation_states
+        count = refresh_correlation_states()
+        logger.info(f"Refreshed correlations of {count} exchanges")
+        return f"Refreshed correlations of {count} exchanges"
+    except Exception as e:
+        logger.error(f"Error refreshing correlations: {str(e)}")
+        return f"Error refreshing correlations: {str(e)}"
@@ -33,6 +33,10 @@ VIEWSET_MAPPING = {
         'viewset': viewsets.DividendDataViewSet,
         'templates': ['dividend_analysis']
     },
+    'saved-screens': {
+        'viewset': viewsets.SavedScreenViewSet,
+        'templates': []
+    },
 }
 
 # Register all viewsets
@@ -12,6 +12,7 @@ import yfinance as yf
 from datetime import datetime, timedelta
 from decimal import Decimal, InvalidOperation
 from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.utils.trading_calendar import invalidate_trading_calendars
 import requests
 
 # Import the fetcher from your command file
@@ -284,6 +285,9 @@ class PriceUpdateManager:
                     # Respect API rate limits - increased delay to avoid rate limiting
                     time.sleep(1.0)  # Increased from 0.5 to 1.0 second
 
+            if total_records:
+                invalidate_trading_calendars()
+
             # Update statistics
             duration = timezone.now() - start_time
             self.last_update_stats = {
@@ -0,0 +1,71 @@
+# fin_data_cl/utils/bulk_ops.py
+"""
+Chunked create-or-update of financial data rows.
+
+Rows are matched to the stored ones by their natural key (e.g. security and
+date) with one query per chunk, then written with bulk_update / bulk_create,
+instead of one update_or_create (two queries) per row. It does not need a
+unique constraint on the key, so it also works on tables filled before the
+key was enforced.
+"""
+from typing import Iterable, List, Sequence, Tuple
+import logging
+
+from django.db import transaction
+from django.db.models import Model
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _chunks(objects: List[Model], size: int):
+    for start in range(0, len(objects), size):
+        yield objects[start:start + size]
+
+
+def bulk_upsert(model: type, objects: Iterable[Model], key_fields: Sequence[str], update_fields: Sequence[str],
+                batch_size: int = DEFAULT_BATCH_SIZE) -> Tuple[int, int]:
+    """
+    Create `objects`, or update `update_fields` of the stored rows with the same
+    `key_fields` (attribute names, e.g. 'security_id'). Each chunk is written
+    in its own transaction. When a key appears twice, the last object wins.
+    Returns (created, updated).
+    """
+    # Last object of every key
+    unique = {tuple(getattr(obj, field) for field in key_fields): obj for obj in objects}
+    objects = list(unique.values())
+    has_updated_at = any(field.name == 'updated_at' for field in model._meta.fields)
+    fields = list(update_fields) + (['updated_at'] if has_updated_at and 'updated_at' not in update_fields else [])
+
+    created = updated = 0
+    for chunk in _chunks(objects, batch_size):
+        keys = {tuple(getattr(obj, field) for field in key_fields): obj for obj in chunk}
+        lookup = {f'{field}__in': {key[position] for key in keys} for position, field in enumerate(key_fields)}
+        stored = {
+            tuple(row[1:]): row[0]
+            for row in model.objects.filter(**lookup).order_by('pk').values_list('pk', *key_fields)
+        }
+
+        now = timezone.now()
+        new, existing = [], []
+        for key, obj in keys.items():
+            if key in stored:
+                obj.pk = stored[key]
+                if has_updated_at:
+                    obj.updated_at = now
+                existing.append(obj)
+            else:
+                new.append(obj)
+
+        with transaction.atomic():
+            if existing:
+                model.objects.bulk_update(existing, fields, batch_size=batch_size)
+            if new:
+                model.objects.bulk_create(new, batch_size=batch_size)
+        created += len(new)
+        updated += len(existing)
+
+    logger.info(f"Upserted {model.__name__}: {created} created, {updated} updated")
+    return created, updated
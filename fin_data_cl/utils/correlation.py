@@ -0,0 +1,217 @@
+# fin_data_cl/utils/correlation.py
+"""
+Pairwise-complete return correlations, maintained incrementally.
+
+Illiquid Santiago tickers skip sessions, so every pair is correlated over the
+sessions where both traded. With the traded mask M and the returns R (zero
+where missing), the pairwise sums are matrix products: counts M'M, sums R'M,
+squares (R*R)'M and cross products R'R. These sufficient statistics are kept
+per exchange and window: after an ingest the new sessions are added and the
+ones leaving the window subtracted, instead of rebuilding the matrix.
+"""
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+import logging
+import time
+
+import numpy as np
+from django.core.cache import cache
+
+from fin_data_cl.models import Exchange, Security
+from fin_data_cl.utils.price_matrix import PriceMatrix
+from fin_data_cl.utils.trading_calendar import PRICE_DATA_VERSION, get_trading_calendar
+from finriv.utils.cache import LOCK_TIMEOUT, POLL_INTERVAL, WAIT_TIMEOUT, get_version
+
+logger = logging.getLogger(__name__)
+
+CORRELATION_TIMEOUT = 60 * 60 * 24 * 7
+DEFAULT_WINDOW_DAYS = 365
+# Pairs with fewer shared sessions get no correlation
+DEFAULT_MIN_OVERLAP = 20
+# Calendar days loaded before a window, so illiquid securities have a close to return from
+GAP_LOOKBACK_DAYS = 30
+
+
+def window_returns(security_ids, start, end) -> Tuple[PriceMatrix, np.ndarray, np.ndarray]:
+    """Price matrix ending at `end`, with the dates and returns from `start` on."""
+    matrix = PriceMatrix.load(security_ids, start and start - timedelta(days=GAP_LOOKBACK_DAYS), end)
+    inside = matrix.dates[1:] >= np.datetime64(start, 'D') if start else np.ones(max(len(matrix) - 1, 0), dtype=bool)
+    return matrix, matrix.dates[1:][inside], matrix.returns()[inside]
+
+
+def pairwise_statistics(returns: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Counts, sums, squares and cross products of the sessions each pair shares."""
+    traded = (~np.isnan(returns)).astype(np.float64)
+    values = np.where(traded > 0, returns, 0.0)
+    return traded.T @ traded, values.T @ traded, (values ** 2).T @ traded, values.T @ values
+
+
+def correlation_from_statistics(counts, sums, squares, products, min_overlap: int = DEFAULT_MIN_OVERLAP) -> np.ndarray:
+    """Pearson correlations from pairwise statistics, NaN below `min_overlap` shared sessions."""
+    covariance = counts * products - sums * sums.T
+    variance = counts * squares - sums ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = covariance / np.sqrt(variance * variance.T)
+    correlation[(counts < min_overlap) | ~(variance > 0) | ~(variance.T > 0)] = np.nan
+    return np.clip(correlation, -1.0, 1.0)
+
+
+def pairwise_correlation(returns: np.ndarray, min_overlap: int = DEFAULT_MIN_OVERLAP) -> np.ndarray:
+    """Correlation matrix of returns (T x N, NaN where a security did not trade)."""
+    return correlation_from_statistics(*pairwise_statistics(returns), min_overlap=min_overlap)
+
+
+class CorrelationState:
+    """Window of returns of an exchange with their pairwise statistics."""
+
+    def __init__(self, exchange_id: int, days: int):
+        self.exchange_id = exchange_id
+        self.days = days
+        self.version = None
+
+    @classmethod
+    def build(cls, exchange_id: int, days: int) -> 'CorrelationState':
+        state = cls(exchange_id, days)
+        security_ids = Security.objects.filter(exchange_id=exchange_id, is_active=True).values_list('id', flat=True)
+        calendar = get_trading_calendar()
+        end = calendar.latest_session()
+        start = calendar.window_start(end, days) if end else None
+        matrix, state.dates, state.returns = window_returns(security_ids, start, end)
+
+        state.security_ids = matrix.security_ids
+        state.last_closes = matrix.filled_closes()[-1] if len(matrix) else np.full(len(matrix.security_ids), np.nan)
+        state.last_date = matrix.dates[-1].item() if len(matrix) else None
+        state.statistics = pairwise_statistics(state.returns)
+        logger.info(f"Built correlation state of exchange {exchange_id} over {len(state.dates)} sessions")
+        return state
+
+    def _add(self, returns: np.ndarray, sign: float):
+        self.statistics = tuple(
+            total + sign * new for total, new in zip(self.statistics, pairwise_statistics(returns))
+        )
+
+    def refresh(self) -> 'CorrelationState':
+        """
+        Add the sessions stored since the last refresh and drop those leaving
+        the window. Rebuilt from scratch when the exchange's securities changed.
+        """
+        security_ids = Security.objects.filter(exchange_id=self.exchange_id, is_active=True).values_list('id', flat=True)
+        if set(security_ids) != set(self.security_ids.tolist()) or self.last_date is None:
+            return self.build(self.exchange_id, self.days)
+
+        calendar = get_trading_calendar()
+        end = calendar.latest_session()
+        if end is None or end <= self.last_date:
+            return self
+
+        loaded = PriceMatrix.load(self.security_ids.tolist(), self.last_date, end)
+        new = loaded.dates > np.datetime64(self.last_date, 'D')
+        # The last known closes start the new block, so its first returns span the gap
+        matrix = PriceMatrix(
+            np.concatenate([[np.datetime64(self.last_date, 'D')], loaded.dates[new]]),
+            self.security_ids,
+            np.vstack([self.last_closes, loaded.closes[new]]),
+            np.vstack([np.zeros(len(self.security_ids)), loaded.dividends[new]]),
+        )
+        new_returns = matrix.returns()
+        self._add(new_returns, 1.0)
+        self.dates = np.concatenate([self.dates, matrix.dates[1:]])
+        self.returns = np.vstack([self.returns, new_returns])
+        self.last_closes = matrix.filled_closes()[-1]
+        self.last_date = end
+
+        expired = self.dates < np.datetime64(calendar.window_start(end, self.days), 'D')
+        if expired.any():
+            self._add(self.returns[expired], -1.0)
+            self.dates, self.returns = self.dates[~expired], self.returns[~expired]
+        logger.info(
+            f"Refreshed correlation state of exchange {self.exchange_id}: "
+            f"{len(new_returns)} sessions added, {int(expired.sum())} dropped"
+        )
+        return self
+
+    def correlation(self, security_ids: Optional[List[int]] = None,
+                    min_overlap: int = DEFAULT_MIN_OVERLAP) -> Tuple[np.ndarray, np.ndarray]:
+        """Correlation matrix and shared-session counts of `security_ids` (all by default)."""
+        statistics = self.statistics
+        if security_ids is not None:
+            index = {security_id: column for column, security_id in enumerate(self.security_ids.tolist())}
+            columns = np.array([index[security_id] for security_id in security_ids], dtype=np.int64)
+            statistics = tuple(matrix[np.ix_(columns, columns)] for matrix in statistics)
+        return correlation_from_statistics(*statistics, min_overlap=min_overlap), statistics[0]
+
+
+def get_correlation_state(exchange_id: int, days: int = DEFAULT_WINDOW_DAYS) -> CorrelationState:
+    """
+    Shared state of an exchange and window, refreshed incrementally once per
+    price data version. Only the worker holding the lock builds or refreshes
+    it: meanwhile the others serve the previous state or, on a cold cache,
+    wait for the first one.
+    """
+    key, lock_key = f'correlation_state_{exchange_id}_{days}', f'correlation_state_{exchange_id}_{days}:lock'
+    version = get_version(PRICE_DATA_VERSION)
+    state = cache.get(key)
+    if state is not None and state.version == version:
+        return state
+
+    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+    if not locked and state is not None:
+        return state
+    if not locked:
+        deadline = time.time() + WAIT_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            state = cache.get(key)
+            if state is not None:
+                return state
+        logger.warning(f"Timed out waiting for {key}, building it locally")
+
+    try:
+        state = state.refresh() if state is not None else CorrelationState.build(exchange_id, days)
+        state.version = version
+        cache.set(key, state, CORRELATION_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return state
+
+
+def refresh_correlation_states(days: int = DEFAULT_WINDOW_DAYS) -> int:
+    """Bring the state of every exchange up to date, run after new prices are stored."""
+    exchange_ids = list(Exchange.objects.values_list('id', flat=True))
+    for exchange_id in exchange_ids:
+        get_correlation_state(exchange_id, days)
+    return len(exchange_ids)
+
+
+def correlation_matrix(securities: List[Security], days: int = DEFAULT_WINDOW_DAYS,
+                       min_overlap: int = DEFAULT_MIN_OVERLAP) -> Dict:
+    """
+    Correlations of `securities`, from the shared state of their exchange
+    when they all trade on one, otherwise computed directly.
+    """
+    exchange_ids = {security.exchange_id for security in securities}
+    security_ids = [security.id for security in securities]
+    if len(exchange_ids) == 1:
+        state = get_correlation_state(exchange_ids.pop(), days)
+        available = set(state.security_ids.tolist())
+        security_ids = [security_id for security_id in security_ids if security_id in available]
+        correlation, counts = state.correlation(security_ids, min_overlap)
+        start, end = (state.dates[0].item(), state.dates[-1].item()) if len(state.dates) else (None, None)
+    else:
+        calendar = get_trading_calendar()
+        end = calendar.latest_session()
+        start = calendar.window_start(end, days) if end else None
+        matrix, _, returns = window_returns(security_ids, start, end)
+        returns = returns[:, matrix.columns(security_ids)]
+        correlation = pairwise_correlation(returns, min_overlap)
+        counts = pairwise_statistics(returns)[0]
+
+    symbols = {security.id: security.full_symbol for security in securities}
+    return {
+        'start': start,
+        'end': end,
+        'symbols': [symbols[security_id] for security_id in security_ids],
+        'correlation': [[None if np.isnan(value) else round(float(value), 4) for value in row] for row in correlation],
+        'observations': counts.astype(int).tolist(),
+    }
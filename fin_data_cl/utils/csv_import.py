@@ -0,0 +1,164 @@
+# fin_data_cl/utils/csv_import.py
+"""
+Streaming CSV imports for the management-command importers.
+
+Files are read in chunks of raw strings, so memory depends on the chunk
+size rather than on the size of the export. Every column is converted as a
+whole with its converter. Rows with a missing or invalid required value are
+rejected, and other invalid values are left empty. Both are counted, with
+a sample of line numbers and reasons. Valid chunks go to a writer, usually
+a bulk upsert, and the stats report the throughput.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 50_000
+# Rejected lines kept as examples in the stats
+REJECT_SAMPLE_SIZE = 100
+
+Converter = Callable[[pd.Series], pd.Series]
+
+
+def to_text(series: pd.Series) -> pd.Series:
+    """Stripped strings, empty ones missing."""
+    return series.str.strip().replace('', np.nan)
+
+
+def to_number(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors='coerce')
+
+
+def to_integer(series: pd.Series) -> pd.Series:
+    """Integers, also written as '1.0'; fractions are invalid."""
+    numbers = pd.to_numeric(series, errors='coerce')
+    return numbers.where(numbers % 1 == 0).astype('Int64')
+
+
+def to_decimal(series: pd.Series) -> pd.Series:
+    """Decimals built from the text itself, so no binary rounding is introduced."""
+    valid = pd.to_numeric(series, errors='coerce').notna()
+    return series.where(valid).map(lambda value: Decimal(value.strip()), na_action='ignore')
+
+
+def to_date(format: Optional[str] = None) -> Converter:
+    """Dates in `format`, by default ISO dates, ignoring a time after the date."""
+    def convert(series: pd.Series) -> pd.Series:
+        if format is None:
+            return pd.to_datetime(series.str.strip().str[:10], format='%Y-%m-%d', errors='coerce')
+        return pd.to_datetime(series, format=format, errors='coerce')
+    return convert
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    rejected: int = 0
+    invalid_values: int = 0
+    created: int = 0
+    updated: int = 0
+    rejects: List[Tuple[int, str]] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    finished: Optional[float] = None
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.rejects) < REJECT_SAMPLE_SIZE:
+            self.rejects.append((line, reason))
+
+    def add_written(self, written: Tuple[int, int]):
+        created, updated = written
+        self.created += created
+        self.updated += updated
+
+    def summary(self) -> str:
+        return (
+            f"{self.rows} rows in {self.seconds:.1f} seconds ({self.rows_per_second:.0f} rows/s): "
+            f"{self.created} created, {self.updated} updated, {self.rejected} rejected, "
+            f"{self.invalid_values} invalid values left empty"
+        )
+
+
+class CsvImporter:
+    """
+    Chunked reader of a CSV with typed columns.
+
+    Args:
+        columns: Converter of every column to read, by (renamed) column name
+        required: Columns a row is rejected without
+        chunk_size: Rows read at a time
+        rename: Applied to the header before the columns are selected
+    """
+
+    def __init__(self, columns: Dict[str, Converter], required: Sequence[str] = (),
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, rename: Optional[Callable[[pd.Index], pd.Index]] = None):
+        self.columns = columns
+        self.required = list(required)
+        self.chunk_size = chunk_size
+        self.rename = rename
+
+    def _convert(self, raw: pd.DataFrame, first_line: int, stats: ImportStats) -> pd.DataFrame:
+        if self.rename is not None:
+            raw.columns = self.rename(raw.columns)
+        missing = [column for column in self.columns if column not in raw.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+        converted = pd.DataFrame(index=raw.index)
+        rejected = pd.Series(False, index=raw.index)
+        reasons = pd.Series('', index=raw.index)
+        for column, convert in self.columns.items():
+            values = convert(raw[column])
+            invalid = values.isna() & raw[column].notna()
+            if column in self.required:
+                bad = values.isna() & ~rejected
+                reasons[bad] = np.where(invalid[bad], f"invalid {column}", f"missing {column}")
+                rejected |= values.isna()
+            else:
+                stats.invalid_values += int(invalid.sum())
+            converted[column] = values
+
+        for position in np.flatnonzero(rejected.to_numpy()):
+            stats.reject(first_line + int(position), reasons.iloc[position])
+        return converted[~rejected.to_numpy()]
+
+    def iter_chunks(self, path, stats: Optional[ImportStats] = None) -> Iterator[pd.DataFrame]:
+        """Converted chunks of valid rows, updating `stats` as they are read."""
+        stats = stats if stats is not None else ImportStats()
+        # Line 1 is the header
+        first_line = 2
+        with pd.read_csv(path, dtype=str, chunksize=self.chunk_size) as reader:
+            for raw in reader:
+                raw = raw.reset_index(drop=True)
+                chunk = self._convert(raw, first_line, stats)
+                first_line += len(raw)
+                stats.rows += len(raw)
+                logger.debug(f"Read {stats.rows} rows ({stats.rows_per_second:.0f} rows/s)")
+                yield chunk
+
+    def run(self, path, write: Callable[[pd.DataFrame], Tuple[int, int]]) -> ImportStats:
+        """Read `path` and pass every chunk of valid rows to `write`, which returns (created, updated)."""
+        stats = ImportStats()
+        for chunk in self.iter_chunks(path, stats):
+            if not chunk.empty:
+                stats.add_written(write(chunk))
+        stats.finished = time.perf_counter()
+        logger.info(f"Imported {path}: {stats.summary()}")
+        for line, reason in stats.rejects[:10]:
+            logger.warning(f"Rejected line {line}: {reason}")
+        return stats
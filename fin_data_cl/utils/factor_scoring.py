@@ -0,0 +1,119 @@
+# fin_data_cl/utils/factor_scoring.py
+"""
+Composite multi-factor scores over the latest ratio snapshot.
+
+The normalized factor matrix is built once per ratio run (RatioSnapshot.factors),
+so a score is a single weighted average over it. Scores are cached by ratio
+version and weight vector, so users sharing the same weights share the result.
+"""
+from typing import Dict, Optional, Tuple
+import hashlib
+import logging
+
+import numpy as np
+
+from fin_data_cl.utils.screener_engine import FACTOR_RATIOS, RATIO_DATA_VERSION, SCREEN_RATIOS, get_ratio_snapshot
+from finriv.utils.cache import get_or_compute, get_version
+
+logger = logging.getLogger(__name__)
+
+SCORE_TIMEOUT = 60 * 60
+
+WEIGHT_PRESETS = {
+    'value': {'pe_ratio': 1.0, 'pb_ratio': 1.0, 'ev_ebitda': 1.0, 'ps_ratio': 0.5},
+    'quality': {
+        'return_on_equity': 1.0, 'return_on_assets': 1.0,
+        'operating_profit_margin': 0.5, 'debt_to_equity': 0.5,
+    },
+    'yield': {'dividend_yield': 1.0, 'before_dividend_yield': 0.5},
+    'balanced': {
+        'pe_ratio': 1.0, 'pb_ratio': 0.5, 'return_on_equity': 1.0,
+        'net_profit_margin': 0.5, 'dividend_yield': 1.0,
+    },
+}
+
+
+def parse_weights(weights: str) -> Dict[str, float]:
+    """
+    Parse 'ratio:weight,ratio:weight' into a dict, raising ValueError on
+    unknown ratios, malformed entries, negative or non-finite weights.
+    """
+    parsed = {}
+    for item in filter(None, weights.split(',')):
+        ratio_name, _, weight = item.partition(':')
+        if ratio_name not in FACTOR_RATIOS:
+            raise ValueError(f"Unknown ratio '{ratio_name}'")
+        parsed[ratio_name] = float(weight) if weight else 1.0
+        if not np.isfinite(parsed[ratio_name]):
+            raise ValueError(f"Invalid weight for '{ratio_name}'")
+        if parsed[ratio_name] < 0:
+            raise ValueError("Weights must be positive, factors are already oriented higher-is-better")
+    if not any(parsed.values()):
+        raise ValueError("At least one ratio needs a positive weight")
+    return parsed
+
+
+def weight_vector(weights: Dict[str, float]) -> np.ndarray:
+    """Weights as a vector over SCREEN_RATIOS, summing to 1."""
+    vector = np.array([weights.get(ratio_name, 0.0) for ratio_name in SCREEN_RATIOS], dtype=np.float64)
+    return vector / vector.sum()
+
+
+def compute_scores(factors: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Weighted average of the available factors of each security.
+
+    Missing factors are left out and the remaining weights re-scaled, so
+    coverage (the share of the weight actually available) is returned too.
+    Securities without any weighted factor get a NaN score.
+    """
+    present = ~np.isnan(factors)
+    coverage = present @ weights
+    weighted = np.where(present, factors, 0.0) @ weights
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.where(coverage > 0, weighted / coverage, np.nan)
+    return scores, coverage
+
+
+def _ranked_scores(weights: np.ndarray):
+    snapshot = get_ratio_snapshot()
+    scores, coverage = compute_scores(snapshot.factors, weights)
+    # Best first, securities without a score last
+    order = np.argsort(np.where(np.isnan(scores), np.inf, -scores), kind='stable')
+    order = order[~np.isnan(scores[order])]
+    return scores, coverage, order
+
+
+def get_scores(weights: Dict[str, float]):
+    """
+    Scores, coverage and best-first order of the securities in the current
+    snapshot for a weight dict, shared through the cache.
+    """
+    vector = weight_vector(weights)
+    digest = hashlib.sha1(np.round(vector, 8).tobytes()).hexdigest()[:16]
+    version = get_version(RATIO_DATA_VERSION)
+    return get_or_compute(
+        f'ratio_scores_{version}_{digest}',
+        lambda: _ranked_scores(vector),
+        SCORE_TIMEOUT
+    )
+
+
+def score_rows(weights: Dict[str, float], exchange_id=None, limit: Optional[int] = 50):
+    """Ranked securities with their score, rank over the whole universe and coverage."""
+    snapshot = get_ratio_snapshot()
+    scores, coverage, order = get_scores(weights)
+    ranks = np.empty(len(snapshot), dtype=np.int64)
+    ranks[order] = np.arange(1, len(order) + 1)
+
+    if exchange_id:
+        order = order[snapshot.exchange_ids[order] == int(exchange_id)]
+    if limit:
+        order = order[:limit]
+
+    rows = snapshot.rows(order)
+    for row, index in zip(rows, order):
+        row['score'] = round(float(scores[index]), 4)
+        row['rank'] = int(ranks[index])
+        row['coverage'] = round(float(coverage[index]), 4)
+    return rows
@@ -0,0 +1,165 @@
+# fin_data_cl/utils/financial_import.py
+"""
+Import of the quarterly financial statements database (Database_in_CLP.csv).
+
+The file alternates rows: a row of values for a ticker and date, followed by
+a row with the code of every value. Code 10 values are already quarterly,
+codes 11 and 12 are year-to-date and are turned into the quarter's value by
+subtracting what the year accumulated so far, which resets on the first
+quarter. The whole file is reshaped to (ticker, metric, date) once and the
+de-accumulation is a few grouped cumsums, instead of a loop per metric and
+ticker. The file is read in chunks of an even number of rows, so the pairs
+stay together, and only the valid values of each chunk are kept.
+"""
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from fin_data_cl.models import FinancialData, Security
+from fin_data_cl.utils.bulk_ops import DEFAULT_BATCH_SIZE, bulk_upsert
+from fin_data_cl.utils.csv_import import DEFAULT_CHUNK_SIZE, CsvImporter, ImportStats, to_number, to_text
+
+logger = logging.getLogger(__name__)
+
+FINANCIAL_METRICS = [
+    'revenue', 'net_profit', 'operating_profit', 'non_controlling_profit', 'eps', 'operating_eps',
+    'interest_revenue', 'cash_from_sales', 'cash_from_yield', 'cash_from_rent', 'cash_to_payments',
+    'cash_to_other_payments', 'speculation_cash', 'current_payables', 'cost_of_sales', 'ebit',
+    'depreciation', 'interest', 'cash', 'current_assets', 'liabilities', 'marketable_securities',
+    'current_other_assets', 'provisions_for_employees', 'non_current_assets', 'goodwill',
+    'intangible_assets', 'assets', 'current_liabilities', 'equity', 'shares', 'inventories',
+    'shares_authorized', 'net_operating_cashflows', 'net_investing_cashflows', 'net_financing_cashflows',
+    'payment_for_supplies', 'payment_to_employees', 'dividends_paid', 'forex', 'trade_receivables',
+    'prepayments', 'cash_on_hands', 'cash_on_banks', 'cash_short_investment', 'employee_benefits'
+]
+# Codes of year-to-date values
+YEAR_TO_DATE_CODES = (11, 12)
+
+
+def clean_names(columns: pd.Index) -> pd.Index:
+    return (
+        columns
+        .str.strip()
+        .str.lower()
+        .str.replace(' ', '_')
+        .str.replace('-', '_')
+        .str.replace(r'[^a-zA-Z0-9_]', '', regex=True)
+    )
+
+
+def clean_column_names(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = clean_names(df.columns)
+    return df
+
+
+def long_values(df: pd.DataFrame, metrics: List[str]) -> pd.DataFrame:
+    """One row per ticker, date and metric with its value and code, valid values only, sorted."""
+    values = df.iloc[0::2].reset_index(drop=True)
+    codes = df.iloc[1::2][metrics].reset_index(drop=True).reindex(range(len(values)))
+    months = pd.to_numeric(values['date'], errors='coerce').astype('Int64').astype(str)
+    dates = pd.to_datetime(months, format='%Y%m', errors='coerce')
+
+    count = len(metrics)
+    long = pd.DataFrame({
+        'ticker': np.repeat(values['ticker'].to_numpy(), count),
+        'date': np.repeat(dates.to_numpy(), count),
+        'metric': np.tile(np.array(metrics, dtype=object), len(values)),
+        'value': values[metrics].apply(pd.to_numeric, errors='coerce').to_numpy(np.float64).ravel(),
+        'code': codes.apply(pd.to_numeric, errors='coerce').to_numpy(np.float64).ravel(),
+    })
+    valid = (
+        np.isfinite(long['value']) & np.isfinite(long['code'])
+        & long['date'].notna() & long['ticker'].notna()
+    )
+    return long[valid].sort_values(['ticker', 'metric', 'date'], kind='stable').reset_index(drop=True)
+
+
+def deaccumulate(long: pd.DataFrame) -> pd.Series:
+    """
+    Quarterly values of a long frame sorted by ticker, metric and date.
+
+    Within a year (from a first quarter on), a year-to-date value minus the
+    running total gives the quarter, and the running total becomes that
+    value. Other values add to it. So the running total is the cumulative
+    sum of the values since the last year-to-date one, and its value before
+    each row is a shift.
+    """
+    ticker, metric = long['ticker'], long['metric']
+    first_quarter = (long['date'].dt.month // 3 == 1).astype(np.int64)
+    year_to_date = long['code'].isin(YEAR_TO_DATE_CODES)
+
+    year = first_quarter.groupby([ticker, metric]).cumsum()
+    block = year_to_date.astype(np.int64).groupby([ticker, metric, year]).cumsum()
+    running = long['value'].groupby([ticker, metric, year, block]).cumsum()
+    before = running.groupby([ticker, metric, year]).shift(fill_value=0.0)
+    return pd.Series(np.where(year_to_date, long['value'] - before, long['value']), index=long.index)
+
+
+def _pivot_quarters(long: pd.DataFrame, metrics: List[str]) -> pd.DataFrame:
+    long['value'] = deaccumulate(long)
+    table = long.drop_duplicates(['ticker', 'date', 'metric'], keep='last').pivot(
+        index=['ticker', 'date'], columns='metric', values='value'
+    )
+    return table.reindex(columns=metrics)
+
+
+def quarterly_table(df: pd.DataFrame, metrics: List[str] = FINANCIAL_METRICS) -> pd.DataFrame:
+    """Quarterly values indexed by (ticker, date), one column per metric."""
+    metrics = [metric for metric in metrics if metric in df.columns]
+    return _pivot_quarters(long_values(df, metrics), metrics)
+
+
+def _decimal(value) -> Optional[Decimal]:
+    return None if np.isnan(value) else Decimal(str(value))
+
+
+def import_financial_data(table: pd.DataFrame, exchange, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """
+    Store a quarterly table for the active securities of `exchange`, updating
+    the rows already stored for the same security and date.
+    """
+    securities: Dict[str, int] = dict(
+        Security.objects.filter(exchange=exchange, is_active=True).values_list('ticker', 'id')
+    )
+    tickers = table.index.get_level_values('ticker')
+    known = tickers.isin(list(securities))
+    skipped = sorted(set(tickers[~known]))
+    if skipped:
+        logger.warning(f"Skipping {len(skipped)} tickers without an active security: {', '.join(map(str, skipped))}")
+
+    table = table[known]
+    metrics = list(table.columns)
+    now = timezone.now()
+    rows = [
+        FinancialData(
+            security_id=securities[ticker], date=day.date(), created_at=now, updated_at=now,
+            **{metric: _decimal(value) for metric, value in zip(metrics, values)}
+        )
+        for (ticker, day), values in zip(table.index, table.to_numpy(np.float64))
+    ]
+    created, updated = bulk_upsert(FinancialData, rows, ('security_id', 'date'), metrics, batch_size)
+    return {'created': created, 'updated': updated, 'skipped_tickers': skipped}
+
+
+def load_financial_file(path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[pd.DataFrame, ImportStats]:
+    """
+    Quarterly table of a statements CSV and the stats of reading it.
+    De-accumulating needs the whole history of a ticker, so the valid values
+    of every chunk are gathered before the table is built.
+    """
+    header = clean_names(pd.read_csv(path, nrows=0).columns)
+    metrics = [metric for metric in FINANCIAL_METRICS if metric in header]
+    importer = CsvImporter(
+        columns={'date': to_text, 'ticker': to_text, **{metric: to_number for metric in metrics}},
+        # Nothing is required, a rejected row would misalign the value and code rows
+        chunk_size=chunk_size + chunk_size % 2,
+        rename=clean_names,
+    )
+    stats = ImportStats()
+    parts = [long_values(chunk, metrics) for chunk in importer.iter_chunks(path, stats)]
+    long = pd.concat(parts).sort_values(['ticker', 'metric', 'date'], kind='stable').reset_index(drop=True)
+    return _pivot_quarters(long, metrics), stats
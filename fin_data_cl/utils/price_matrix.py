@@ -0,0 +1,103 @@
+# fin_data_cl/utils/price_matrix.py
+"""
+Aligned close and dividend matrices for portfolio analytics.
+
+Prices of many securities are loaded with one query and pivoted into a
+(dates x securities) float matrix, NaN where a security did not trade.
+Dividends are placed on the same grid, on the first session the security
+traded on or after their date, so total returns are a single vectorized
+expression.
+"""
+from datetime import date
+from typing import Iterable, Optional
+import logging
+
+import numpy as np
+
+from fin_data_cl.models import PriceData, DividendData
+
+logger = logging.getLogger(__name__)
+
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """Carry the last value down each column, leading NaNs are kept."""
+    rows = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[0])[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return matrix[rows, np.arange(matrix.shape[1])]
+
+
+class PriceMatrix:
+    """Closes and dividends of a set of securities on their shared trading dates."""
+
+    def __init__(self, dates: np.ndarray, security_ids: np.ndarray, closes: np.ndarray, dividends: np.ndarray):
+        self.dates = dates
+        self.security_ids = security_ids
+        self.closes = closes
+        self.dividends = dividends
+        self._columns = {security_id: index for index, security_id in enumerate(security_ids.tolist())}
+
+    def __len__(self):
+        return len(self.dates)
+
+    @classmethod
+    def load(cls, security_ids: Iterable[int], start: Optional[date] = None,
+             end: Optional[date] = None) -> 'PriceMatrix':
+        """One price query and one dividend query for all `security_ids`."""
+        security_ids = np.array(sorted(set(security_ids)), dtype=np.int64)
+        prices = PriceData.objects.filter(security_id__in=security_ids.tolist(), close_price__isnull=False)
+        dividends = DividendData.objects.filter(security_id__in=security_ids.tolist())
+        if start:
+            prices = prices.filter(date__gte=start)
+            dividends = dividends.filter(date__gte=start)
+        if end:
+            prices = prices.filter(date__lte=end)
+            dividends = dividends.filter(date__lte=end)
+
+        rows = list(prices.values_list('security_id', 'date', 'close_price'))
+        if not rows:
+            empty = np.empty((0, len(security_ids)), dtype=np.float64)
+            return cls(np.array([], dtype='datetime64[D]'), security_ids, empty, empty.copy())
+
+        row_securities, row_dates, row_closes = zip(*rows)
+        row_dates = np.array(row_dates, dtype='datetime64[D]')
+        dates = np.unique(row_dates)
+        columns = np.searchsorted(security_ids, np.array(row_securities, dtype=np.int64))
+
+        closes = np.full((len(dates), len(security_ids)), np.nan)
+        closes[np.searchsorted(dates, row_dates), columns] = np.array(row_closes, dtype=np.float64)
+
+        dividend_matrix = np.zeros_like(closes)
+        dividend_rows = list(dividends.values_list('security_id', 'date', 'amount'))
+        traded = {}
+        for security_id, day, amount in dividend_rows:
+            # First session the security traded on or after the dividend date
+            column = int(np.searchsorted(security_ids, security_id))
+            if column not in traded:
+                traded[column] = np.flatnonzero(~np.isnan(closes[:, column]))
+            sessions = traded[column]
+            index = np.searchsorted(dates[sessions], np.datetime64(day, 'D'))
+            if index < len(sessions):
+                dividend_matrix[sessions[index], column] += float(amount)
+
+        logger.debug(f"Loaded price matrix of {closes.shape[0]} dates x {closes.shape[1]} securities")
+        return cls(dates, security_ids, closes, dividend_matrix)
+
+    def columns(self, security_ids: Iterable[int]) -> np.ndarray:
+        """Column indices of `security_ids`, in the given order."""
+        return np.array([self._columns[security_id] for security_id in security_ids], dtype=np.int64)
+
+    def filled_closes(self) -> np.ndarray:
+        """Closes with missing sessions carrying the previous close."""
+        return forward_fill(self.closes)
+
+    def returns(self, total: bool = True) -> np.ndarray:
+        """
+        Daily returns, one row shorter than the closes. A return covers the
+        span since the security's previous close, and is NaN on the sessions
+        it did not trade, so illiquid securities are not diluted with zeros.
+        With `total`, dividends are added back to the close.
+        """
+        previous = self.filled_closes()[:-1]
+        current = self.closes[1:] + self.dividends[1:] if total else self.closes[1:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return current / previous - 1
@@ -0,0 +1,139 @@
+# fin_data_cl/utils/saved_screens.py
+"""
+Incremental maintenance of saved screen results.
+
+After a ratio run, only the securities whose latest ratios changed are
+re-evaluated against each saved screen, and the entries and exits are stored
+as SavedScreenEvent rows. Screens with exchange-relative filters depend on the
+whole cross-section, so they are always re-evaluated in full.
+"""
+from collections import defaultdict
+from typing import Dict, Optional, Set
+import logging
+
+import numpy as np
+from django.db import transaction
+
+from fin_data_cl.models import SavedScreen, SavedScreenResult, SavedScreenEvent
+from fin_data_cl.utils.screener_engine import (
+    RATIO_DATA_VERSION, RatioSnapshot, changed_securities, get_ratio_snapshot, invalidate_ratio_snapshot,
+    is_relative, parse_filters
+)
+from finriv.utils.cache import get_version
+
+logger = logging.getLogger(__name__)
+
+
+def screen_matches(screen: SavedScreen, snapshot: RatioSnapshot,
+                   security_ids: Optional[np.ndarray] = None) -> Set[int]:
+    """Ids of the securities passing a screen, among `security_ids` when given."""
+    if security_ids is None:
+        indices = np.arange(len(snapshot))
+    else:
+        indices = np.flatnonzero(np.isin(snapshot.security_ids, security_ids))
+    mask = snapshot.mask(parse_filters(screen.filters), screen.exchange_id, indices)
+    return set(snapshot.security_ids[indices][mask].tolist())
+
+
+@transaction.atomic
+def reset_screen_results(screen: SavedScreen):
+    """Evaluate a new or edited screen from scratch, without recording events."""
+    passing = screen_matches(screen, get_ratio_snapshot())
+    screen.results.all().delete()
+    SavedScreenResult.objects.bulk_create([
+        SavedScreenResult(screen=screen, security_id=security_id) for security_id in passing
+    ])
+    screen.ratio_version = get_version(RATIO_DATA_VERSION)
+    screen.save(update_fields=['ratio_version'])
+
+
+@transaction.atomic
+def refresh_saved_screens(previous: Optional[RatioSnapshot] = None,
+                          previous_version: Optional[int] = None) -> Dict[str, int]:
+    """
+    Bring every saved screen up to date with the current ratio snapshot.
+
+    Args:
+        previous: Snapshot before the ratio run, enables incremental updates
+        previous_version: Version of that snapshot. Screens whose results
+            reflect another version are re-evaluated in full.
+    """
+    version = get_version(RATIO_DATA_VERSION)
+    current = get_ratio_snapshot()
+    changed = changed_securities(previous, current) if previous is not None else None
+    changed_ids = set(changed.tolist()) if changed is not None else None
+
+    stored = defaultdict(set)
+    for screen_id, security_id in SavedScreenResult.objects.values_list('screen_id', 'security_id'):
+        stored[screen_id].add(security_id)
+
+    new_results, events = [], []
+    exits_by_screen = {}
+    screens = list(SavedScreen.objects.all())
+    for screen in screens:
+        results = stored[screen.id]
+        incremental = (
+            changed is not None
+            and screen.ratio_version == previous_version
+            and not is_relative(parse_filters(screen.filters))
+        )
+        if incremental:
+            passing = screen_matches(screen, current, changed)
+            scope = results & changed_ids
+        else:
+            passing = screen_matches(screen, current)
+            scope = results
+
+        entries = passing - results
+        exits = scope - passing
+        new_results += [SavedScreenResult(screen=screen, security_id=security_id) for security_id in entries]
+        events += [
+            SavedScreenEvent(screen=screen, security_id=security_id, event_type=SavedScreenEvent.ENTRY)
+            for security_id in entries
+        ]
+        events += [
+            SavedScreenEvent(screen=screen, security_id=security_id, event_type=SavedScreenEvent.EXIT)
+            for security_id in exits
+        ]
+        if exits:
+            exits_by_screen[screen.id] = exits
+
+    for screen_id, exits in exits_by_screen.items():
+        SavedScreenResult.objects.filter(screen_id=screen_id, security_id__in=exits).delete()
+    SavedScreenResult.objects.bulk_create(new_results)
+    SavedScreenEvent.objects.bulk_create(events)
+    SavedScreen.objects.filter(id__in=[screen.id for screen in screens]).update(ratio_version=version)
+
+    stats = {
+        'screens': len(screens),
+        'changed_securities': len(changed_ids) if changed_ids is not None else len(current),
+        'entries': len(new_results),
+        'exits': sum(len(exits) for exits in exits_by_screen.values()),
+    }
+    logger.info(f"Saved screens refreshed: {stats}")
+    return stats
+
+
+def finish_ratio_run(previous: Optional[RatioSnapshot], previous_version: Optional[int]) -> Dict[str, int]:
+    """Publish the new ratio snapshot to every worker and update saved screens against it."""
+    invalidate_ratio_snapshot()
+    return refresh_saved_screens(previous, previous_version)
+
+
+def pending_digests():
+    """
+    New entries not yet notified, for screens with notifications enabled,
+    grouped per user as {user: {'screens': {screen name: [full symbols]}, 'event_ids': [...]}}.
+    """
+    events = SavedScreenEvent.objects.filter(
+        notified=False,
+        event_type=SavedScreenEvent.ENTRY,
+        screen__notify=True,
+    ).select_related('screen__user', 'security__exchange').order_by('screen__name', 'security__ticker')
+
+    digests = {}
+    for event in events:
+        digest = digests.setdefault(event.screen.user, {'screens': defaultdict(list), 'event_ids': []})
+        digest['screens'][event.screen.name].append(event.security.full_symbol)
+        digest['event_ids'].append(event.id)
+    return digests
@@ -0,0 +1,294 @@
+# fin_data_cl/utils/screener_engine.py
+"""
+Columnar in-memory screener over the latest FinancialRatio of every security.
+
+The snapshot is built once per ratio run (see RATIO_DATA_VERSION), shared
+between workers through the cache and memoized in each process. Screens are
+then evaluated as vectorized NumPy masks, without touching the database.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from fin_data_cl.models import FinancialRatio
+from finriv.utils.cache import get_or_compute, get_version, bump_version
+
+logger = logging.getLogger(__name__)
+
+RATIO_DATA_VERSION = 'financial_ratios'
+SNAPSHOT_TIMEOUT = 60 * 60
+
+SCREEN_RATIOS = [
+    'pe_ratio', 'pb_ratio', 'ps_ratio', 'peg_ratio', 'ev_ebitda',
+    'gross_profit_margin', 'operating_profit_margin', 'net_profit_margin',
+    'return_on_assets', 'return_on_equity', 'debt_to_equity',
+    'current_ratio', 'quick_ratio', 'dividend_yield', 'before_dividend_yield'
+]
+
+ABSOLUTE_OPERATORS = ['gt', 'lt', 'gte', 'lte']
+
+# Ratios where a lower value is better, flipped in the factor matrix
+LOWER_IS_BETTER = {'pe_ratio', 'pb_ratio', 'ps_ratio', 'peg_ratio', 'ev_ebitda', 'debt_to_equity'}
+# Multiples that are meaningless when not positive (losses, negative equity or EBIT),
+# left out of the factor matrix rather than flipped into the best scores
+POSITIVE_MULTIPLES = {'pe_ratio', 'pb_ratio', 'ps_ratio', 'peg_ratio', 'ev_ebitda'}
+# Ratios left out of composite scores: calculate_ratios still stores a 0 placeholder for the PEG ratio
+NON_FACTOR_RATIOS = {'peg_ratio'}
+FACTOR_RATIOS = [ratio_name for ratio_name in SCREEN_RATIOS if ratio_name not in NON_FACTOR_RATIOS]
+# Percentiles at which factors are winsorized before normalization
+WINSOR_LIMITS = (1, 99)
+
+# operator: (snapshot matrix, comparison, transform of the filter value)
+# Relative operators compare against matrices precomputed per exchange, so
+# they cost the same as absolute thresholds:
+#   pct_lte:20 -> in the bottom 20% of its exchange, pct_gte:80 -> in the top 20%
+#   z_gt:1 / z_lt:-1 -> z-score within its exchange
+#   top:10 / bottom:10 -> among the 10 highest / lowest of its exchange
+OPERATORS = {
+    'gt': ('values', np.greater, None),
+    'lt': ('values', np.less, None),
+    'gte': ('values', np.greater_equal, None),
+    'lte': ('values', np.less_equal, None),
+    'pct_lte': ('bottom_percentiles', np.less_equal, None),
+    'pct_gte': ('top_percentiles', np.less_equal, lambda value: 100 - value),
+    'z_gt': ('zscores', np.greater, None),
+    'z_lt': ('zscores', np.less, None),
+    'top': ('top_ranks', np.less_equal, None),
+    'bottom': ('bottom_ranks', np.less_equal, None),
+}
+
+# (ratio version, built at, RatioSnapshot)
+_snapshot = None
+
+
+def parse_filters(filters: Iterable[str], valid_ratios: Iterable[str] = SCREEN_RATIOS) -> List[Tuple[str, str, float]]:
+    """Parse 'ratio:operator:value' strings, skipping malformed or unknown ones."""
+    valid_ratios = set(valid_ratios)
+    parsed = []
+    for filter_string in filters:
+        try:
+            ratio_name, operator, value = filter_string.split(':')
+            if ratio_name in valid_ratios and operator in OPERATORS:
+                parsed.append((ratio_name, operator, float(value)))
+        except ValueError:
+            logger.debug(f"Ignoring invalid filter {filter_string}")
+    return parsed
+
+
+class RatioSnapshot:
+    """
+    Latest ratio row of every security, stored column-wise. Ratio values are
+    a float matrix (one column per ratio) with NaN for missing values, so
+    filters on missing ratios never match, as with SQL NULL comparisons.
+    """
+
+    def __init__(self, ratio_ids, security_ids, exchange_ids, tickers, exchanges,
+                 full_symbols, dates, prices, values, ratios=SCREEN_RATIOS):
+        self.ratio_ids = np.asarray(ratio_ids, dtype=np.int64)
+        self.security_ids = np.asarray(security_ids, dtype=np.int64)
+        self.exchange_ids = np.asarray(exchange_ids, dtype=np.int64)
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.exchanges = np.asarray(exchanges, dtype=object)
+        self.full_symbols = np.asarray(full_symbols, dtype=object)
+        self.dates = np.asarray(dates, dtype=object)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64).reshape(len(self.ratio_ids), len(ratios))
+        self.ratios = list(ratios)
+        self.columns = {name: index for index, name in enumerate(self.ratios)}
+        self._precompute_ranks()
+        self._precompute_factors()
+
+    def _precompute_ranks(self):
+        """
+        Cross-sectional statistics of every ratio, once per snapshot: ranks over
+        all securities, and ranks, percentiles and z-scores within each exchange.
+        Missing values stay NaN so relative filters never match them.
+        """
+        frame = pd.DataFrame(self.values)
+        self.ascending_ranks = frame.rank(method='min').to_numpy()
+        self.descending_ranks = frame.rank(method='min', ascending=False).to_numpy()
+
+        groups = frame.groupby(self.exchange_ids)
+        counts = groups.transform('count').to_numpy(dtype=np.float64)
+        self.bottom_ranks = groups.rank(method='min').to_numpy()
+        self.top_ranks = groups.rank(method='min', ascending=False).to_numpy()
+        self.bottom_percentiles = self.bottom_ranks / counts * 100
+        self.top_percentiles = self.top_ranks / counts * 100
+
+        std = groups.transform(lambda column: column.std(ddof=0)).to_numpy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.zscores = (self.values - groups.transform('mean').to_numpy()) / np.where(std > 0, std, np.nan)
+
+    def __len__(self):
+        return len(self.ratio_ids)
+
+    @classmethod
+    def load(cls, ratios: List[str] = SCREEN_RATIOS) -> 'RatioSnapshot':
+        """Build the snapshot from a single scan of FinancialRatio."""
+        rows = FinancialRatio.objects.order_by('security_id', '-date', '-id').values_list(
+            'id', 'security_id', 'security__exchange_id', 'security__ticker',
+            'security__exchange__code', 'security__exchange__suffix', 'date', 'price', *ratios
+        )
+        latest = []
+        previous_security = None
+        for row in rows:
+            # Rows come newest first within each security
+            if row[1] != previous_security:
+                latest.append(row)
+                previous_security = row[1]
+
+        def as_float(column):
+            return [np.nan if value is None else float(value) for value in column]
+
+        if not latest:
+            return cls([], [], [], [], [], [], [], [], np.empty((0, len(ratios))), ratios)
+
+        columns = list(zip(*latest))
+        return cls(
+            ratio_ids=columns[0],
+            security_ids=columns[1],
+            exchange_ids=columns[2],
+            tickers=columns[3],
+            exchanges=columns[4],
+            full_symbols=[f"{ticker}.{suffix}" for ticker, suffix in zip(columns[3], columns[5])],
+            dates=columns[6],
+            prices=as_float(columns[7]),
+            values=np.column_stack([as_float(column) for column in columns[8:]]),
+            ratios=ratios,
+        )
+
+    def _precompute_factors(self):
+        """
+        Normalized factor matrix for composite scores, once per snapshot: each
+        ratio winsorized at WINSOR_LIMITS and z-scored over the whole universe,
+        oriented so that higher is always better. Missing values, non-positive
+        multiples and ratios outside FACTOR_RATIOS stay NaN.
+        """
+        values = self.values.copy()
+        for position, ratio_name in enumerate(self.ratios):
+            if ratio_name in NON_FACTOR_RATIOS:
+                values[:, position] = np.nan
+            elif ratio_name in POSITIVE_MULTIPLES:
+                with np.errstate(invalid='ignore'):
+                    values[values[:, position] <= 0, position] = np.nan
+
+        factors = np.full(values.shape, np.nan)
+        if len(self):
+            with np.errstate(invalid='ignore'), warnings.catch_warnings():
+                # All-NaN columns (a ratio nobody has) simply stay NaN
+                warnings.simplefilter('ignore', RuntimeWarning)
+                low, high = np.nanpercentile(values, WINSOR_LIMITS, axis=0)
+                clipped = np.clip(values, low, high)
+                std = np.nanstd(clipped, axis=0)
+                factors = (clipped - np.nanmean(clipped, axis=0)) / np.where(std > 0, std, np.nan)
+        directions = np.array([-1.0 if name in LOWER_IS_BETTER else 1.0 for name in self.ratios])
+        self.factors = factors * directions
+
+    def column(self, ratio_name: str) -> np.ndarray:
+        return self.values[:, self.columns[ratio_name]]
+
+    def mask(self, filters: Iterable[Tuple[str, str, float]], exchange_id=None,
+             indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Boolean mask of the securities matching every filter, evaluated only
+        on the rows in `indices` (and aligned with it) when given.
+        """
+        rows = slice(None) if indices is None else indices
+        mask = np.ones(len(self) if indices is None else len(indices), dtype=bool)
+        if exchange_id:
+            mask &= self.exchange_ids[rows] == int(exchange_id)
+        for ratio_name, operator, value in filters:
+            matrix, compare, transform = OPERATORS[operator]
+            column = getattr(self, matrix)[rows, self.columns[ratio_name]]
+            with np.errstate(invalid='ignore'):
+                mask &= compare(column, transform(value) if transform else value)
+        return mask
+
+    def ranks(self, ratio_name: str, descending: bool = False) -> np.ndarray:
+        """1-based rank of every security on a ratio, 0 where the ratio is missing."""
+        ranks = self.descending_ranks if descending else self.ascending_ranks
+        return np.nan_to_num(ranks[:, self.columns[ratio_name]], nan=0).astype(np.int64)
+
+    def select(self, mask: np.ndarray, sort_by: Optional[str] = None,
+               descending: bool = False, limit: Optional[int] = None) -> np.ndarray:
+        """
+        Indices of the matching securities, optionally sorted by a ratio
+        (missing values last) and cut to the top `limit`, when it is not None.
+        """
+        indices = np.flatnonzero(mask)
+        if sort_by:
+            column = self.column(sort_by)[indices]
+            keys = -column if descending else column
+            # NaN sorts last with argsort in both directions
+            indices = indices[np.argsort(keys, kind='stable')]
+        if limit is not None:
+            indices = indices[:limit]
+        return indices
+
+    def rows(self, indices: np.ndarray, ranks: Optional[np.ndarray] = None) -> List[Dict]:
+        """Matching securities as dicts, leaving out missing ratios."""
+        results = []
+        for index in indices:
+            row = {
+                'ticker': self.tickers[index],
+                'exchange': self.exchanges[index],
+                'full_symbol': self.full_symbols[index],
+                'date': self.dates[index],
+                'price': None if np.isnan(self.prices[index]) else float(self.prices[index]),
+            }
+            values = self.values[index]
+            row.update({
+                ratio_name: float(values[position])
+                for ratio_name, position in self.columns.items()
+                if not np.isnan(values[position])
+            })
+            if ranks is not None:
+                row['rank'] = int(ranks[index])
+            results.append(row)
+        return results
+
+
+def is_relative(filters: Iterable[Tuple[str, str, float]]) -> bool:
+    """Whether a parsed screen depends on the whole cross-section."""
+    return any(operator not in ABSOLUTE_OPERATORS for _, operator, _ in filters)
+
+
+def changed_securities(previous: RatioSnapshot, current: RatioSnapshot) -> np.ndarray:
+    """
+    Ids of the securities whose latest ratios differ between two snapshots,
+    including securities that appear in only one of them.
+    """
+    common, previous_index, current_index = np.intersect1d(
+        previous.security_ids, current.security_ids, assume_unique=True, return_indices=True
+    )
+    before = previous.values[previous_index]
+    after = current.values[current_index]
+    unchanged = (
+        ((before == after) | (np.isnan(before) & np.isnan(after))).all(axis=1)
+        & (previous.exchange_ids[previous_index] == current.exchange_ids[current_index])
+    )
+    added_or_removed = np.setxor1d(previous.security_ids, current.security_ids, assume_unique=True)
+    return np.union1d(common[~unchanged], added_or_removed)
+
+
+def get_ratio_snapshot() -> RatioSnapshot:
+    """Shared snapshot of the latest ratios, rebuilt after each ratio run."""
+    global _snapshot
+    version = get_version(RATIO_DATA_VERSION)
+    if _snapshot and _snapshot[0] == version and time.time() - _snapshot[1] < SNAPSHOT_TIMEOUT:
+        return _snapshot[2]
+
+    snapshot = get_or_compute(f'ratio_snapshot_{version}', RatioSnapshot.load, SNAPSHOT_TIMEOUT)
+    _snapshot = (version, time.time(), snapshot)
+    return snapshot
+
+
+def invalidate_ratio_snapshot():
+    """Call after a ratio run so every worker reloads the snapshot."""
+    version = bump_version(RATIO_DATA_VERSION)
+    logger.info(f"Financial ratio version bumped to {version}")
+    return version
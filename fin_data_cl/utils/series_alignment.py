@@ -0,0 +1,67 @@
+# fin_data_cl/utils/series_alignment.py
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def rebase(wide: pd.DataFrame) -> pd.DataFrame:
+    """Rebase every column to 100 at its first available value."""
+    first = wide.bfill().iloc[0]
+    return (wide * 100 / first).replace([np.inf, -np.inf], np.nan)
+
+
+def zscore(wide: pd.DataFrame) -> pd.DataFrame:
+    """Standardize every column to zero mean and unit (population) deviation."""
+    std = wide.std(ddof=0).replace(0, np.nan)
+    return (wide - wide.mean()) / std
+
+
+NORMALIZERS = {
+    'rebase': rebase,
+    'zscore': zscore,
+}
+
+
+def align_series(rows: Iterable[Sequence],
+                 metrics: List[str],
+                 normalize: Optional[str] = None) -> Dict:
+    """
+    Align (ticker, date, *metrics) rows of several securities on a shared date index.
+
+    Returns columnar arrays, one value per shared date and None where a
+    security has no data on that date:
+        {'dates': [...], 'tickers': [...], 'series': {metric: {ticker: [...]}}}
+    """
+    if normalize and normalize not in NORMALIZERS:
+        raise ValueError(f"Unknown normalization '{normalize}', use one of {', '.join(NORMALIZERS)}")
+
+    frame = pd.DataFrame.from_records(list(rows), columns=['ticker', 'date', *metrics])
+    if frame.empty:
+        return {'dates': [], 'tickers': [], 'series': {metric: {} for metric in metrics}}
+
+    frame[metrics] = frame[metrics].astype(float)
+    wide = (
+        frame.drop_duplicates(['ticker', 'date'], keep='last')
+        .set_index(['date', 'ticker'])[metrics]
+        .unstack('ticker')
+        .sort_index()
+    )
+    if normalize:
+        wide = NORMALIZERS[normalize](wide)
+
+    tickers = sorted(frame['ticker'].unique())
+    values = wide.to_numpy()
+    columns = {column: position for position, column in enumerate(wide.columns)}
+    series = {}
+    for metric in metrics:
+        series[metric] = {}
+        for ticker in tickers:
+            column = values[:, columns[(metric, ticker)]]
+            series[metric][ticker] = np.where(np.isnan(column), None, column).tolist()
+
+    return {
+        'dates': [day.isoformat() for day in wide.index],
+        'tickers': tickers,
+        'series': series,
+    }
@@ -0,0 +1,120 @@
+# fin_data_cl/utils/trading_calendar.py
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+import logging
+import time
+
+from django.utils import timezone
+
+from fin_data_cl.models import PriceData
+from finriv.utils.cache import get_or_compute, get_version, bump_version
+from finriv.utils.exchanges import ExchangeRegistry, Exchange
+
+logger = logging.getLogger(__name__)
+
+PRICE_DATA_VERSION = 'price_data'
+# Chart windows in calendar days, anything else means the full history ('Max')
+CHART_TIMEFRAME_DAYS = {'1W': 7, '1M': 30, '6M': 180, '1Y': 365, '5Y': 1825}
+# Calendars are rebuilt at least this often, even for ingests that do not bump the version
+CALENDAR_TIMEOUT = 60 * 60
+
+# {exchange_code or None: (price data version, built at, TradingCalendar)}
+_calendars = {}
+
+
+class TradingCalendar:
+    """
+    Sorted trading sessions of an exchange (or of all exchanges combined),
+    built from the dates with a close in PriceData. Every lookup is a binary search.
+    """
+
+    def __init__(self, sessions: List[date], exchange: Optional[Exchange] = None):
+        self.sessions = sorted(set(sessions))
+        self.exchange = exchange
+
+    def __len__(self):
+        return len(self.sessions)
+
+    @staticmethod
+    def load_sessions(exchange_code: Optional[str] = None) -> List[date]:
+        """Distinct dates with a closing price, oldest first."""
+        queryset = PriceData.objects.filter(close_price__isnull=False)
+        if exchange_code:
+            queryset = queryset.filter(security__exchange__code=exchange_code)
+        return list(queryset.values_list('date', flat=True).distinct().order_by('date'))
+
+    def session_on_or_before(self, day: date) -> Optional[date]:
+        """Most recent session not after `day`."""
+        index = bisect_right(self.sessions, day)
+        return self.sessions[index - 1] if index else None
+
+    def previous_session(self, day: date) -> Optional[date]:
+        """Most recent session strictly before `day`."""
+        index = bisect_left(self.sessions, day)
+        return self.sessions[index - 1] if index else None
+
+    def sessions_back(self, day: date, count: int) -> Optional[date]:
+        """Session `count` sessions before the session on or before `day`."""
+        index = bisect_right(self.sessions, day) - 1 - count
+        return self.sessions[index] if index >= 0 else None
+
+    def first_session_on_or_after(self, day: date) -> Optional[date]:
+        index = bisect_left(self.sessions, day)
+        return self.sessions[index] if index < len(self.sessions) else None
+
+    def sessions_between(self, start: date, end: date) -> List[date]:
+        """Sessions in the closed range [start, end]."""
+        return self.sessions[bisect_left(self.sessions, start):bisect_right(self.sessions, end)]
+
+    def latest_session(self, now: Optional[datetime] = None) -> Optional[date]:
+        """
+        Latest complete session. When the exchange is known, a session dated
+        today in the exchange's timezone only counts once trading has ended.
+        """
+        if not self.sessions:
+            return None
+
+        latest = self.sessions[-1]
+        if self.exchange is None:
+            return latest
+
+        local_now = (now or timezone.now()).astimezone(ZoneInfo(self.exchange.timezone))
+        if latest == local_now.date() and local_now.time() < self.exchange.trading_hours.trading_end:
+            return self.previous_session(latest)
+        return latest
+
+    def window_start(self, end: date, days: int) -> Optional[date]:
+        """First session inside the `days` calendar days ending at `end`."""
+        return self.first_session_on_or_after(end - timedelta(days=days))
+
+
+def get_trading_calendar(exchange_code: Optional[str] = None) -> TradingCalendar:
+    """
+    Shared trading calendar for an exchange code, or for all exchanges if None.
+
+    The session list is built once in the shared cache for each price data
+    version, and memoized in the process until the next price ingest.
+    """
+    version = get_version(PRICE_DATA_VERSION)
+    cached = _calendars.get(exchange_code)
+    if cached and cached[0] == version and time.time() - cached[1] < CALENDAR_TIMEOUT:
+        return cached[2]
+
+    sessions = get_or_compute(
+        f'trading_calendar_{exchange_code or "ALL"}_{version}',
+        lambda: TradingCalendar.load_sessions(exchange_code),
+        CALENDAR_TIMEOUT
+    )
+    exchange = ExchangeRegistry().get_exchange(exchange_code) if exchange_code else None
+    calendar = TradingCalendar(sessions, exchange)
+    _calendars[exchange_code] = (version, time.time(), calendar)
+    return calendar
+
+
+def invalidate_trading_calendars():
+    """Call after new prices are stored so every worker picks up the new sessions."""
+    version = bump_version(PRICE_DATA_VERSION)
+    logger.info(f"Price data version bumped to {version}")
+    return version
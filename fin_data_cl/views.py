@@ -2,6 +2,7 @@
 from .models import FinancialData, FinancialRatio, FinancialReport, RiskComparison, PriceData, Security
 from django.db.models import Q, Subquery, OuterRef, Max, F, ExpressionWrapper, FloatField
 from .utils.search_view import generalized_search_view
+from .utils.screener_engine import ABSOLUTE_OPERATORS, SCREEN_RATIOS, get_ratio_snapshot, parse_filters
 from .forms import FinancialReportSearchForm, FinancialRisksSearchForm
 from django.http import JsonResponse
 from django.shortcuts import render
@@ -178,48 +179,30 @@ def search_financial_report(request):
 
 class ScreenerService:
     """Service class to handle screener logic"""
-    VALID_RATIOS = [
-        'pe_ratio', 'pb_ratio', 'ps_ratio', 'peg_ratio', 'ev_ebitda',
-        'gross_profit_margin', 'operating_profit_margin', 'net_profit_margin',
-        'return_on_assets', 'return_on_equity', 'debt_to_equity',
-        'current_ratio', 'quick_ratio', 'dividend_yield', 'before_dividend_yield'
-    ]
+    VALID_RATIOS = SCREEN_RATIOS
 
     @classmethod
     def build_filter_query(cls, filters):
         q_filters = Q()
-        for filter_string in filters:
-            try:
-                ratio_name, operator, value = filter_string.split(':')
-                if ratio_name in cls.VALID_RATIOS and operator in ['gt', 'lt', 'gte', 'lte']:
-                    filter_expr = f'{ratio_name}__{operator}'
-                    q_filters &= Q(**{filter_expr: float(value)})
-            except ValueError:
-                continue
+        for ratio_name, operator, value in parse_filters(filters, cls.VALID_RATIOS):
+            # Relative filters need the cross-section, see get_filtered_ratios
+            if operator in ABSOLUTE_OPERATORS:
+                q_filters &= Q(**{f'{ratio_name}__{operator}': value})
         return q_filters
 
     @classmethod
-    def get_filtered_ratios(cls, filters):
-        q_filters = cls.build_filter_query(filters)
-        latest_date_subquery = FinancialRatio.objects.filter(
-            security=OuterRef('security')
-        ).order_by('-date').values('date')[:1]
-
-        filtered_ratios = FinancialRatio.objects.filter(
-            date=Subquery(latest_date_subquery)
-        ).filter(q_filters).select_related('security', 'security__exchange')
-
-        return [
-            {
-                'ticker': ratio.security.ticker,
-                'exchange': ratio.security.exchange.code,
-                'full_symbol': ratio.security.full_symbol,
-                'date': ratio.date,
-                'price': ratio.price,
-                **{field: getattr(ratio, field) for field in cls.VALID_RATIOS if getattr(ratio, field) is not None},
-            }
-            for ratio in filtered_ratios
-        ]
+    def get_filtered_ratios(cls, filters, exchange_id=None, sort_by=None, descending=False, limit=None):
+        """
+        Screen the latest ratios of every security in memory.
+        Results are sorted by `sort_by` (and ranked on it) when given.
+        """
+        snapshot = get_ratio_snapshot()
+        mask = snapshot.mask(parse_filters(filters, cls.VALID_RATIOS), exchange_id)
+        if sort_by not in cls.VALID_RATIOS:
+            sort_by = None
+        indices = snapshot.select(mask, sort_by, descending, limit)
+        ranks = snapshot.ranks(sort_by, descending) if sort_by else None
+        return snapshot.rows(indices, ranks)
 
 
 def screener(request):
@@ -233,7 +216,19 @@ def screener(request):
 def filter_ratios(request):
     """API view to handle ratio filtering"""
     filters = request.GET.getlist('filters[]')
-    data = ScreenerService.get_filtered_ratios(filters)
+    limit = request.GET.get('limit')
+    exchange_id = request.GET.get('exchange_id')
+    if limit and not (limit.isdigit() and int(limit) > 0):
+        return JsonResponse({'error': 'limit must be a positive integer'}, status=400)
+    if exchange_id and not exchange_id.isdigit():
+        return JsonResponse({'error': 'exchange_id must be an integer'}, status=400)
+    data = ScreenerService.get_filtered_ratios(
+        filters,
+        exchange_id=exchange_id,
+        sort_by=request.GET.get('sort'),
+        descending=request.GET.get('order') == 'desc',
+        limit=int(limit) if limit else None
+    )
     return JsonResponse(data, safe=False)
 
 
@@ -1,18 +1,32 @@
 # viewsets.py
 from .models import FinancialReport, FinancialRatio, RiskComparison, DividendData, PriceData, FinancialData, Security, \
-    Exchange
+    Exchange, SavedScreen
+from .utils.trading_calendar import CHART_TIMEFRAME_DAYS, get_trading_calendar
+from .utils.series_alignment import align_series
+from .utils.screener_engine import SCREEN_RATIOS, get_ratio_snapshot, parse_filters
+from .utils.saved_screens import reset_screen_results
+from .utils.factor_scoring import WEIGHT_PRESETS, parse_weights, score_rows
+from .utils.correlation import DEFAULT_MIN_OVERLAP, correlation_matrix
 from .serializers import FinancialReportSerializer, FinancialRatioSerializer, RiskComparisonSerializer, \
-    DividendDataSerializer, PriceDataSerializer, FinancialDataSerializer
+    DividendDataSerializer, PriceDataSerializer, FinancialDataSerializer, SavedScreenSerializer, \
+    SavedScreenEventSerializer
 import logging
 logger = logging.getLogger(__name__)
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
 from django.db.models.functions import ExtractYear, ExtractMonth
 from django.utils import timezone
-from datetime import timedelta
+from django.http import HttpResponse
+from datetime import date, timedelta
 from django.db.models import Sum, Max, Q, DecimalField
+from price_plots.plot_prices import StockVisualizer
+from price_plots.utils.cache import get_or_render_figure
 import calendar
+import numpy as np
+
+MAX_COMPARED_SECURITIES = 20
 
 
 class BaseFinancialViewSet(viewsets.ReadOnlyModelViewSet):
@@ -26,6 +40,9 @@ class BaseFinancialViewSet(viewsets.ReadOnlyModelViewSet):
     supports_time_range = False  # For fetching data within date ranges
     supports_latest = False  # For fetching latest data points
     supports_screening = False  # For complex filtering/screening
+    uses_trading_calendar = False  # Resolve latest dates from the shared trading calendar
+    supports_comparison = False  # For aligned multi-security series
+    default_comparison_metrics = []
 
     def get_queryset(self):
         """
@@ -60,40 +77,46 @@ class BaseFinancialViewSet(viewsets.ReadOnlyModelViewSet):
 
         return queryset
 
+    def get_latest_dates(self, queryset):
+        """
+        Return the latest date in the dataset and the date before it that is
+        still accepted as current, to handle end-of-day updates.
+        """
+        params = self.request.query_params
+        if self.uses_trading_calendar and not (params.get('year') or params.get('month')):
+            latest = queryset.order_by('-date').values('date', 'security__exchange__code').first()
+            if not latest:
+                return None, None
+            # A single security is checked against its own exchange's sessions
+            single_security = self.kwargs.get('security_pk') or params.get('security')
+            sessions = get_trading_calendar(latest['security__exchange__code'] if single_security else None)
+            # The calendar only sets the tolerance, a security that stopped trading keeps its last row
+            latest_session = sessions.latest_session()
+            latest_possible_date = min(latest_session, latest['date']) if latest_session else latest['date']
+            return latest_possible_date, sessions.previous_session(latest_possible_date)
+
+        latest = queryset.order_by('-date').values('date').first()
+        if not latest:
+            return None, None
+        return latest['date'], latest['date'] - timedelta(days=1)
+
     def get_latest_queryset(self):
         """
         Get the latest data points for each security, with a 1-day tolerance
-        to handle end-of-day updates.
+        (one session for price data) to handle end-of-day updates.
         """
         queryset = self.get_queryset()
+        latest_possible_date, tolerated_date = self.get_latest_dates(queryset)
 
-        if not queryset.exists():
+        if latest_possible_date is None:
             return queryset.none()
 
-        # Find the absolute latest date in the dataset
-        latest_possible_date = queryset.order_by('-date').values('date').first()['date']
-
-        # Allow for data from either the latest date or one day before
-        acceptable_dates = [
-            latest_possible_date,
-            latest_possible_date - timedelta(days=1)
-        ]
-
-        # Get securities with their latest dates
-        latest_dates = queryset.values('security').annotate(
-            max_date=Max('date')
-        )
-
-        # Build query for securities with data on either acceptable date
-        date_filters = Q()
-        for item in latest_dates:
-            if item['max_date'] in acceptable_dates:
-                date_filters |= Q(
-                    security=item['security'],
-                    date=item['max_date']
-                )
+        acceptable_dates = [day for day in (latest_possible_date, tolerated_date) if day]
+        recent = queryset.filter(date__in=acceptable_dates)
 
-        return queryset.filter(date_filters)
+        # Keep the tolerated date only for securities without data on the latest date
+        updated_securities = recent.filter(date=latest_possible_date).values('security_id')
+        return recent.filter(Q(date=latest_possible_date) | ~Q(security_id__in=updated_securities))
     @action(detail=False)
     def available_exchanges(self, request):
         """
@@ -248,6 +271,68 @@ class BaseFinancialViewSet(viewsets.ReadOnlyModelViewSet):
 
         return Response(self.serializer_class(queryset, many=True).data)
 
+    @action(detail=False)
+    def compare(self, request):
+        """
+        Get several securities and metrics aligned on a shared date index.
+        Only available if supports_comparison is True.
+
+        Query Parameters:
+            tickers (str): Comma separated tickers
+            metrics (str): Comma separated numeric fields (defaults per model)
+            start_date, end_date (str): Optional date range
+            normalize (str): Optional 'rebase' (to 100) or 'zscore'
+        """
+        if not self.supports_comparison:
+            return Response(
+                {"error": "Comparison queries not supported"},
+                status=400
+            )
+
+        tickers = [ticker for ticker in request.query_params.get('tickers', '').split(',') if ticker]
+        metrics = [metric for metric in request.query_params.get('metrics', '').split(',') if metric]
+        metrics = metrics or self.default_comparison_metrics
+        normalize = request.query_params.get('normalize')
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+
+        if not tickers:
+            return Response({"error": "tickers is required"}, status=400)
+        try:
+            start_date = date.fromisoformat(start_date) if start_date else None
+            end_date = date.fromisoformat(end_date) if end_date else None
+        except ValueError:
+            return Response({"error": "start_date and end_date must be YYYY-MM-DD dates"}, status=400)
+        if len(tickers) > MAX_COMPARED_SECURITIES:
+            return Response(
+                {"error": f"At most {MAX_COMPARED_SECURITIES} securities can be compared"},
+                status=400
+            )
+
+        numeric_fields = {
+            field.name for field in self.model._meta.fields
+            if isinstance(field, DecimalField)
+        }
+        invalid_metrics = [metric for metric in metrics if metric not in numeric_fields]
+        if not metrics or invalid_metrics:
+            return Response(
+                {"error": f"Invalid metrics: {', '.join(invalid_metrics) or 'none given'}"},
+                status=400
+            )
+
+        # Everything in a single query, aligned in pandas
+        queryset = self.model.objects.filter(security__ticker__in=tickers)
+        if start_date:
+            queryset = queryset.filter(date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(date__lte=end_date)
+        rows = queryset.order_by('date').values_list('security__ticker', 'date', *metrics)
+
+        try:
+            return Response(align_series(rows, metrics, normalize))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
     @action(detail=False)
     def available_dates(self, request) -> Response:
         """
@@ -295,14 +380,191 @@ class FinancialRatioViewSet(BaseFinancialViewSet):
     supports_screening = True
     queryset = FinancialRatio.objects.all()  # Required by DRF
 
+    @action(detail=False)
+    def screen(self, request):
+        """
+        Screen the latest ratios of every security with the in-memory engine.
+
+        Query Parameters:
+            filters[] (list): 'ratio:operator:value' with gt, lt, gte, lte, or the
+                exchange-relative pct_lte, pct_gte, z_gt, z_lt, top and bottom
+            exchange_id (int): Optional exchange
+            sort (str): Optional ratio to sort and rank by
+            order (str): 'asc' (default) or 'desc'
+            limit (int): Optional top-N cut
+        """
+        params = request.query_params
+        sort_by = params.get('sort')
+        descending = params.get('order') == 'desc'
+        limit = params.get('limit')
+        exchange_id = params.get('exchange_id')
+        if sort_by and sort_by not in SCREEN_RATIOS:
+            return Response({"error": f"Cannot sort by {sort_by}"}, status=400)
+        if limit and not (limit.isdigit() and int(limit) > 0):
+            return Response({"error": "limit must be a positive integer"}, status=400)
+        if exchange_id and not exchange_id.isdigit():
+            return Response({"error": "exchange_id must be an integer"}, status=400)
+
+        snapshot = get_ratio_snapshot()
+        mask = snapshot.mask(parse_filters(params.getlist('filters[]', [])), exchange_id)
+        indices = snapshot.select(mask, sort_by, descending, int(limit) if limit else None)
+
+        # Only the matching rows are loaded, in screen order
+        ratio_ids = snapshot.ratio_ids[indices].tolist()
+        ratios = FinancialRatio.objects.select_related('security', 'security__exchange').in_bulk(ratio_ids)
+        data = self.serializer_class([ratios[pk] for pk in ratio_ids if pk in ratios], many=True).data
+
+        if sort_by:
+            ranks = snapshot.ranks(sort_by, descending)
+            rank_by_id = dict(zip(ratio_ids, ranks[indices].tolist()))
+            for row in data:
+                row['rank'] = rank_by_id[row['id']]
+        return Response(data)
+
+    @action(detail=False)
+    def score(self, request):
+        """
+        Rank the universe on a composite score of winsorized, normalized ratios.
+
+        Query Parameters:
+            preset (str): One of WEIGHT_PRESETS (value, quality, yield, balanced)
+            weights (str): Custom 'ratio:weight,...' weights, overriding preset
+            exchange_id (int): Optional exchange to list
+            limit (int): Number of securities to return (default 50)
+        """
+        params = request.query_params
+        limit = params.get('limit', '50')
+        exchange_id = params.get('exchange_id')
+        if not (limit.isdigit() and int(limit) > 0):
+            return Response({"error": "limit must be a positive integer"}, status=400)
+        if exchange_id and not exchange_id.isdigit():
+            return Response({"error": "exchange_id must be an integer"}, status=400)
+
+        try:
+            if params.get('weights'):
+                weights = parse_weights(params['weights'])
+            else:
+                weights = WEIGHT_PRESETS[params.get('preset', 'balanced')]
+        except KeyError:
+            return Response(
+                {"error": f"Unknown preset, use one of {', '.join(WEIGHT_PRESETS)}"},
+                status=400
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response({
+            'weights': weights,
+            'results': score_rows(weights, exchange_id, int(limit)),
+        })
+
 
 class PriceDataViewSet(BaseFinancialViewSet):
     model = PriceData
     serializer_class = PriceDataSerializer
     supports_time_range = True
     supports_latest = True
+    uses_trading_calendar = True
+    supports_comparison = True
+    default_comparison_metrics = ['close_price']
     queryset = PriceData.objects.all()
 
+    @staticmethod
+    def _get_start_date(end_date, timeframe):
+        """Start of the chart window ending at end_date, None for 'Max'."""
+        days = CHART_TIMEFRAME_DAYS.get(timeframe)
+        return end_date - timedelta(days=days) if days else None
+
+    @action(detail=False, methods=['get'])
+    def figure(self, request):
+        """
+        Get the candlestick figure of a security as Plotly JSON, for the
+        client-side Plotly instead of a server-rendered HTML fragment.
+
+        Query Parameters:
+            ticker (str): Security ticker
+            timeframe (str): 1W, 1M, 6M, 1Y, 5Y or Max
+            ma (list): Moving average periods to overlay (e.g. ?ma=20&ma=50)
+            volume (str): 'false' to leave out the volume subplot
+        """
+        ticker = request.query_params.get('ticker')
+        timeframe = request.query_params.get('timeframe', '1Y')
+        show_volume = request.query_params.get('volume', 'true').lower() != 'false'
+
+        if not ticker:
+            return Response({'error': 'ticker parameter is required'}, status=400)
+        try:
+            ma_periods = sorted({int(period) for period in request.query_params.getlist('ma')})
+        except ValueError:
+            return Response({'error': 'ma periods must be integers'}, status=400)
+        if timeframe not in CHART_TIMEFRAME_DAYS:
+            timeframe = 'Max'
+
+        try:
+            security = Security.objects.select_related('exchange').get(ticker=ticker)
+
+            def render():
+                end_date = get_trading_calendar(security.exchange.code).latest_session() or timezone.now().date()
+                start_date = self._get_start_date(end_date, timeframe) or date.min
+                visualizer = StockVisualizer(security)
+                if not visualizer.load_data(start_date, end_date):
+                    raise LookupError('; '.join(visualizer.get_errors()))
+                figure_json = visualizer.to_json(show_volume=show_volume, ma_periods=ma_periods)
+                if figure_json is None:
+                    raise ValueError('; '.join(visualizer.get_errors()))
+                return figure_json
+
+            figure_json = get_or_render_figure(security.id, timeframe, ma_periods, show_volume, render)
+
+            # Already serialized, skip the DRF renderer
+            return HttpResponse(figure_json, content_type='application/json')
+
+        except Security.DoesNotExist:
+            return Response({'error': f'Security {ticker} not found'}, status=404)
+        except LookupError as e:
+            return Response({'error': str(e)}, status=404)
+        except Exception as e:
+            logger.error(f"Error rendering figure for {ticker}: {str(e)}")
+            return Response({'error': str(e)}, status=500)
+
+    @action(detail=False, methods=['get'])
+    def correlation(self, request):
+        """
+        Get the pairwise-complete correlation matrix of daily total returns.
+
+        Query Parameters:
+            tickers (str): Comma separated tickers, or
+            exchange (str): Exchange code, for all its active securities
+            timeframe (str): 1M, 6M, 1Y (default) or 5Y
+            min_overlap (int): Shared sessions a pair needs to get a value (default 20)
+        """
+        tickers = [ticker for ticker in request.query_params.get('tickers', '').split(',') if ticker]
+        exchange_code = request.query_params.get('exchange')
+        timeframe = request.query_params.get('timeframe', '1Y')
+
+        if timeframe not in CHART_TIMEFRAME_DAYS or timeframe == '1W':
+            return Response({'error': 'timeframe must be one of 1M, 6M, 1Y or 5Y'}, status=400)
+        try:
+            min_overlap = int(request.query_params.get('min_overlap', DEFAULT_MIN_OVERLAP))
+        except ValueError:
+            return Response({'error': 'min_overlap must be an integer'}, status=400)
+        if not tickers and not exchange_code:
+            return Response({'error': 'tickers or exchange is required'}, status=400)
+
+        securities = Security.objects.filter(is_active=True).select_related('exchange').order_by('ticker')
+        if exchange_code:
+            securities = securities.filter(exchange__code=exchange_code)
+        if tickers:
+            securities = securities.filter(ticker__in=tickers)
+        securities = list(securities)
+        if not securities:
+            return Response({'error': 'No matching securities found'}, status=404)
+
+        return Response({
+            'timeframe': timeframe,
+            **correlation_matrix(securities, CHART_TIMEFRAME_DAYS[timeframe], min_overlap)
+        })
+
     @action(detail=False, methods=['get'])
     def candlestick_data(self, request):
         """Get historical price data for candlestick plotting."""
@@ -313,26 +575,19 @@ class PriceDataViewSet(BaseFinancialViewSet):
             security = Security.objects.get(ticker=ticker)
             queryset = PriceData.objects.filter(security=security)
 
-            # Define the latest date and calculate start date
-            latest_possible_date = queryset.order_by('-date').values('date').first()['date']
+            # Latest session of the security's exchange, falling back to the
+            # security's own last date when it has not traded recently
+            latest_possible_date = get_trading_calendar(security.exchange.code).latest_session()
+            if latest_possible_date is None or not queryset.filter(date=latest_possible_date).exists():
+                latest = queryset.order_by('-date').values('date').first()
+                latest_possible_date = latest['date'] if latest else None
             if not latest_possible_date:
                 return Response({'error': 'No data available'}, status=404)
 
-            if timeframe == '1W':
-                start_date = latest_possible_date - timedelta(days=7)
-            elif timeframe == '1M':
-                start_date = latest_possible_date - timedelta(days=30)
-            elif timeframe == '6M':
-                start_date = latest_possible_date - timedelta(days=180)
-            elif timeframe == '1Y':
-                start_date = latest_possible_date - timedelta(days=365)
-            elif timeframe == '5Y':
-                start_date = latest_possible_date - timedelta(days=1825)
-            else:  # 'Max'
-                start_date = None
+            start_date = self._get_start_date(latest_possible_date, timeframe)
 
             if start_date:
-                queryset = queryset.filter(date__gte=start_date)
+                queryset = queryset.filter(date__gte=start_date, date__lte=latest_possible_date)
 
             queryset = queryset.order_by('date')
 
@@ -413,6 +668,7 @@ class FinancialDataViewSet(BaseFinancialViewSet):
     serializer_class = FinancialDataSerializer
     supports_latest = True
     supports_time_range = True  # Enable time range support for plotting
+    supports_comparison = True
 
     @action(detail=False, methods=['GET'])
     def metrics(self, request):
@@ -481,3 +737,37 @@ class RiskComparisonViewSet(BaseFinancialViewSet):
     #         })
     #
     #     return queryset
+
+
+class SavedScreenViewSet(viewsets.ModelViewSet):
+    """
+    Screens saved by the current user. Results are maintained after each
+    ratio run, so listing them does not re-run the screen.
+    """
+    serializer_class = SavedScreenSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return SavedScreen.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        reset_screen_results(serializer.save(user=self.request.user))
+
+    def perform_update(self, serializer):
+        reset_screen_results(serializer.save())
+
+    @action(detail=True)
+    def results(self, request, pk=None):
+        """Securities currently passing the screen, with their latest ratios."""
+        screen = self.get_object()
+        snapshot = get_ratio_snapshot()
+        security_ids = list(screen.results.values_list('security_id', flat=True))
+        indices = np.flatnonzero(np.isin(snapshot.security_ids, security_ids))
+        return Response(snapshot.rows(indices))
+
+    @action(detail=True)
+    def events(self, request, pk=None):
+        """Latest entries and exits of the screen."""
+        screen = self.get_object()
+        events = screen.events.select_related('security__exchange')[:100]
+        return Response(SavedScreenEventSerializer(events, many=True).data)
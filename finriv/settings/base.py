@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -109,6 +110,38 @@ MAX_CONSECUTIVE_ERRORS = int(os.getenv('MAX_CONSECUTIVE_ERRORS', 5))  # max erro
 
 ANALYSIS_CACHE_TIMEOUT = 60 * 15  # 15 minutes
 
+# CMF scraping
+SCRAPING_WORKERS = int(os.getenv('SCRAPING_WORKERS', 8))  # concurrent downloads
+SCRAPING_PER_HOST = int(os.getenv('SCRAPING_PER_HOST', 4))  # concurrent requests to a single host
+
+# Portfolio analytics
+RISK_FREE_RATE = float(os.getenv('RISK_FREE_RATE', 0.0))  # annual rate used in Sharpe ratios
+
+# Shared cache so all gunicorn workers reuse the same computed values.
+# Redis when REDIS_URL is set, otherwise a file-based cache shared by the
+# workers on the same host (also used for local development and tests).
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'finriv',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'finriv_cache')),
+            'KEY_PREFIX': 'finriv',
+        }
+    }
+
+CACHE_EARLY_REFRESH_BETA = float(os.getenv('CACHE_EARLY_REFRESH_BETA', 1.0))  # XFetch aggressiveness
+CACHE_LOCK_TIMEOUT = int(os.getenv('CACHE_LOCK_TIMEOUT', 60))  # seconds a recompute lock is held at most
+CACHE_WAIT_TIMEOUT = int(os.getenv('CACHE_WAIT_TIMEOUT', 10))  # seconds to wait for another worker's result
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,
@@ -0,0 +1,122 @@
+# finriv/utils/cache.py
+"""
+Helpers on top of the shared Django cache.
+
+All gunicorn workers talk to the same cache backend (see CACHES in settings),
+so an expensive value only needs to be computed by one of them. get_or_compute
+adds two protections against cache stampedes:
+
+- Request coalescing: on a miss, only the worker that grabs the lock computes
+  the value, the others wait for it (or keep serving the stale copy).
+- Early probabilistic refresh (XFetch): shortly before a key expires, a
+  single worker refreshes it, with a probability that grows as expiry
+  approaches and with the time the value takes to compute.
+"""
+import logging
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BETA = getattr(settings, 'CACHE_EARLY_REFRESH_BETA', 1.0)
+LOCK_TIMEOUT = getattr(settings, 'CACHE_LOCK_TIMEOUT', 60)
+WAIT_TIMEOUT = getattr(settings, 'CACHE_WAIT_TIMEOUT', 10)
+POLL_INTERVAL = 0.05
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _store(key, value, delta, timeout):
+    # Keep the entry around for another `timeout` seconds after its logical
+    # expiry so other workers can serve it while one of them refreshes.
+    entry = (value, delta, time.time() + timeout)
+    cache.set(key, entry, timeout * 2)
+
+
+def _recompute(key, compute, timeout, lock_key=None):
+    start = time.time()
+    try:
+        value = compute()
+        _store(key, value, time.time() - start, timeout)
+        return value
+    finally:
+        if lock_key:
+            cache.delete(lock_key)
+
+
+def get_or_compute(key, compute, timeout, beta=DEFAULT_BETA,
+                   lock_timeout=LOCK_TIMEOUT, wait_timeout=WAIT_TIMEOUT):
+    """
+    Return the cached value for `key`, calling `compute()` to build it when needed.
+
+    Args:
+        key: Cache key
+        compute: Zero-argument callable returning the value (must be picklable)
+        timeout: Logical lifetime of the value in seconds
+        beta: XFetch aggressiveness, values > 1 favour earlier refreshes
+        lock_timeout: Seconds after which a held recompute lock is abandoned
+        wait_timeout: Seconds a worker waits on a cold miss before computing itself
+    """
+    lock_key = _lock_key(key)
+    entry = cache.get(key)
+
+    if entry is not None:
+        value, delta, expiry = entry
+        # 1 - random() lies in (0, 1], so the log is always defined
+        if time.time() - delta * beta * math.log(1.0 - random.random()) < expiry:
+            return value
+
+        # Expired (or picked for early refresh): one worker recomputes,
+        # everyone else keeps serving the current value meanwhile
+        if not cache.add(lock_key, 1, lock_timeout):
+            return value
+        logger.debug(f"Refreshing cache key {key}")
+        return _recompute(key, compute, timeout, lock_key)
+
+    # Cold miss: coalesce concurrent requests behind a single computation
+    if cache.add(lock_key, 1, lock_timeout):
+        return _recompute(key, compute, timeout, lock_key)
+
+    deadline = time.time() + wait_timeout
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+
+    logger.warning(f"Timed out waiting for cache key {key}, computing it locally")
+    return _recompute(key, compute, timeout)
+
+
+def invalidate(key):
+    """Drop a value stored through get_or_compute."""
+    cache.delete(key)
+
+
+def get_version(name):
+    """Current version number of a named dataset (starts at 1)."""
+    key = f'{name}:version'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(name):
+    """
+    Mark a named dataset as changed, so every worker rebuilds the values
+    derived from it (e.g. after a price ingest or a ratio run).
+    """
+    key = f'{name}:version'
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+        return 2
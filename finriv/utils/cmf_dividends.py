@@ -0,0 +1,147 @@
+# finriv/utils/cmf_dividends.py
+"""
+Dividend statistics of the CMF, fetched per issuer on the shared download pool.
+
+Every issuer's sheet is parsed as soon as it arrives and appended to a CSV
+sink, so a long run keeps what it already fetched if it is interrupted. Delta
+runs ask each issuer only for the months since its last stored dividend.
+"""
+from dataclasses import dataclass
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+import pandas as pd
+import requests
+from django.db.models import Max
+
+from fin_data_cl.models import DividendData
+from finriv.utils.cmf_parsing import rut_number
+from finriv.utils.http_downloads import ConcurrentDownloader
+
+logger = logging.getLogger(__name__)
+
+DIVIDEND_COLUMNS = ['Date', 'Dividend', 'Ticker', 'Series', 'DividendType']
+DIVIDENDS_URL = (
+    "https://www.cmfchile.cl/institucional/estadisticas/acc_dividendos1grid.php?"
+    "lang=es&sociedad%5B%5D={rut}&tipodiv=0&mes={month}&anno={year}&"
+    "mes2=0&anno2={year_f}&xls=y&semana=&vsn=2"
+)
+
+
+@dataclass
+class DividendJob:
+    """Sheet to fetch for one ticker, with the date after which its dividends are new."""
+    ticker: str
+    series: str
+    url: str
+    since: Optional[date] = None
+
+
+def ticker_series(ticker: str) -> str:
+    """Share series from the ticker naming convention, 'U' (universal) by default."""
+    for series in ('A', 'B', 'C'):
+        if f'-{series}' in ticker:
+            return series
+    return 'U'
+
+
+def dividends_url(rut: str, year_i: int, year_f: int, since: Optional[date] = None) -> str:
+    """Sheet of an issuer from `year_i` (all months), or from the month of `since`."""
+    if since is not None:
+        return DIVIDENDS_URL.format(rut=rut_number(rut), month=since.month, year=since.year, year_f=year_f)
+    return DIVIDENDS_URL.format(rut=rut_number(rut), month=0, year=year_i, year_f=year_f)
+
+
+def last_dividend_dates(tickers: Iterable[str], exchange_code: str = 'SCL') -> Dict[str, date]:
+    """Date of the last stored dividend of every ticker that has one."""
+    rows = DividendData.objects.filter(
+        security__exchange__code=exchange_code, security__ticker__in=list(tickers)
+    ).values('security__ticker').annotate(last=Max('date'))
+    return {row['security__ticker']: row['last'] for row in rows if row['last']}
+
+
+def build_jobs(companies: pd.DataFrame, year_i: int, year_f: int,
+               last_dates: Optional[Dict[str, date]] = None) -> List[DividendJob]:
+    """One job per company with a valid RUT, starting after its last stored dividend in delta runs."""
+    last_dates = last_dates or {}
+    jobs = []
+    for ticker, rut in zip(companies['Ticker'], companies['RUT']):
+        if rut_number(rut) is None:
+            continue
+        since = last_dates.get(ticker)
+        jobs.append(DividendJob(ticker, ticker_series(ticker), dividends_url(rut, year_i, year_f, since), since))
+    return jobs
+
+
+def select_dividends(sheet: pd.DataFrame, job: DividendJob, types) -> pd.DataFrame:
+    """Dividends of the job's series and `types` in a CMF sheet, newer than `job.since`."""
+    sheet = sheet[sheet['Serieafecta'].isin([job.series, 'U']) & sheet['Tipodedividendo(1)'].isin(types)]
+    dividends = pd.DataFrame({
+        'Date': pd.to_datetime(sheet['Fecha']),
+        # Amount per share in its currency, times the exchange rate
+        'Dividend': sheet.iloc[:, 12] * sheet['Tasadecambio'],
+        'Ticker': job.ticker,
+        'Series': job.series,
+        'DividendType': sheet['Tipodedividendo(1)'],
+    }, columns=DIVIDEND_COLUMNS)
+    if job.since is not None:
+        dividends = dividends[dividends['Date'] > pd.Timestamp(job.since)]
+    return dividends.reset_index(drop=True)
+
+
+def parse_dividends(content: bytes, job: DividendJob, types) -> pd.DataFrame:
+    """Dividends of a downloaded CMF sheet."""
+    sheet = pd.read_excel(BytesIO(content), header=6, engine='openpyxl')
+    return select_dividends(sheet, job, types)
+
+
+class DividendSink:
+    """CSV file the dividends of every issuer are appended to as they arrive."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.rows = 0
+        self._lock = Lock()
+        pd.DataFrame(columns=DIVIDEND_COLUMNS).to_csv(self.path, index=False)
+
+    def append(self, dividends: pd.DataFrame):
+        if dividends.empty:
+            return
+        with self._lock:
+            dividends[DIVIDEND_COLUMNS].to_csv(self.path, mode='a', header=False, index=False)
+            self.rows += len(dividends)
+
+
+def fetch_dividends(pool: ConcurrentDownloader, jobs: List[DividendJob], types,
+                    sink: Optional[DividendSink] = None) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Fetch and parse the jobs on the pool, appending every result to `sink`.
+    Returns the dividends sorted by date and the tickers that failed.
+    """
+    failed = []
+
+    def fetch(job):
+        try:
+            dividends = parse_dividends(pool.get(job.url).content, job, types)
+        except requests.RequestException as e:
+            logger.error(f"Error fetching dividends of {job.ticker}: {e}")
+            failed.append(job.ticker)
+            return None
+        except Exception as e:
+            # The CMF answers issuers without dividends with sheets that do not parse
+            logger.warning(f"Error processing dividends of {job.ticker}: {e}")
+            return None
+        if sink is not None:
+            sink.append(dividends)
+        logger.info(f"Parsed {len(dividends)} dividends of {job.ticker}")
+        return dividends
+
+    frames = [frame for frame in pool.map(fetch, jobs) if frame is not None and not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=DIVIDEND_COLUMNS), failed
+    return pd.concat(frames).sort_values('Date', kind='stable').reset_index(drop=True), failed
@@ -0,0 +1,127 @@
+# finriv/utils/cmf_parsing.py
+"""
+Parsing helpers for CMF pages, kept free of network and HTML-tree dependencies.
+"""
+from html import unescape
+from typing import Dict, Iterable, List, Optional
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+HREF_PATTERN = re.compile(r'''href\s*=\s*["']([^"']*)["']''', re.IGNORECASE)
+# Whole digit runs as long as a RUT number (without verifier digit)
+RUT_TOKEN_PATTERN = re.compile(r'(?<!\d)\d{6,9}(?!\d)')
+
+
+def rut_number(rut) -> Optional[str]:
+    """RUT number without verifier digit or dots ('90.227.000-0' -> '90227000'), None if malformed."""
+    number = str(rut).split('-')[0].replace('.', '').strip()
+    return number if number.isdigit() else None
+
+
+def extract_hrefs(content) -> List[str]:
+    """Every href of a page, unescaped, in document order."""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+    return [unescape(href) for href in HREF_PATTERN.findall(content)]
+
+
+def build_rut_index(ruts: Iterable) -> Dict[str, List[int]]:
+    """RUT number -> positions of the companies with it (series share a RUT)."""
+    index = {}
+    for position, rut in enumerate(ruts):
+        number = rut_number(rut)
+        if number:
+            index.setdefault(number, []).append(position)
+    return index
+
+
+def match_company_links(hrefs: Iterable[str], ruts: List, base_url: str = '') -> List[str]:
+    """
+    Link of every company, matched by the RUT numbers found in the hrefs,
+    'Not Found' for companies without one. When several links carry the same
+    RUT, the last one wins.
+
+    The RUT tokens of each href are extracted once and looked up in a dict,
+    instead of testing every company against every link.
+    """
+    index = build_rut_index(ruts)
+    out = ['Not Found'] * len(ruts)
+    for href in hrefs:
+        for token in set(RUT_TOKEN_PATTERN.findall(href)):
+            for position in index.get(token, ()):
+                out[position] = f'{base_url}{href}'
+    return out
+
+
+# RUT with or without thousands dots: '96.505.760-K', '90227000-0'
+RUT_PATTERN = re.compile(r'(?<![\d.])\d{1,3}(?:\.?\d{3}){2}-[\dkK](?![\w-])')
+COUNTER_PREFIX = '0123456789.- '
+PAGE_FOOTER_PATTERN = re.compile(r'^p[aá]gina \d+ de \d+$', re.IGNORECASE)
+
+
+def _issuer_entry(lines: List[str]) -> List[Dict[str, str]]:
+    """
+    Tickers, name and RUT of one numbered entry of the issuer list:
+    '<n> <ticker> [<series tickers>] <name...> <column> <RUT>'.
+    """
+    text = ' '.join(lines).lstrip(COUNTER_PREFIX)
+    ruts = list(RUT_PATTERN.finditer(text))
+    if not ruts:
+        return []
+    tokens = text[:ruts[-1].start()].split()
+    if not tokens:
+        return []
+    rut = ruts[-1].group().replace('.', '').upper()
+
+    ticker = tokens[0]
+    start = 1
+    while start < len(tokens) and '-' in tokens[start]:
+        start += 1
+    # The column between the name and the RUT is not part of the name
+    name = ' '.join(tokens[start:-1])
+    entries = [{'Ticker': ticker, 'RUT': rut, 'Name': name}]
+    if len(tokens) > 1 and '-BA' in tokens[1]:
+        entries.append({'Ticker': ticker.replace('-A', '-B'), 'RUT': rut, 'Name': name})
+    return entries
+
+
+def parse_issuer_list(text: str) -> List[Dict[str, str]]:
+    """
+    Issuers of the Bolsa de Santiago issuer list from its extracted text, in one pass.
+
+    Entries are numbered 1, 2, ... across pages: a line starting with the
+    next number (not followed by another digit) opens an entry, and the lines
+    after it continue it. A page break ends an entry whose RUT was already
+    read. An entry split across pages is carried over, leaving out the page
+    footer and the page header, which repeats the lines before entry 1.
+    """
+    issuers = []
+    current = None
+    expected = 1
+    header = set()
+    for page in text.split('\f'):
+        for line in page.splitlines():
+            line = line.strip()
+            if not line or PAGE_FOOTER_PATTERN.match(line):
+                continue
+            counter = str(expected)
+            if line.startswith(counter) and not line[len(counter):len(counter) + 1].isdigit():
+                if current:
+                    issuers.extend(_issuer_entry(current))
+                current = [line]
+                expected += 1
+            elif expected == 1:
+                header.add(line)
+            elif current is not None and line not in header:
+                current.append(line)
+        if current and RUT_PATTERN.search(' '.join(current)):
+            issuers.extend(_issuer_entry(current))
+            current = None
+    if current:
+        entries = _issuer_entry(current)
+        if not entries:
+            logger.warning(f"Dropping issuer entry without a RUT: {' '.join(current)}")
+        issuers.extend(entries)
+    return issuers
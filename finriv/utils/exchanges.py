@@ -25,7 +25,7 @@ class Exchange:
         if self.trading_hours.break_start and self.trading_hours.break_end:
             return self.trading_hours.trading_start <= current_time < self.trading_hours.break_start or \
                    self.trading_hours.break_end <= current_time < self.trading_hours.trading_end
-        return self.trading_hours.trading_start <= current_time < self.trading_hours.trading
+        return self.trading_hours.trading_start <= current_time < self.trading_hours.trading_end
 
 
 class ExchangeRegistry:
@@ -0,0 +1,225 @@
+# finriv/utils/http_downloads.py
+"""
+Concurrent HTTP downloads for the CMF scrapers.
+
+One pooled requests session (keep-alive, retries with backoff) is shared by a
+bounded thread pool. Requests to the same host are additionally limited by a
+semaphore, so a large pool does not hammer a single server, and bodies are
+streamed to a temporary file in chunks, then moved into place, so a partial
+download never looks like a finished one.
+
+With an HttpDocumentCache, the ETag, Last-Modified and SHA-256 of every
+document are kept, re-downloads are sent as conditional requests, and a
+document the server returns unchanged (304, or the same content hash) is
+reported as such, so callers can skip parsing it again.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+import hashlib
+import json
+import logging
+import os
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = getattr(settings, 'SCRAPING_WORKERS', 8)
+DEFAULT_PER_HOST = getattr(settings, 'SCRAPING_PER_HOST', 4)
+CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT = (10, 60)  # connect, read seconds
+
+DOWNLOADED = 'downloaded'
+NOT_MODIFIED = 'not_modified'  # 304 to a conditional request
+UNCHANGED = 'unchanged'  # Downloaded again, same content hash
+FAILED = 'failed'
+
+
+def build_session(headers: Optional[Dict] = None, pool_size: int = DEFAULT_WORKERS, retries: int = 5) -> requests.Session:
+    """Session with a connection pool sized for `pool_size` threads and retries with backoff."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=('GET', 'HEAD'),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+# Serializes the read-merge-write of every cache file in the process
+_save_lock = Lock()
+
+
+def _read_entries(path: Path) -> Dict[str, Dict]:
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+class HttpDocumentCache:
+    """
+    Validators and content hash of downloaded documents by URL, stored as
+    JSON next to the documents. Safe to share between download threads, see
+    get_http_cache for one instance per file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = Lock()
+        self._entries = _read_entries(self.path)
+        # URLs recorded since the last save, the only entries a save writes over the file's
+        self._recorded = set()
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            return self._entries.get(url)
+
+    def conditional_headers(self, url: str, path: Path) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since for `url`, only while its document is still at `path`."""
+        entry = self.get(url)
+        if not entry or entry.get('path') != str(path) or not Path(path).exists():
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record(self, url: str, path: Path, response: requests.Response, sha256: str):
+        with self._lock:
+            self._entries[url] = {
+                'path': str(path),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'sha256': sha256,
+            }
+            self._recorded.add(url)
+
+    def save(self):
+        """
+        Merge the entries recorded since the last save into the file, through
+        a temporary file, keeping what other instances saved meanwhile.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.path.with_name(self.path.name + '.part')
+        with _save_lock, self._lock:
+            entries = _read_entries(self.path)
+            entries.update({url: self._entries[url] for url in self._recorded})
+            partial.write_text(json.dumps(entries, indent=1, sort_keys=True))
+            os.replace(partial, self.path)
+            self._entries = entries
+            self._recorded.clear()
+
+
+_caches: Dict[Path, HttpDocumentCache] = {}
+_caches_lock = Lock()
+
+
+def get_http_cache(path: Path) -> HttpDocumentCache:
+    """Cache of `path` shared by the whole process."""
+    key = Path(path).resolve()
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = HttpDocumentCache(key)
+        return _caches[key]
+
+
+class ConcurrentDownloader:
+    """Bounded pool of workers sharing one session, with a concurrency limit per host."""
+
+    def __init__(self, session: Optional[requests.Session] = None, max_workers: int = DEFAULT_WORKERS,
+                 per_host: int = DEFAULT_PER_HOST, timeout=REQUEST_TIMEOUT,
+                 cache: Optional[HttpDocumentCache] = None):
+        self.session = session or build_session(pool_size=max_workers)
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self._hosts = {}
+        self._hosts_lock = Lock()
+
+    def _host_slot(self, url: str) -> BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = BoundedSemaphore(self.per_host)
+            return self._hosts[host]
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET within the host's concurrency limit, the body is read inside it unless streamed."""
+        with self._host_slot(url):
+            response = self.session.get(url, timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+            if not kwargs.get('stream'):
+                response.content  # Read the body before giving the slot back
+            return response
+
+    def fetch_to_file(self, url: str, path: Path) -> str:
+        """
+        Stream `url` to `path` through a temporary file. With a cache, the
+        request is conditional and a document identical to the stored one
+        is left in place. Returns DOWNLOADED, NOT_MODIFIED or UNCHANGED.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.name + '.part')
+        headers = self.cache.conditional_headers(url, path) if self.cache else {}
+        try:
+            with self._host_slot(url):
+                with self.session.get(url, timeout=self.timeout, stream=True, headers=headers) as response:
+                    if response.status_code == 304 and headers:
+                        return NOT_MODIFIED
+                    response.raise_for_status()
+                    digest = hashlib.sha256()
+                    with open(partial, 'wb') as file:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            digest.update(chunk)
+                            file.write(chunk)
+            sha256 = digest.hexdigest()
+            entry = self.cache.get(url) if self.cache else None
+            unchanged = entry is not None and entry['sha256'] == sha256 and path.exists()
+            if not unchanged:
+                os.replace(partial, path)
+            if self.cache:
+                self.cache.record(url, path, response, sha256)
+            return UNCHANGED if unchanged else DOWNLOADED
+        finally:
+            partial.unlink(missing_ok=True)
+
+    def map(self, function: Callable, items: Iterable) -> List:
+        """Results of `function` over `items`, in order, computed by the pool."""
+        items = list(items)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(function, items))
+
+    def download_all(self, jobs: Iterable[Tuple[str, Path]]) -> Dict[Path, str]:
+        """Download (url, path) jobs concurrently, returning the status of every path."""
+        statuses = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.fetch_to_file, url, path): (url, Path(path)) for url, path in jobs}
+            for future in as_completed(futures):
+                url, path = futures[future]
+                try:
+                    statuses[path] = future.result()
+                except (requests.RequestException, OSError) as e:
+                    logger.error(f"Failed to download {url}: {e}")
+                    statuses[path] = FAILED
+        if self.cache:
+            self.cache.save()
+        counts = {status: sum(value == status for value in statuses.values()) for status in set(statuses.values())}
+        logger.info(f"Fetched {len(statuses)} files: {counts}")
+        return statuses
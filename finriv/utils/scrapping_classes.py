@@ -5,12 +5,17 @@ import requests
 import pandas as pd
 from pathlib import Path
 import time
-import PyPDF2
 import unidecode
 import os
 import lxml.html as lh
 import sys
 from django.conf import settings
+from finriv.utils.cmf_dividends import DividendSink, build_jobs, fetch_dividends, last_dividend_dates
+from finriv.utils.cmf_parsing import extract_hrefs, match_company_links, parse_issuer_list
+from finriv.utils.http_downloads import (
+    DEFAULT_PER_HOST, DEFAULT_WORKERS, DOWNLOADED, FAILED, ConcurrentDownloader, build_session, get_http_cache
+)
+from finriv.utils.ticker_registry import get_registry
 import re
 import unittest
 import logging
@@ -24,10 +29,12 @@ BASE_DIR = settings.BASE_DIR
 logging.basicConfig(level=logging.DEBUG)
 G_datafold = BASE_DIR / 'media' / 'Data' / 'Chile'
 G_root_dir = BASE_DIR
+HTTP_CACHE_FILE = 'http_cache.json'
 ##Scraiping of PDF or (online not working, not matter since source does not work well anymore)
 class Ticker:
     datafold = G_datafold
     root_dir = G_root_dir
+    __slots__ = ('ticker', 'rut', 'name')
 
     def __init__(self, ticker, rut, name):
         """
@@ -57,89 +64,34 @@ class Ticker:
                 'http://cibe.bolsadesantiago.com/EmisoresyValores/Nminas%20Emisores/1.%20N%C3%B3mina%20Emisores%20de%20Acciones.pdf'
             )
             print(f"Scraping tickers from: {url}")
-            try:
-                response = requests.get(url)
-                response.raise_for_status()
-                with open(cls.datafold / file_name, 'wb') as f:
-                    f.write(response.content)
-                time.sleep(5)  # Wait for the download to finish
-            except requests.exceptions.RequestException as e:
-                print(f"Failed to download tickers: {e}")
+            downloader = ConcurrentDownloader(
+                build_session(), max_workers=1, cache=get_http_cache(cls.datafold / HTTP_CACHE_FILE)
+            )
+            status = downloader.download_all([(url, cls.datafold / file_name)])[cls.datafold / file_name]
+            if status == FAILED:
                 return []
+            # The list of issuers did not change, keep the tickers parsed from it
+            if status != DOWNLOADED and (cls.datafold / 'registered_stocks.csv').exists():
+                print("Tickers document unchanged, loading the registered tickers")
+                return cls.load_tickers_from_file()
 
-        # Open and read the PDF file
+        # Extract the text of the PDF and parse the numbered issuer entries
         try:
-            with open(cls.datafold / file_name, 'rb') as filepdf:
-                filling = PyPDF2.PdfFileReader(filepdf)
-                table = []
-                for i in range(filling.numPages):
-                    page = filling.getPage(i)
-                    temp = page.extractText()
-                    table.append(temp.split('\n'))
-            # After parsing the PDF
-            print(f"Parsed pages: {len(table)}")
-            print(f"Sample parsed data: {table[:2]}")  # Checking the first two pages or entries
-
+            text = extract_text(cls.datafold / file_name)
         except FileNotFoundError:
             print(f"Ticker file not found at: {cls.datafold / file_name}")
             return []
-
-        # Parsing the table to get tickers, RUT, and names
-        tickers, rut, names = ['Ticker'], ['RUT'], ['Name']
-        count = 1
-        companies_full = []
-
-        for pages in table:
-            pages = [value for value in pages if value != '']
-            companies = []
-            temp_elem = []  # Initialize temp_elem here to ensure it's defined
-            while True:
-                found_companies = [i for i in pages if i.startswith(str(count))]
-                if len(found_companies) == 0:
-                    break
-                for ix, comp in enumerate(found_companies):
-                    length = len(str(count))
-                    if comp[length].isnumeric():
-                        continue
-                    else:
-                        companies.append(comp)
-                        count += 1
-                for ix, comp in enumerate(companies):
-                    if ix != len(companies) - 1:
-                        indexs = pages.index(comp)
-                        indexf = pages.index(companies[ix + 1])
-                        temp_elem = []
-                        for ins in range(indexs, indexf):
-                            temp_elem.append(pages[ins])
-                        temp_elem = ' '.join(temp_elem).lstrip('0123456789.- ')
-                        temp_elem = temp_elem.split(" ")
-                    companies_full.append(temp_elem)
-
-        for comp in companies_full:
-            rut.append(comp[-1].replace('.', ''))
-            tickers.append(comp[0])
-            count = 0
-            while "-" in comp[count]:
-                count += 1
-            names.append(' '.join(comp[count:-2]))
-            if "-BA" in comp[1]:
-                rut.append(comp[-1].replace('.', ''))
-                tickers.append(comp[0].replace("-A", "-B"))
-                names.append(' '.join(comp[count:-2]))
+        issuers = parse_issuer_list(text)
+        print(f"Parsed issuers: {len(issuers)}")
+        print(f"Sample parsed data: {issuers[:2]}")
 
         # Unidecode formatting for consistent data
-        final_list = [tickers, rut, names]
-        temp_final_list = []
-        for j in range(len(tickers)):
-            dim = []
-            for i in range(len(final_list)):
-                dim.append(unidecode.unidecode(final_list[i][j]))
-            temp_final_list.append(dim)
-        final_list = temp_final_list
-        column_names = final_list.pop(0)
+        df = pd.DataFrame(
+            [{key: unidecode.unidecode(value) for key, value in issuer.items()} for issuer in issuers],
+            columns=['Ticker', 'RUT', 'Name']
+        )
 
         # Save to CSV
-        df = pd.DataFrame(final_list, columns=column_names)
         try:
             df.to_csv(cls.datafold / 'registered_stocks.csv', index=None, header=True)
         except Exception as e:
@@ -150,24 +102,19 @@ class Ticker:
         scraped_data = df.to_dict(orient='records')
         return cls.from_scraped_data(scraped_data)
 
+    @classmethod
+    def registry(cls):
+        """
+        Registry of registered_stocks.csv shared by the process, read again only when the file changes.
+        """
+        return get_registry(cls.datafold / 'registered_stocks.csv', cls)
+
     @classmethod
     def load_tickers_from_file(cls):
         """
         Load ticker data from a CSV file and return a list of Ticker objects.
         """
-        file_name = 'registered_stocks.csv'
-        filepath = cls.datafold / file_name
-        if os.path.exists(filepath):
-            try:
-                df = pd.read_csv(filepath)
-                scraped_data = df.to_dict(orient='records')
-                return cls.from_scraped_data(scraped_data)
-            except pd.errors.EmptyDataError:
-                print(f"CSV file at {filepath} is empty.")
-                return []
-        else:
-            print(f"{file_name} not found at {filepath}. Please run Ticker.scrape_tickers() first.")
-            return []
+        return cls.registry().all()
 
     def __repr__(self):
         return f"Ticker(ticker={self.ticker}, rut={self.rut}, name={self.name})"
@@ -177,12 +124,17 @@ class Ticker:
         """
         Retrieves a Ticker object by its ticker symbol.
         """
-        tickers = cls.load_tickers_from_file()
-        for ticker in tickers:
-            if ticker.ticker == symbol:
-                return ticker
-        print(f"Ticker with symbol {symbol} not found.")
-        return None
+        ticker = cls.registry().get(symbol)
+        if ticker is None:
+            print(f"Ticker with symbol {symbol} not found.")
+        return ticker
+
+    @classmethod
+    def get_tickers_by_rut(cls, rut):
+        """
+        Retrieves the Ticker objects of every series of the issuer with the given RUT.
+        """
+        return cls.registry().by_rut(rut)
 
     @classmethod
     def get_all_tickers(cls):
@@ -195,28 +147,33 @@ class Ticker:
         """
         Retrieves all Ticker objects from the file and returns them as a DataFrame.
         """
-        tickers = cls.get_all_tickers()
-        data = [{'Ticker': t.ticker, 'RUT': t.rut, 'Name': t.name} for t in tickers]
-        return pd.DataFrame(data)
+        return cls.registry().dataframe()
 class FileDownloader:
     """
     Handles downloading and extracting files from URLs.
     Includes methods to download, save, and extract files of different types.
     """
-    def __init__(self, root_dir, datafold, agent):
+    def __init__(self, root_dir, datafold, agent, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST):
         """
         Initializes the FileDownloader class with root directory, data folder, and request headers for downloading files.
+        Downloads run on `workers` threads sharing one pooled session, at most `per_host` at a time per server,
+        and re-downloads are conditional on the validators kept in the data folder's HTTP cache.
         """
         self.root_dir = root_dir
         self.datafold = datafold
         self.agent = agent
-        self.session = requests.Session()
+        self.session = build_session(agent, pool_size=workers)
+        self.cache = get_http_cache(root_dir / datafold / HTTP_CACHE_FILE)
+        self.pool = ConcurrentDownloader(self.session, max_workers=workers, per_host=per_host, cache=self.cache)
 
     def download_files(self, urls, filenames, update=False):
         """
         Downloads files from the provided URLs, saves them locally, and extracts if necessary.
-        Checks if a file already exists before downloading based on the update flag.
+        Checks if a file already exists before downloading based on the update flag; with update set,
+        existing files are only downloaded again if the server reports a change.
+        Returns the status of every file requested, only those DOWNLOADED have new content to parse.
         """
+        jobs = []
         for url, filename in zip(urls, filenames):
             if filename == '0':
                 continue
@@ -227,47 +184,21 @@ class FileDownloader:
             if not update and file_path.exists():
                 print(f"Already downloaded {file_path} and Update not set")
                 continue
+            jobs.append((url, file_path))
 
-            # Download the file
-            myfile = self._download_file(url)
-            if not myfile:
-                print(f"Failed to download {url} after multiple attempts")
-                continue
-
-            # Save the downloaded file
-            self._save_file(file_path, myfile)
+        statuses = self.pool.download_all(jobs)
 
-            # Handle file types: extract zip, parse pdf, or save others
-            if filename.endswith('.zip'):
+        # Handle file types: extract zip, parse pdf, or save others
+        for file_path, status in statuses.items():
+            if status == FAILED:
+                print(f"Failed to download {file_path}")
+            elif status != DOWNLOADED:
+                print(f"Unchanged {file_path} ({status})")
+            elif file_path.name.endswith('.zip'):
                 self._extract_zip(file_path)
-            #elif filename.endswith('.pdf'):
-            #    self._parse_pdf(file_path)
             else:
                 print(f"File saved at {file_path}")
-
-    def _download_file(self, url, max_retries=9):
-        """
-        Handles downloading a file with retry logic to ensure robustness against temporary network issues.
-        """
-        for attempt in range(max_retries):
-            try:
-                response = self.session.get(url, headers=self.agent)
-                response.raise_for_status()
-                return response
-            except KeyboardInterrupt:
-                print("Interrupted")
-                sys.exit(0)
-            except requests.RequestException as e:
-                print(f"Error: {e}\n  Trying again ({attempt + 1}/{max_retries})")
-                time.sleep(1)
-        return None
-
-    def _save_file(self, file_path, response):
-        """
-        Saves the content of the response to the specified file path.
-        """
-        with open(file_path, 'wb') as file:
-            file.write(response.content)
+        return statuses
 
     def _extract_zip(self, zip_path, max_retries=12):
         """
@@ -313,13 +244,14 @@ class CmfScraping:
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36"
     }
 
-    def __init__(self, tickers):
+    def __init__(self, tickers, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST):
         """
         Initializes the CmfScraping class
         """
 
         self.companies_list = tickers#.get_all_tickers_as_dataframe()
-        self.downloader = FileDownloader(self.root_dir, self.datafold, self.agent)
+        self.downloader = FileDownloader(self.root_dir, self.datafold, self.agent, workers, per_host)
+        self.session = self.downloader.session
         return
 
     def scrap_all_analysis(self, month, year):
@@ -329,25 +261,25 @@ class CmfScraping:
         if month not in ['03', '06', '09', '12']:
             raise ValueError("Month must be one of the reporting months: 03, 06, 09, 12")
         company_links = self.scrap_company_links(month, year)
-        flinks = []
         fnames = ['0'] * len(company_links)
 
-        # Loop through each company link to scrape file links and set filenames for downloading
-        for i, link in enumerate(company_links):
+        def file_link(link):
             if link == 'Not Found':
-                print(f"Link not found for company index {i}, skipping...")
-                flinks.append('Invalid Link')
-                continue
-
+                return 'Invalid Link'
             print(f'Scraping {link}, please wait...')
             try:
-                file_link = self.scrap_file_links(link)
-                flinks.append(file_link)
-                if file_link != 'Not Found':
-                    fnames[i] = f"{month}-{year}/Analisis_{self.companies_list.loc[i, 'Ticker']}_{month}-{year}.pdf"
+                return self.scrap_file_links(link)
             except requests.RequestException as e:
                 print(f"Error scraping file link for {link}: {e}")
-                flinks.append('Invalid Link')
+                return 'Invalid Link'
+
+        # Company pages are scraped concurrently, within the per-host limit
+        flinks = self.downloader.pool.map(file_link, company_links)
+        for i, link in enumerate(flinks):
+            if link == 'Invalid Link':
+                print(f"Link not found for company index {i}, skipping...")
+            elif link != 'Not Found':
+                fnames[i] = f"{month}-{year}/Analisis_{self.companies_list.loc[i, 'Ticker']}_{month}-{year}.pdf"
 
         # Create directory for storing downloaded data if it doesn't exist
         folder_data = self.datafold / Path(f"{month}-{year}")
@@ -362,39 +294,30 @@ class CmfScraping:
     def scrap_company_links(self, month, year):
         """
         Scrapes the company links from the CMF Chile website for a specific month and year.
-        Iterates over all links and matches them with each company's RUT to find the correct link.
+        Matches the RUT numbers found in the links with each company's RUT to find the correct link.
         """
         url = f'https://www.cmfchile.cl/institucional/mercados/novedades_envio_sa_ifrs.php?mm_ifrs={month}&aa_ifrs={year}'
         out = ['Not Found'] * self.companies_list.shape[0]
         print(url)
         try:
-            page = requests.get(url, headers=self.agent)
-            page.raise_for_status()
-            #print('page', page.content)
-            page = lh.fromstring(page.content)
+            page = self.downloader.pool.get(url)
         except requests.exceptions.RequestException as e:
             print(f"Connection error: {e} -> Trying next one")
             return out
 
-        # Iterate over all links to match them with each company's RUT
-        links = page.xpath('//a')
-        #print(links)
-        for link in links:
-            for i in range(self.companies_list.shape[0]):
-                rut = self.companies_list.loc[i, 'RUT']
-                rut = rut.split('-')[0]
-                if 'href' in link.attrib and rut in link.attrib['href']:
-                    out[i] = link.attrib['href']
-                    out[i] = f'https://www.cmfchile.cl/institucional/mercados/{out[i]}'
-        return out
+        # Match every link to the companies through an index of their RUTs
+        return match_company_links(
+            extract_hrefs(page.content),
+            self.companies_list['RUT'].tolist(),
+            base_url='https://www.cmfchile.cl/institucional/mercados/'
+        )
 
     def scrap_file_links(self, url):
         """
         Scrapes the file link from a given company page URL if it contains the required financial analysis document.
         """
         try:
-            page = requests.get(url, headers=self.agent)
-            page.raise_for_status()
+            page = self.downloader.pool.get(url)
             page = lh.fromstring(page.content)
         except requests.exceptions.RequestException as e:
             print(f"Connection error: {e} -> Skipping link {url}")
@@ -416,125 +339,48 @@ class CmfScraping:
             year_i,
             year_f=0,
             types=[1, 2, 3],
-            to_file=True
+            to_file=True,
+            delta=False
     ):
         """
         Scrape comprehensive dividend information for Chilean companies.
+        Issuers are fetched concurrently on the downloader's pool and each result
+        is appended to the output file as soon as it is parsed.
 
         Args:
         - year_i: Initial year for dividend retrieval
         - year_f: Final year (default: current year)
         - types: Types of dividends to select
         - to_file: Whether to save results to a file
+        - delta: Only request the months since the last stored dividend of each security
 
         Returns:
         - DataFrame with detailed dividend information
         """
         # Determine final year
         if year_f == 0:
-            year_f = datetime.now().year
+            year_f = datetime.datetime.now().year
         elif (year_f - year_i) < 0:
             raise ValueError("Initial year must be before or equal to final year")
 
-        # Load registered stocks
-        file_name = 'registered_stocks.csv'
-        df1 = pd.read_csv(self.datafold / file_name)
-
-        # Prepare lists of tickers and RUTs
-        tickers = self.companies_list['Ticker'].tolist()
-        ruts = self.companies_list['RUT'].tolist()
-
-        # Prepare to collect dividend data
-        final_dataframe = []
+        last_dates = last_dividend_dates(self.companies_list['Ticker']) if delta else {}
+        jobs = build_jobs(self.companies_list, year_i, year_f, last_dates)
+        logging.info(f"Scraping dividends of {len(jobs)} companies, {len(last_dates)} from their last stored date")
 
-        # Iterate through companies
-        for counter, rut in enumerate(ruts):
-            # Skip companies with ERROR in RUT
-            if "ERROR" in rut:
-                continue
-
-            ticker = tickers[counter]
-
-            # Determine series based on ticker naming convention
-            if '-A' in ticker:
-                series = 'A'
-            elif '-B' in ticker:
-                series = 'B'
-            elif '-C' in ticker:
-                series = 'C'
+        sink = None
+        if to_file:
+            if delta:
+                file_name = f'Dividends_delta_{datetime.date.today():%Y%m%d}.csv'
             else:
-                series = 'U'  # Universal/default series
-
-            # Construct URL for dividend scraping
-            url = (
-                "https://www.cmfchile.cl/institucional/estadisticas/acc_dividendos1grid.php?"
-                f"lang=es&sociedad%5B%5D={rut[:-2]}&tipodiv=0&mes=0&anno={year_i}&"
-                f"mes2=0&anno2={year_f}&xls=y&semana=&vsn=2"
-            )
-            print(url)
-            logging.info(f"Parsing url for {ticker}: {url}")
-
-            try:
-                # Fetch dividend data
-                page = requests.get(url, headers=self.agent)
-
-                # Read Excel data
-                df = pd.read_excel(page.content, header=6, engine="openpyxl")
-
-                # Filter by series and dividend types
-                df = df[
-                    (df['Serieafecta'].isin([series, 'U'])) &
-                    (df['Tipodedividendo(1)'].isin(types))
-                    ]
-
-                # Ensure date is properly parsed
-                df['Date'] = pd.to_datetime(df['Fecha'], infer_datetime_format=True)
+                file_name = f'Dividends_{year_i}_{year_f}.csv'
+            sink = DividendSink(self.datafold / 'Dividends' / file_name)
 
-                # Calculate dividends with exchange rate
-                df['Dividend'] = df.iloc[:, 12] * df['Tasadecambio']
-
-                # Add additional columns for tracking
-                df['Ticker'] = ticker
-                df['Series'] = series
-
-                # Select and rename relevant columns
-                dividend_df = df[['Date', 'Dividend', 'Ticker', 'Series', 'Tipodedividendo(1)']]
-                dividend_df.columns = ['Date', 'Dividend', 'Ticker', 'Series', 'DividendType']
-
-                final_dataframe.append(dividend_df)
-
-            except BadZipFile:
-                logging.warning(f"Bad zip file for {ticker}")
-                continue
-            except Exception as e:
-                logging.error(f"Error processing {ticker}: {e}")
-                continue
-
-        # Combine results
-        try:
-            result = pd.concat(final_dataframe)
-
-            # Sort by date for better readability
-            result = result.sort_values('Date')
-
-            # Reset index for clean output
-            result = result.reset_index(drop=True)
-        except ValueError:
+        result, failed = fetch_dividends(self.downloader.pool, jobs, types, sink)
+        if failed:
+            print(f"Could not fetch dividends of {len(failed)} companies: {', '.join(failed)}")
+        if result.empty:
             print("No data found in range, please check.")
             return None
-
-        # Save to file if requested
-        if to_file:
-            # Ensure Dividends directory exists
-            dividends_path = self.datafold / 'Dividends'
-            dividends_path.mkdir(parents=True, exist_ok=True)
-
-            # Generate filename
-            file_name = f'Dividends_{year_i}_{year_f}.csv'
-            full_path = dividends_path / file_name
-
-            result.to_csv(full_path, index=False)
-
         return result
 
 
@@ -577,7 +423,7 @@ if __name__ == "__main__":
     start_year = 2013
     end_year = None
     if end_year is None:
-        end_year = datetime.now().year
+        end_year = datetime.datetime.now().year
     try:
         all_tickers = Ticker.get_all_tickers_as_dataframe()
         logging.debug(f"Successfully retrieved tickers: {all_tickers.head()}")
@@ -0,0 +1,114 @@
+# finriv/utils/ticker_registry.py
+"""
+Registered Chilean issuers (registered_stocks.csv), loaded once per process.
+
+The file is read again only when its modification time or size changes, so
+the scraping and analysis commands share one copy and look tickers up by
+symbol or RUT in a dict instead of re-reading the CSV for every lookup.
+"""
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import csv
+import logging
+import os
+
+import pandas as pd
+
+from finriv.utils.cmf_parsing import rut_number
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_COLUMNS = ['Ticker', 'RUT', 'Name']
+
+
+class TickerRecord:
+    """Registered ticker, with the RUT and name of its issuer."""
+    __slots__ = ('ticker', 'rut', 'name')
+
+    def __init__(self, ticker, rut, name):
+        self.ticker = ticker
+        self.rut = rut
+        self.name = name
+
+    def __repr__(self):
+        return f"TickerRecord(ticker={self.ticker}, rut={self.rut}, name={self.name})"
+
+
+class TickerRegistry:
+    """Records of a registered stocks file, indexed by ticker and by RUT number."""
+
+    def __init__(self, path: Path, record=TickerRecord):
+        self.path = Path(path)
+        self.record = record
+        self._lock = Lock()
+        self._stamp = None
+        self._records: List = []
+        self._by_ticker: Dict[str, object] = {}
+        self._by_rut: Dict[str, List] = {}
+        self._dataframe = pd.DataFrame(columns=REGISTRY_COLUMNS)
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            records = []
+            if stamp is not None:
+                with open(self.path, newline='', encoding='utf-8') as file:
+                    records = [self.record(row['Ticker'], row['RUT'], row['Name']) for row in csv.DictReader(file)]
+            else:
+                print(f"{self.path.name} not found at {self.path}. Please run Ticker.scrape_tickers() first.")
+
+            by_rut = {}
+            for record in records:
+                by_rut.setdefault(rut_number(record.rut), []).append(record)
+            self._records = records
+            self._by_ticker = {record.ticker: record for record in records}
+            self._by_rut = by_rut
+            self._dataframe = pd.DataFrame(
+                [(record.ticker, record.rut, record.name) for record in records], columns=REGISTRY_COLUMNS
+            )
+            self._stamp = stamp
+            logger.debug(f"Loaded {len(records)} registered tickers from {self.path}")
+
+    def all(self) -> List:
+        self._refresh()
+        return list(self._records)
+
+    def get(self, ticker: str):
+        """Record of `ticker`, None if it is not registered."""
+        self._refresh()
+        return self._by_ticker.get(ticker)
+
+    def by_rut(self, rut) -> List:
+        """Records of every series of the issuer with `rut` (with or without verifier digit)."""
+        self._refresh()
+        return list(self._by_rut.get(rut_number(rut), []))
+
+    def dataframe(self) -> pd.DataFrame:
+        """Ticker, RUT and Name of every record, a copy callers may modify."""
+        self._refresh()
+        return self._dataframe.copy()
+
+
+_registries: Dict[Tuple[Path, type], TickerRegistry] = {}
+_registries_lock = Lock()
+
+
+def get_registry(path: Path, record=TickerRecord) -> TickerRegistry:
+    """Registry of `path` shared by the whole process."""
+    key = (Path(path), record)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = TickerRegistry(path, record)
+        return _registries[key]
@@ -290,9 +290,15 @@ class FileSearcher:
         if end_year is None:
             end_year = int(datetime.now().year)
         now = datetime.now()
-
-        for _, row in self.all_tickers.iterrows():
-            ticker = row['Ticker']
+        # Securities and the reports already stored, looked up in memory instead of once per ticker and folder
+        securities_by_ticker = {security.ticker: security for security in securities}
+        stored_reports = set(FinancialReport.objects.filter(
+            security__in=list(securities_by_ticker.values())
+        ).values_list('security_id', 'date'))
+        # Assuming folders are named as 'MM-YYYY'
+        folders = [folder for folder in self.datafold_path.iterdir() if folder.is_dir() and '-' in folder.name]
+
+        for ticker in self.all_tickers['Ticker']:
             main_ticker = self.strip_tranche_suffix(ticker)
 
             # Skip processing if the main ticker has already been processed
@@ -300,34 +306,33 @@ class FileSearcher:
                 print(f"Skipping {ticker}, already processed main ticker {main_ticker}.")
                 continue
 
-            for folder in self.datafold_path.iterdir():
-                if folder.is_dir() and '-' in folder.name:  # Assuming folders are named as 'MM-YYYY'
-                    month, year = folder.name.split('-')
-                    if start_year <= int(year) <= end_year:
-                        date = datetime.strptime(f"01-{month}-{year}", "%d-%m-%Y")
-                        security = securities.filter(ticker=ticker).first()
-
-                        if not FinancialReport.objects.filter(security=security, date=date).exists():
-                            if self.reuse_existing and self.reuse_file:
-                                analysis = self.load_analysis_from_file(ticker, folder.name)
-                                if analysis:
-                                    self.save_response(security, date, analysis, now)
-                                    continue
-
-                            file_name = f"Analisis_{ticker}_{folder.name}.pdf"
-                            file_path = folder / file_name
-
-                            if file_path.exists():
-                                print(f"Parsing new file: {file_path}")
-                                response = self.parse_pdf(file_path)
-                                if response:
-                                    self.save_response(security, date, response, now)
-                                    if self.save_json:
-                                        self.save_analysis_to_file(response, ticker, folder.name)
-                                    # Mark the main ticker as processed
-                                    self.processed_tickers.add(main_ticker)
-                        else:
-                            print(f"The {ticker} for year {year} and month {month} already exists in database, skipping.")
+            for folder in folders:
+                month, year = folder.name.split('-')
+                if start_year <= int(year) <= end_year:
+                    date = datetime.strptime(f"01-{month}-{year}", "%d-%m-%Y")
+                    security = securities_by_ticker.get(ticker)
+
+                    if (getattr(security, 'id', None), date.date()) not in stored_reports:
+                        if self.reuse_existing and self.reuse_file:
+                            analysis = self.load_analysis_from_file(ticker, folder.name)
+                            if analysis:
+                                self.save_response(security, date, analysis, now)
+                                continue
+
+                        file_name = f"Analisis_{ticker}_{folder.name}.pdf"
+                        file_path = folder / file_name
+
+                        if file_path.exists():
+                            print(f"Parsing new file: {file_path}")
+                            response = self.parse_pdf(file_path)
+                            if response:
+                                self.save_response(security, date, response, now)
+                                if self.save_json:
+                                    self.save_analysis_to_file(response, ticker, folder.name)
+                                # Mark the main ticker as processed
+                                self.processed_tickers.add(main_ticker)
+                    else:
+                        print(f"The {ticker} for year {year} and month {month} already exists in database, skipping.")
 
 
 
@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from portfolios.utils.backtest import REBALANCING_FREQUENCIES, run_backtest
+
+SESSIONS_PER_YEAR = 252
+
+
+class Command(BaseCommand):
+    help = 'Time the backtester on synthetic prices, without touching the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--securities', type=int, default=50, help='Number of securities')
+        parser.add_argument('--years', type=int, default=10, help='Years of daily sessions')
+        parser.add_argument(
+            '--frequency',
+            type=str,
+            choices=list(REBALANCING_FREQUENCIES),
+            default='daily',
+            help='Rebalancing frequency'
+        )
+        parser.add_argument('--repeats', type=int, default=5, help='Timed runs, the best and median are reported')
+
+    def handle(self, *args, **options):
+        sessions, securities = options['years'] * SESSIONS_PER_YEAR, options['securities']
+        rng = np.random.default_rng(0)
+        dates = np.datetime64('2014-01-01') + np.arange(sessions)
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (sessions, securities)), axis=0))
+        # Missing closes, as for securities that did not trade
+        closes[rng.random(closes.shape) < 0.1] = np.nan
+        dividends = np.zeros_like(closes)
+        dividends[::63] = 0.5
+        weights = np.full(securities, 1 / securities)
+
+        timings = []
+        for _ in range(options['repeats']):
+            start = time.perf_counter()
+            run_backtest(dates, closes, dividends, weights, options['frequency'], cost_bps=10, reinvest_dividends=False)
+            timings.append(time.perf_counter() - start)
+
+        self.stdout.write(
+            f"Backtest of {securities} securities over {sessions} sessions, {options['frequency']} rebalancing: "
+            f"best {min(timings) * 1000:.1f} ms, median {np.median(timings) * 1000:.1f} ms "
+            f"({len(timings)} runs)"
+        )
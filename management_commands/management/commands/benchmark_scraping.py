@@ -0,0 +1,106 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from finriv.utils.cmf_parsing import extract_hrefs, match_company_links, parse_issuer_list
+from finriv.utils.http_downloads import DEFAULT_PER_HOST, ConcurrentDownloader, build_session
+
+
+def novedades_page(ruts) -> str:
+    """Page shaped like the CMF IFRS filings list: navigation links and one row per issuer."""
+    navigation = ''.join(f'<li><a href="/portal/seccion_{i}.html">Sección {i}</a></li>' for i in range(80))
+    rows = ''.join(
+        f'<tr><td><a href=\'entidad.php?mercado=V&amp;rut={rut}&amp;grupo=&amp;tipoentidad=RVEMI'
+        f'&amp;row=AAAwy2ACTAAAB{row:05d}&amp;vig=VI&amp;control=svs&amp;pestania=3\'>Emisor {row}</a></td>'
+        f'<td>{rut}-K</td></tr>'
+        for row, rut in enumerate(ruts)
+    )
+    return f'<html><body><ul>{navigation}</ul><table>{rows}</table></body></html>'
+
+
+def issuer_list_text(pages: int, per_page: int = 50) -> str:
+    """Text pdfminer extracts from the issuer list, with a header and footer on every page."""
+    lines = []
+    for page in range(pages):
+        lines.append('BOLSA DE SANTIAGO\nNÓMINA EMISORES DE ACCIONES\n')
+        for row in range(per_page):
+            number = page * per_page + row + 1
+            lines.append(f'{number} TICK{number} EMPRESA NUMERO {number} S.A.\n{number:04d} {76000000 + number}-5')
+        lines.append(f'Página {page + 1} de {pages}\n\f')
+    return '\n'.join(lines)
+
+
+class SlowPageHandler(BaseHTTPRequestHandler):
+    """Local page answering after a fixed latency, standing in for the CMF site."""
+    latency = 0.05
+    body = b'x' * 64 * 1024
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Time the CMF scraping helpers on synthetic pages, without network access'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=300, help='Companies on the synthetic pages')
+        parser.add_argument('--issuer-pages', type=int, default=60, help='Pages of the synthetic issuer list')
+        parser.add_argument('--pages', type=int, default=16, help='Pages fetched from the local server')
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds the local server takes per page')
+        parser.add_argument('--repeats', type=int, default=5, help='Timed runs, the best and median are reported')
+
+    def benchmark(self, label, function, repeats):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        self.stdout.write(
+            f"{label}: best {min(timings) * 1000:.1f} ms, median {np.median(timings) * 1000:.1f} ms "
+            f"({len(timings)} runs)"
+        )
+
+    def handle(self, *args, **options):
+        companies, repeats = options['companies'], options['repeats']
+        numbers = [76000000 + 7919 * i for i in range(companies)]
+        ruts = [f'{number}-{i % 10}' for i, number in enumerate(numbers)]
+        page = novedades_page(numbers)
+
+        self.benchmark(
+            f"Link matching of {companies} companies",
+            lambda: match_company_links(extract_hrefs(page), ruts),
+            repeats
+        )
+
+        text = issuer_list_text(options['issuer_pages'])
+        self.benchmark(
+            f"Issuer list of {options['issuer_pages']} pages",
+            lambda: parse_issuer_list(text),
+            repeats
+        )
+
+        SlowPageHandler.latency = options['latency']
+        server = ThreadingHTTPServer(('127.0.0.1', 0), SlowPageHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            urls = [f'http://127.0.0.1:{server.server_port}/page/{i}' for i in range(options['pages'])]
+            for per_host in (1, DEFAULT_PER_HOST):
+                downloader = ConcurrentDownloader(build_session(retries=0), per_host=per_host)
+                self.benchmark(
+                    f"{options['pages']} pages at {options['latency'] * 1000:.0f} ms latency, {per_host} per host",
+                    lambda: downloader.map(downloader.get, urls),
+                    repeats
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -4,6 +4,9 @@ from django.db.models import Sum, Max
 from datetime import timedelta, datetime
 import math
 from fin_data_cl.models import Security, DividendData, FinancialData, FinancialRatio, PriceData
+from fin_data_cl.utils.screener_engine import RATIO_DATA_VERSION, get_ratio_snapshot
+from fin_data_cl.utils.saved_screens import finish_ratio_run
+from finriv.utils.cache import get_version
 
 class FinancialRatioCalculationService:
     """
@@ -225,6 +228,10 @@ class Command(BaseCommand):
         calculator = FinancialRatioCalculationService()
         securities = Security.objects.filter(is_active=True)
 
+        # Snapshot before the run, so saved screens only re-check what changed
+        previous_version = get_version(RATIO_DATA_VERSION)
+        previous = get_ratio_snapshot()
+
         for security in securities:
             # Get unique dates for this security
             date = FinancialData.objects.filter(
@@ -238,4 +245,7 @@ class Command(BaseCommand):
             else:
                 result = calculator.calculate_ratios(security, None)
                 if result:
-                    print(f"Only dividend ratios calculated for {security.ticker}")
\ No newline at end of file
+                    print(f"Only dividend ratios calculated for {security.ticker}")
+
+        stats = finish_ratio_run(previous, previous_version)
+        print(f"Saved screens updated: {stats['entries']} entries, {stats['exits']} exits")
\ No newline at end of file
@@ -1,6 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from fin_data_cl.models import Security, FinancialRatio
+from fin_data_cl.utils.screener_engine import RATIO_DATA_VERSION, get_ratio_snapshot
+from fin_data_cl.utils.saved_screens import finish_ratio_run
+from finriv.utils.cache import get_version
 from .calculate_ratios import FinancialRatioCalculationService
 
 
@@ -14,8 +17,14 @@ class Command(BaseCommand):
         old_count = FinancialRatio.objects.count()
         self.stdout.write(f"Found {old_count} existing ratio records")
 
+        # Snapshot before the run, so saved screens only re-check what changed
+        previous_version = get_version(RATIO_DATA_VERSION)
+        previous = get_ratio_snapshot()
+
         try:
             with transaction.atomic():
+                transaction.on_commit(lambda: finish_ratio_run(previous, previous_version))
+
                 # Delete all existing ratios
                 self.stdout.write("Deleting all existing ratio records...")
                 FinancialRatio.objects.all().delete()
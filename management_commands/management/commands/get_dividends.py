@@ -1,110 +1,96 @@
-import csv
-from decimal import Decimal, InvalidOperation
 from pathlib import Path
 from django.core.management.base import BaseCommand
-from django.db import transaction
 from django.conf import settings
 from django.utils import timezone
 import logging
-from typing import Dict, List
+from typing import Dict, Iterable, List, Tuple
+import pandas as pd
 from fin_data_cl.models import Security, Exchange, DividendData
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('dividend_imports.log'),
-        logging.StreamHandler()
-    ]
+from fin_data_cl.utils.bulk_ops import DEFAULT_BATCH_SIZE, bulk_upsert
+from fin_data_cl.utils.csv_import import (
+    DEFAULT_CHUNK_SIZE, CsvImporter, ImportStats, to_date, to_decimal, to_integer, to_text
 )
+
 logger = logging.getLogger(__name__)
 
 
 class DividendImporter:
     """Handles the processing and importing of dividend data"""
 
-    def __init__(self):
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
         # Get Santiago Stock Exchange instance
         self.exchange = Exchange.objects.get(code='SCL')
         self.data_folder = Path(settings.MEDIA_ROOT) / 'Data' / 'Chile'
+        self.batch_size = batch_size
+        self.securities: Dict[str, int] = {}
+
+    def csv_importer(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> CsvImporter:
+        """Typed reader of the dividends files written by CmfScraping.scrap_dividends"""
+        return CsvImporter(
+            columns={'Date': to_date(), 'Dividend': to_decimal, 'Ticker': to_text, 'DividendType': to_integer},
+            required=['Date', 'Dividend', 'Ticker', 'DividendType'],
+            chunk_size=chunk_size,
+        )
 
-    def process_row(self, row: Dict) -> DividendData:
-        """
-        Process a single row of dividend data.
-        Now includes security validation and proper model creation.
-        """
-        try:
-            ticker = row['Ticker']
-            # Get or create security
-            security, created = Security.objects.get_or_create(
-                ticker=ticker,
-                exchange=self.exchange,
-                defaults={'name': f"{ticker} Security"}
+    def write_chunk(self, chunk: pd.DataFrame) -> Tuple[int, int]:
+        """Save a chunk of converted rows"""
+        return self.save_dividend_data([
+            {'ticker': ticker, 'date': day.date(), 'amount': amount, 'dividend_type': int(dividend_type)}
+            for ticker, day, amount, dividend_type in zip(
+                chunk['Ticker'], chunk['Date'], chunk['Dividend'], chunk['DividendType']
             )
+        ])
 
-            if created:
-                logger.info(f"Created new security entry for {ticker}")
+    def import_file(self, file_path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ImportStats:
+        """Stream the CSV file into the database, chunk by chunk"""
+        return self.csv_importer(chunk_size).run(file_path, self.write_chunk)
 
-            current_time = timezone.now()
+    def resolve_securities(self, tickers: Iterable[str]) -> Dict[str, int]:
+        """
+        Security id of every ticker, creating the missing securities in one insert.
+        Tickers already resolved for an earlier chunk are not queried again.
+        """
+        tickers = set(tickers) - set(self.securities)
+        if not tickers:
+            return self.securities
+        securities = dict(
+            Security.objects.filter(exchange=self.exchange, ticker__in=tickers).values_list('ticker', 'id')
+        )
+        missing = sorted(tickers - set(securities))
+        if missing:
+            Security.objects.bulk_create(
+                [Security(ticker=ticker, exchange=self.exchange, name=f"{ticker} Security") for ticker in missing],
+                ignore_conflicts=True
+            )
+            securities.update(
+                Security.objects.filter(exchange=self.exchange, ticker__in=missing).values_list('ticker', 'id')
+            )
+            logger.info(f"Created {len(missing)} new security entries: {', '.join(missing)}")
+        self.securities.update(securities)
+        return self.securities
 
-            return DividendData(
-                security=security,
-                date=row['Date'],
-                amount=Decimal(row['Dividend']),
-                dividend_type=int(float(row['DividendType'])),
+    def save_dividend_data(self, dividend_data: List[Dict]):
+        """
+        Save processed dividend data to database, updating the dividend stored
+        for the same security and date. When the file has several dividends
+        for one security and date, the last one wins.
+        """
+        securities = self.resolve_securities(dividend['ticker'] for dividend in dividend_data)
+        current_time = timezone.now()
+        dividends = [
+            DividendData(
+                security_id=securities[dividend['ticker']],
+                date=dividend['date'],
+                amount=dividend['amount'],
+                dividend_type=dividend['dividend_type'],
                 created_at=current_time,
                 updated_at=current_time
             )
-        except (InvalidOperation, KeyError, ValueError) as e:
-            raise ValueError(f"Invalid data in row {row}: {e}")
-
-    def read_csv_file(self, file_path: Path) -> List[DividendData]:
-        """Read and process the CSV file"""
-        dividend_data = []
-        with open(file_path, mode='r') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                try:
-                    dividend = self.process_row(row)
-                    dividend_data.append(dividend)
-                except ValueError as e:
-                    logger.warning(f'Skipping row due to error: {e}')
-        return dividend_data
-
-    @transaction.atomic
-    def save_dividend_data(self, dividend_data: List[DividendData]):
-        """Save processed dividend data to database"""
-        updates = 0
-        creates = 0
-
-        for dividend in dividend_data:
-            try:
-                # Try to find existing record
-                existing = DividendData.objects.filter(
-                    security=dividend.security,
-                    date=dividend.date
-                ).first()
-
-                if existing:
-                    # Update existing record
-                    existing.amount = dividend.amount
-                    existing.dividend_type = dividend.dividend_type
-                    existing.updated_at = timezone.now()
-                    existing.save()
-                    updates += 1
-                else:
-                    # Create new record
-                    dividend.save()
-                    creates += 1
-
-            except Exception as e:
-                logger.error(
-                    f"Error saving dividend for {dividend.security.ticker} "
-                    f"on {dividend.date}: {str(e)}"
-                )
-
-        return creates, updates
+            for dividend in dividend_data
+        ]
+        return bulk_upsert(
+            DividendData, dividends, ('security_id', 'date'), ['amount', 'dividend_type'], self.batch_size
+        )
 
 
 class Command(BaseCommand):
@@ -117,15 +103,37 @@ class Command(BaseCommand):
             help='Specific CSV file to import (optional)',
             default='Dividends/Dividends_2013_2024.csv',  # Set the default value here
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Dividends written per database round trip'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Rows read from the file at a time'
+        )
 
-    def handle(self, *args, **options):
-        start_time = timezone.now()
+    def setup_logging(self):
+        """Log the import to dividend_imports.log as well as the console."""
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s',
+            handlers=[
+                logging.FileHandler('dividend_imports.log'),
+                logging.StreamHandler()
+            ]
+        )
 
+    def handle(self, *args, **options):
+        self.setup_logging()
         self.stdout.write("Synchronizing exchanges...")
         created, updated = Exchange.sync_from_registry()
         self.stdout.write(f"Exchanges synchronized: {created} created, {updated} updated.")
 
-        importer = DividendImporter()
+        importer = DividendImporter(batch_size=options['batch_size'])
 
 
         # Determine input file path
@@ -138,15 +146,8 @@ class Command(BaseCommand):
 
         try:
             logger.info('Reading and importing dividend data from CSV...')
-            dividend_data = importer.read_csv_file(input_file_path)
-
-            creates, updates = importer.save_dividend_data(dividend_data)
-
-            duration = timezone.now() - start_time
-            logger.info(
-                f'Import completed in {duration.total_seconds():.1f} seconds. '
-                f'Created: {creates}, Updated: {updates}'
-            )
+            stats = importer.import_file(input_file_path, chunk_size=options['chunk_size'])
+            logger.info(f'Import completed: {stats.summary()}')
 
         except Exception as e:
             logger.error(f'Error during dividend import: {str(e)}')
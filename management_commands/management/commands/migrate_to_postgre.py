@@ -1,15 +1,74 @@
 # management_commands/management/commands/migrate_to_railway.py
 
+import itertools
 import json
 import logging
+import tempfile
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple
 import psycopg2
+from psycopg2 import sql
 from urllib.parse import urlparse
 from decouple import config
 
+from django.apps import apps
 from django.core.management.base import BaseCommand, CommandError
 from django.core import management
+from django.db import models
+
+
+def iter_dump(input_file: Path) -> Iterator[Tuple[str, Iterator[dict]]]:
+    """
+    Records of a JSON Lines dump, grouped by model as they appear in the file.
+    The file is read line by line, so memory does not grow with the dump.
+    """
+    with open(input_file, 'r') as f:
+        records = (json.loads(line) for line in f if line.strip())
+        for label, group in itertools.groupby(records, key=lambda record: record['model']):
+            yield label, group
+
+
+def copy_fields(model) -> List[models.Field]:
+    """Primary key, then the other concrete fields of a model, as COPY columns."""
+    pk = model._meta.pk
+    return [pk] + [field for field in model._meta.local_concrete_fields if field is not pk]
+
+
+def _copy_value(field: models.Field, value) -> str:
+    """A CSV value for COPY: NULL unquoted, everything else quoted."""
+    if value is None:
+        return ''
+    if isinstance(field, models.JSONField):
+        value = json.dumps(value)
+    elif isinstance(value, bool):
+        value = 'true' if value else 'false'
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_row(record: dict, fields: List[models.Field]) -> str:
+    """CSV line of a dumped record, with the columns of `fields`."""
+    values = [record['pk']] + [record['fields'].get(field.name) for field in fields[1:]]
+    return ','.join(_copy_value(field, value) for field, value in zip(fields, values)) + '\n'
+
+
+def merge_order(model_list: Iterable) -> List:
+    """Models ordered so that the targets of foreign keys are merged first."""
+    model_list = list(model_list)
+    ordered, seen = [], set()
+
+    def visit(model):
+        if model in seen:
+            return
+        seen.add(model)
+        for field in model._meta.local_concrete_fields:
+            if field.is_relation and field.related_model in model_list:
+                visit(field.related_model)
+        ordered.append(model)
+
+    for model in model_list:
+        visit(model)
+    return ordered
 
 
 class Command(BaseCommand):
@@ -22,13 +81,13 @@ class Command(BaseCommand):
         ]
 
     def add_arguments(self, parser):
-        default_output = f"railway_dump_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        default_output = f"railway_dump_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
 
         parser.add_argument(
             '-o', '--output',
             type=str,
             default=default_output,
-            help=f'Output JSON file path (default: {default_output})'
+            help=f'Output JSON Lines file path (default: {default_output})'
         )
         parser.add_argument(
             '-a', '--action',
@@ -56,51 +115,21 @@ class Command(BaseCommand):
         return logging.getLogger(__name__)
 
     def dump_data(self, output_file: Path) -> bool:
-        """Dump data from Django using dumpdata."""
+        """
+        Dump data from Django as JSON Lines, one record per line. Primary and
+        foreign keys are kept as ids, which is what the COPY loader writes.
+        """
         try:
             self.logger.info(f"Starting data dump to {output_file}")
-            combined_data = {}
-
-            for app_name in self.target_apps:
-                self.logger.info(f"Dumping {app_name}...")
-                temp_file = f"{app_name}_temp.json"
-
-                try:
-                    # Use dumpdata with natural keys for better compatibility
-                    management.call_command(
-                        'dumpdata',
-                        app_name,
-                        natural_foreign=True,
-                        natural_primary=True,
-                        indent=2,
-                        output=temp_file
-                    )
-
-                    if Path(temp_file).exists() and Path(temp_file).stat().st_size > 2:
-                        with open(temp_file, 'r') as f:
-                            data = json.load(f)
-                            if isinstance(data, list):
-                                for item in data:
-                                    model = item['model']
-                                    if model not in combined_data:
-                                        combined_data[model] = []
-                                    combined_data[model].append(item)
-                    else:
-                        self.logger.warning(f"No data found for {app_name}")
-
-                finally:
-                    # Clean up temp file
-                    Path(temp_file).unlink(missing_ok=True)
-
-            if combined_data:
-                with open(output_file, 'w') as f:
-                    json.dump(combined_data, f, indent=2)
-
-                total_records = sum(len(records) for records in combined_data.values())
-                self.logger.info(
-                    f"Saved {total_records} records from "
-                    f"{len(combined_data)} models to {output_file}"
-                )
+            management.call_command(
+                'dumpdata',
+                *self.target_apps,
+                format='jsonl',
+                output=str(output_file)
+            )
+
+            if output_file.exists() and output_file.stat().st_size > 0:
+                self.logger.info(f"Saved {output_file.stat().st_size / 1e6:.1f} MB to {output_file}")
                 return True
 
             self.logger.error("No data was dumped")
@@ -110,8 +139,65 @@ class Command(BaseCommand):
             self.logger.error(f"Failed to dump data: {str(e)}")
             return False
 
+    def stage_model(self, cur, model, records: Iterator[dict], staged: Dict) -> int:
+        """
+        COPY the records of a model into its temporary staging table, created
+        on first use. Rows are spooled to a temporary file first, so only one
+        line is held in memory at a time.
+        """
+        fields = copy_fields(model)
+        if model not in staged:
+            staged[model] = 0
+            cur.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(
+                sql.Identifier(f"stage_{model._meta.db_table}"), sql.Identifier(model._meta.db_table)
+            ))
+
+        rows = 0
+        with tempfile.TemporaryFile('w+') as spool:
+            for record in records:
+                spool.write(copy_row(record, fields))
+                rows += 1
+            spool.seek(0)
+            copy = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+                sql.Identifier(f"stage_{model._meta.db_table}"),
+                sql.SQL(', ').join(sql.Identifier(field.column) for field in fields)
+            )
+            cur.copy_expert(copy.as_string(cur), spool)
+        staged[model] += rows
+        return rows
+
+    def merge_model(self, cur, model) -> None:
+        """Insert or update the staged rows of a model in one statement, then fix its id sequence."""
+        table = model._meta.db_table
+        fields = copy_fields(model)
+        columns = sql.SQL(', ').join(sql.Identifier(field.column) for field in fields)
+        pk = sql.Identifier(fields[0].column)
+        if len(fields) > 1:
+            conflict = sql.SQL("DO UPDATE SET {}").format(sql.SQL(', ').join(
+                sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(field.column)) for field in fields[1:]
+            ))
+        else:
+            conflict = sql.SQL("DO NOTHING")
+        cur.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} ON CONFLICT ({}) {}").format(
+            sql.Identifier(table), columns, columns, sql.Identifier(f"stage_{table}"), pk, conflict
+        ))
+
+        cur.execute("SELECT pg_get_serial_sequence(%s, %s)", [table, fields[0].column])
+        sequence = cur.fetchone()[0]
+        if sequence:
+            cur.execute(sql.SQL("SELECT setval(%s, COALESCE(MAX({0}), 1), MAX({0}) IS NOT NULL) FROM {1}").format(
+                pk, sql.Identifier(table)
+            ), [sequence])
+        cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(f"stage_{table}")))
+
     def load_to_railway(self, input_file: Path, railway_url: str) -> bool:
-        """Load data directly to Railway PostgreSQL."""
+        """
+        Load a JSON Lines dump to Railway PostgreSQL. Every model is streamed
+        through COPY into a staging table, then merged into its table with a
+        single INSERT ... ON CONFLICT, in foreign key order. Each table is
+        committed on its own, and a table that fails is rolled back whole and
+        reported, instead of losing the rows around a bad record.
+        """
         try:
             self.logger.info("Starting load to Railway PostgreSQL")
 
@@ -128,66 +214,49 @@ class Command(BaseCommand):
                 port=url.port
             )
 
-            with open(input_file, 'r') as f:
-                data = json.load(f)
-
-            total_processed = 0
-            total_errors = 0
-
-            with conn:
+            staged: Dict = {}
+            failed: List[str] = []
+            try:
                 with conn.cursor() as cur:
-                    # Process each model's data
-                    for model_name, records in data.items():
-                        table_name = model_name.replace('.', '_')
-                        self.logger.info(f"\nProcessing {len(records)} records for {table_name}")
-
-                        for record in records:
-                            try:
-                                fields = record['fields']
-                                pk = record.get('pk')
-
-                                if pk:
-                                    fields['id'] = pk
-
-                                # Filter out None values
-                                fields = {k: v for k, v in fields.items() if v is not None}
-
-                                columns = list(fields.keys())
-                                values = list(fields.values())
-
-                                sql = f"""
-                                    INSERT INTO {table_name} ({', '.join(columns)})
-                                    VALUES ({', '.join(['%s'] * len(columns))})
-                                    ON CONFLICT (id) 
-                                    DO UPDATE SET {
-                                ', '.join(f"{col} = EXCLUDED.{col}"
-                                          for col in columns)
-                                }
-                                """
-
-                                cur.execute(sql, values)
-                                total_processed += 1
-
-                                if total_processed % 1000 == 0:
-                                    conn.commit()
-                                    self.logger.info(f"Processed {total_processed} records")
-
-                            except Exception as e:
-                                total_errors += 1
-                                conn.rollback()
-                                self.logger.error(
-                                    f"Error loading record into {table_name}: {str(e)}"
-                                )
-                                continue
-
-            conn.close()
+                    for label, records in iter_dump(input_file):
+                        model = apps.get_model(label)
+                        if model._meta.db_table in failed:
+                            continue
+                        try:
+                            rows = self.stage_model(cur, model, records, staged)
+                            conn.commit()
+                            self.logger.info(f"Staged {rows} records for {model._meta.db_table}")
+                        except psycopg2.Error as e:
+                            conn.rollback()
+                            staged.pop(model, None)
+                            failed.append(model._meta.db_table)
+                            self.logger.error(f"Error staging {model._meta.db_table}: {str(e)}")
+
+                    for model in merge_order(staged):
+                        table = model._meta.db_table
+                        try:
+                            self.merge_model(cur, model)
+                            conn.commit()
+                            self.logger.info(f"Merged {staged[model]} records into {table}")
+                        except psycopg2.Error as e:
+                            conn.rollback()
+                            failed.append(table)
+                            self.logger.error(f"Error merging {table}: {str(e)}")
+            finally:
+                conn.close()
+
             self.logger.info(
                 f"Loading completed: "
-                f"Processed {total_processed} records, "
-                f"Encountered {total_errors} errors"
+                f"Loaded {sum(staged.values())} records into {len(staged)} tables, "
+                f"{len(failed)} tables failed"
             )
-            return True
+            if failed:
+                self.logger.error(f"Tables not loaded: {', '.join(failed)}")
+            return not failed
 
+        except json.JSONDecodeError:
+            self.logger.error(f"{input_file} is not a JSON Lines dump, dump it again with --action dump")
+            return False
         except Exception as e:
             self.logger.error(f"Failed to load to Railway: {str(e)}")
             return False
@@ -7,6 +7,7 @@ from fin_data_cl.models import Exchange, Security, PriceData
 from tqdm import tqdm  # Import tqdm --
 logger = logging.getLogger(__name__)
 from fin_data_cl.utils.Price_Update_manager import PriceDataFetcher  # Import the fetcher
+from fin_data_cl.utils.trading_calendar import invalidate_trading_calendars
 from datetime import timedelta
 
 class Command(BaseCommand):
@@ -142,6 +143,10 @@ class Command(BaseCommand):
                     failed_securities.append(security.ticker)
                     logger.error(f"Error processing {security.ticker}: {str(e)}")
 
+            # New sessions invalidate the cached trading calendars and snapshots
+            if total_records or deleted_count:
+                invalidate_trading_calendars()
+
             # Log summary
             duration = timezone.now() - start_time
             logger.info(
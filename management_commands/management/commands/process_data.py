@@ -1,9 +1,11 @@
-import pandas as pd
-from decimal import Decimal, InvalidOperation
-from tqdm import tqdm
+from pathlib import Path
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from fin_data_cl.models import Exchange, Security, FinancialData
+import time
+from fin_data_cl.models import Exchange
+from fin_data_cl.utils.bulk_ops import DEFAULT_BATCH_SIZE
+from fin_data_cl.utils.csv_import import DEFAULT_CHUNK_SIZE
+from fin_data_cl.utils.financial_import import import_financial_data, load_financial_file
 
 class Command(BaseCommand):
     help = 'Import financial data from a CSV file'
@@ -15,122 +17,40 @@ class Command(BaseCommand):
             required=True,
             help='Exchange code to update (e.g., NYSE)'
         )
-
+        parser.add_argument(
+            '--file',
+            type=str,
+            default='Database_in_CLP.csv',
+            help='CSV file to import, absolute or relative to media/Data/Chile'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Rows written per database round trip'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Rows read from the file at a time'
+        )
 
     def handle(self, *args, **kwargs):
-        file_path = r'C:\Users\s0Csrak\OneDrive\Documents\python\RIVING-Tools\Data\Chile\Database_in_CLP.csv'
-        start_time = timezone.now()
+        file_path = Path(settings.MEDIA_ROOT) / 'Data' / 'Chile' / kwargs['file']
         exchange_code = kwargs['exchange'].upper()
 
-        def clean_column_names(df):
-            df.columns = (
-                df.columns
-                .str.strip()
-                .str.lower()
-                .str.replace(' ', '_')
-                .str.replace('-', '_')
-                .str.replace(r'[^a-zA-Z0-9_]', '', regex=True)
-            )
-            return df
-
-        def parse_and_create_database(file_path):
-            df = pd.read_csv(file_path)
-            df = clean_column_names(df)
-
-            metrics = [
-                'revenue', 'net_profit', 'operating_profit', 'non_controlling_profit', 'eps', 'operating_eps',
-                'interest_revenue', 'cash_from_sales', 'cash_from_yield', 'cash_from_rent', 'cash_to_payments',
-                'cash_to_other_payments', 'speculation_cash', 'current_payables', 'cost_of_sales', 'ebit',
-                'depreciation', 'interest', 'cash', 'current_assets', 'liabilities', 'marketable_securities',
-                'current_other_assets', 'provisions_for_employees', 'non_current_assets', 'goodwill',
-                'intangible_assets', 'assets', 'current_liabilities', 'equity', 'shares', 'inventories',
-                'shares_authorized', 'net_operating_cashflows', 'net_investing_cashflows', 'net_financing_cashflows',
-                'payment_for_supplies', 'payment_to_employees', 'dividends_paid', 'forex', 'trade_receivables',
-                'prepayments', 'cash_on_hands', 'cash_on_banks', 'cash_short_investment', 'employee_benefits'
-            ]
-
-            ticker_tables = {}
-
-            for metric in tqdm(metrics, desc="Processing Metrics"):
-                df_relevant = df[['date', 'ticker', metric]].copy()
-                df_relevant['code'] = df_relevant[metric].shift(-1).where(df_relevant.index % 2 == 0)
-                df_relevant = df_relevant[df_relevant.index % 2 == 0]
-
-                df_relevant['date'] = pd.to_datetime(df_relevant['date'], format='%Y%m')
-                df_relevant[metric] = df_relevant[metric].apply(lambda x: Decimal(str(x)) if pd.notnull(x) else None)
-                df_relevant['code'] = pd.to_numeric(df_relevant['code'], errors='coerce').replace({pd.NA: None})
-                df_relevant = df_relevant.sort_values(by=['ticker', 'date'])
-
-                tickers = df_relevant['ticker'].unique()
-
-                for ticker in tickers:
-
-                    ticker_data = df_relevant[df_relevant['ticker'] == ticker]
-                    prev_processed_value = Decimal(0)
-                    processed_values = []
-
-                    for _, row in ticker_data.iterrows():
-                        unprocessed_value = row[metric]
-                        code = row['code']
-
-                        if unprocessed_value is None or code is None:
-                            continue  # Skip rows with invalid data
-
-                        quarter = row['date'].month // 3
-
-                        if quarter == 1:
-                            prev_processed_value = Decimal(0)
-
-                        try:
-                            if code == 10:
-                                processed_value = Decimal(unprocessed_value)
-                            elif code == 11 or code == 12:
-                                processed_value = Decimal(unprocessed_value) - prev_processed_value
-                            else:
-                                processed_value = Decimal(unprocessed_value)
-                        except InvalidOperation:
-                            processed_value = None  # Skip invalid Decimal operations
-
-                        if processed_value is not None:
-                            prev_processed_value += processed_value
-                            processed_values.append((row['date'], processed_value))
-
-                    metric_df = pd.DataFrame(processed_values, columns=['date', metric])
-
-                    if ticker in ticker_tables:
-                        ticker_tables[ticker] = pd.merge(ticker_tables[ticker], metric_df, on='date', how='outer')
-                    else:
-                        ticker_tables[ticker] = metric_df
-
-            tickers_list = list(ticker_tables.keys())
-            tables_list = [ticker_tables[tickerr] for tickerr in tickers_list]
-
-            return tickers_list, tables_list
-
-        def save_financial_data(securityob, date, created_at, updated_at,**opts):
-            cleaned_data = {k: (v if pd.notna(v) else None) for k, v in opts.items()}
-            FinancialData.objects.update_or_create(
-                security=securityob,
-                date=date,
-                created_at=created_at,
-                updated_at=updated_at,
-                defaults=cleaned_data
-            )
+        if not file_path.exists():
+            self.stderr.write(f'File {file_path} does not exist.')
+            return
 
-        ticker_list, tables_list = parse_and_create_database(file_path)
         exchange = Exchange.objects.get(code=exchange_code)
-        securities = Security.objects.filter(
-            exchange=exchange,
-            is_active=True
+        table, stats = load_financial_file(file_path, chunk_size=kwargs['chunk_size'])
+        result = import_financial_data(table, exchange, batch_size=kwargs['batch_size'])
+        stats.add_written((result['created'], result['updated']))
+        stats.finished = time.perf_counter()
+
+        self.stdout.write(
+            f"Imported {len(table)} quarters from {stats.summary()}, "
+            f"{len(result['skipped_tickers'])} tickers skipped"
         )
-        current_time = timezone.now()
-        for ticker, df in tqdm(zip(ticker_list, tables_list), desc="Saving Data", total=len(ticker_list)):
-            security_ob = securities.filter(ticker=ticker).first()
-            for _, row in df.iterrows():
-                save_financial_data(
-                    securityob=security_ob,
-                    date=row['date'],
-                    created_at=current_time,
-                    updated_at=current_time,
-                    **{metric: row.get(metric) for metric in df.columns if metric != 'date'}
-                )
@@ -28,11 +28,22 @@ class Command(BaseCommand):
             action='store_true',
             help='Scrap dividends'
         )
+        parser.add_argument(
+            '--delta',
+            action='store_true',
+            help='Only scrap dividends since the last stored one of each security'
+        )
         parser.add_argument(
             '--analysis',
             action='store_true',
             help='Scrap reasoned analysis'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.SCRAPING_WORKERS,
+            help='Concurrent downloads'
+        )
 
     def handle(self, *args, **kwargs):
         #unittest.main()
@@ -54,7 +65,7 @@ class Command(BaseCommand):
             logging.debug(f"Successfully retrieved tickers: {all_tickers.head()}")
         except Exception as e:
             logging.error(f"Error retrieving tickers: {e}")
-        cmf_scraping = CmfScraping(tickers=all_tickers)
+        cmf_scraping = CmfScraping(tickers=all_tickers, workers=kwargs['workers'])
         if analysis:
             for year in range(start_year, end_year + 1):
                 try:
@@ -65,5 +76,5 @@ class Command(BaseCommand):
                 except RequestException as e:
                     logging.error(f"Failed to scrape links: {e}")
         if dividends:
-            cmf_scraping.scrap_dividends(start_year,end_year)
+            cmf_scraping.scrap_dividends(start_year, end_year, delta=kwargs['delta'])
 
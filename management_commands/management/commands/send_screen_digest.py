@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+
+from fin_data_cl.models import SavedScreenEvent
+from fin_data_cl.utils.saved_screens import pending_digests
+
+
+class Command(BaseCommand):
+    help = 'Email each user the securities that newly passed their saved screens'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the digests without sending them'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        digests = pending_digests()
+
+        if not digests:
+            self.stdout.write("No new screen entries to report")
+            return
+
+        sent, failed, without_email = 0, 0, 0
+        notified_ids = []
+        for user, digest in digests.items():
+            lines = ["New securities passing your saved screens:", ""]
+            for screen_name, symbols in digest['screens'].items():
+                lines.append(f"{screen_name}: {', '.join(symbols)}")
+            message = "\n".join(lines)
+
+            if dry_run:
+                self.stdout.write(f"--- {user.email or user.username}\n{message}\n")
+                continue
+            if not user.email:
+                # Nothing can be delivered, so the entries are not reported again on every run
+                without_email += 1
+                notified_ids += digest['event_ids']
+                continue
+
+            try:
+                send_mail(
+                    subject='Your saved screens digest',
+                    message=message,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    recipient_list=[user.email],
+                )
+                sent += 1
+                notified_ids += digest['event_ids']
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"Error emailing {user.username}: {str(e)}"))
+
+        if dry_run:
+            return
+
+        SavedScreenEvent.objects.filter(id__in=notified_ids).update(notified=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {sent} digests, {failed} failed, {without_email} users without an email skipped"
+        ))
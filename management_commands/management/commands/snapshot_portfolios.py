@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portfolios.utils.snapshots import snapshot_portfolios
+
+
+class Command(BaseCommand):
+    help = 'Store the daily value snapshot of every portfolio'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='Snapshot date (YYYY-MM-DD), defaults to the latest trading session'
+        )
+
+    def handle(self, *args, **options):
+        snapshot_date = None
+        if options.get('date'):
+            try:
+                snapshot_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Date must be in YYYY-MM-DD format")
+
+        count = snapshot_portfolios(snapshot_date)
+        self.stdout.write(self.style.SUCCESS(f"Stored {count} portfolio snapshots"))
@@ -38,12 +38,21 @@ class Portfolio(models.Model):
         default='monthly'
     )
 
+    def get_valuation(self):
+        """Value all positions with a single price query"""
+        from portfolios.utils.valuation import value_portfolios
+        return value_portfolios([self])[self.id]
+
     def get_total_value(self):
         """Calculate total portfolio value"""
-        return sum(position.get_current_value() for position in self.positions.all())
+        return self.get_valuation().total_value
 
     def get_positions_data(self):
         """Get formatted positions data"""
+        from portfolios.utils.valuation import LatestPriceSnapshot, PortfolioValuation
+        positions = list(self.positions.select_related('security'))
+        snapshot = LatestPriceSnapshot.load(position.security_id for position in positions)
+        valuation = PortfolioValuation(positions, snapshot)
         return [{
             'id': position.id,
             'security': {
@@ -53,8 +62,8 @@ class Portfolio(models.Model):
             },
             'shares': float(position.shares),
             'average_price': float(position.average_price),
-            'current_value': float(position.get_current_value())
-        } for position in self.positions.all()]
+            'current_value': valuation.current_value(position.id)
+        } for position in positions]
 
 
 class Position(models.Model):
@@ -70,8 +79,9 @@ class Position(models.Model):
     last_modified = models.DateTimeField(auto_now=True)
 
     def get_current_value(self):
-        """Calculate current position value"""
-        return self.shares * self.security.get_latest_price()
+        """Calculate current position value, None if the security has no prices"""
+        price = self.security.get_latest_price()
+        return None if price is None else Decimal(str(self.shares)) * price
 
 
 class PortfolioSnapshot(models.Model):
@@ -1,8 +1,22 @@
 # portfolios/serializers.py
 from rest_framework import serializers
 from .models import Portfolio, Position
+from .utils.valuation import value_portfolios
 from fin_data_cl.serializers import SecuritySerializer
 
+
+def get_valuations(context, portfolios):
+    """
+    Valuations shared through the serializer context, so every portfolio
+    being serialized is valued with the same single price query.
+    """
+    valuations = context.setdefault('valuations', {})
+    missing = [portfolio for portfolio in portfolios if portfolio.id not in valuations]
+    if missing:
+        valuations.update(value_portfolios(missing))
+    return valuations
+
+
 class PositionSerializer(serializers.ModelSerializer):
     security = SecuritySerializer(read_only=True)
     security_id = serializers.IntegerField(write_only=True)
@@ -16,7 +30,11 @@ class PositionSerializer(serializers.ModelSerializer):
         ]
 
     def get_current_value(self, obj):
-        return float(obj.get_current_value())
+        valuation = self.context.get('valuations', {}).get(obj.portfolio_id)
+        if valuation is not None:
+            return valuation.current_value(obj.id)
+        value = obj.get_current_value()
+        return None if value is None else float(value)
 
     def validate(self, data):
         if data.get('shares', 0) <= 0:
@@ -29,6 +47,14 @@ class PositionSerializer(serializers.ModelSerializer):
             )
         return data
 
+class PortfolioListSerializer(serializers.ListSerializer):
+    """Values the whole page of portfolios before serializing them"""
+
+    def to_representation(self, data):
+        portfolios = list(data.all() if hasattr(data, 'all') else data)
+        get_valuations(self.context, portfolios)
+        return super().to_representation(portfolios)
+
 class PortfolioSerializer(serializers.ModelSerializer):
     positions = PositionSerializer(many=True, read_only=True)
     total_value = serializers.SerializerMethodField()
@@ -42,6 +68,12 @@ class PortfolioSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = PortfolioListSerializer
+
+    def to_representation(self, instance):
+        # Positions are serialized before total_value, value them first
+        get_valuations(self.context, [instance])
+        return super().to_representation(instance)
 
     def get_total_value(self, obj):
-        return float(obj.get_total_value())
\ No newline at end of file
+        return get_valuations(self.context, [obj])[obj.id].total_value
@@ -0,0 +1,158 @@
+# portfolios/utils/analytics.py
+"""
+Realized risk and return of a portfolio.
+
+The current holdings are replayed over an aligned price matrix
+(fin_data_cl.utils.price_matrix): the portfolio's daily total return is the
+change in value of the positions that had a price the day before, dividends
+included. The benchmark is the equal-weighted composite of the exchange, as
+no index series is stored. Results are cached per holdings, price data
+version and end date.
+"""
+from datetime import date
+from typing import Dict, List, Optional
+import hashlib
+import logging
+
+import numpy as np
+from django.conf import settings
+
+from fin_data_cl.models import Security
+from fin_data_cl.utils.price_matrix import PriceMatrix
+from fin_data_cl.utils.trading_calendar import PRICE_DATA_VERSION, get_trading_calendar
+from finriv.utils.cache import get_or_compute, get_version
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+ANALYTICS_TIMEOUT = 60 * 60 * 24
+RISK_FREE_RATE = getattr(settings, 'RISK_FREE_RATE', 0.0)
+
+
+def holdings_digest(positions: List) -> str:
+    """Version of a portfolio's holdings, changes whenever a position does."""
+    holdings = sorted((position.security_id, str(position.shares)) for position in positions)
+    return hashlib.sha1(repr(holdings).encode()).hexdigest()[:12]
+
+
+def weighted_returns(closes: np.ndarray, dividends: np.ndarray, shares: np.ndarray) -> np.ndarray:
+    """
+    Daily total return of fixed share holdings. Each day only the positions
+    priced the day before count, so listings inside the window do not show
+    up as returns. NaN on days without any priced position.
+    """
+    previous = closes[:-1] * shares
+    current = (closes[1:] + dividends[1:]) * shares
+    priced = ~np.isnan(previous)
+    start_value = np.where(priced, previous, 0.0).sum(axis=1)
+    end_value = np.where(priced, current, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(start_value > 0, end_value / start_value - 1, np.nan)
+
+
+def composite_returns(returns: np.ndarray) -> np.ndarray:
+    """Equal-weighted mean of the securities that traded each day."""
+    traded = ~np.isnan(returns)
+    count = traded.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, np.where(traded, returns, 0.0).sum(axis=1) / count, np.nan)
+
+
+def max_drawdown(returns: np.ndarray) -> float:
+    """Largest peak-to-trough fall of the compounded returns, as a negative fraction."""
+    wealth = np.concatenate([[1.0], np.cumprod(1 + returns)])
+    return float((wealth / np.maximum.accumulate(wealth) - 1).min())
+
+
+def compute_metrics(returns: np.ndarray, benchmark: Optional[np.ndarray] = None,
+                    risk_free_rate: float = RISK_FREE_RATE) -> Dict:
+    """Return and risk metrics of a daily return series, NaN days are skipped."""
+    valid = ~np.isnan(returns)
+    daily = returns[valid]
+    if len(daily) < 2:
+        return {'observations': int(len(daily))}
+
+    total_return = float(np.prod(1 + daily) - 1)
+    volatility = float(np.std(daily, ddof=1) * np.sqrt(TRADING_DAYS))
+    metrics = {
+        'observations': int(len(daily)),
+        'time_weighted_return': total_return,
+        'annualized_return': float((1 + total_return) ** (TRADING_DAYS / len(daily)) - 1),
+        'annualized_volatility': volatility,
+        'max_drawdown': max_drawdown(daily),
+        'sharpe_ratio': float((daily.mean() * TRADING_DAYS - risk_free_rate) / volatility) if volatility else None,
+        'beta': None,
+    }
+
+    if benchmark is not None:
+        paired = valid & ~np.isnan(benchmark)
+        if paired.sum() > 1:
+            covariance = np.cov(returns[paired], benchmark[paired])
+            if covariance[1, 1] > 0:
+                metrics['beta'] = float(covariance[0, 1] / covariance[1, 1])
+    return metrics
+
+
+def _empty_analytics() -> Dict:
+    return {'metrics': {'observations': 0}, 'series': {'dates': [], 'portfolio': [], 'benchmark': []}}
+
+
+def _compute_analytics(positions: List, exchange_id: int, start: date, end: date) -> Dict:
+    benchmark_ids = list(Security.objects.filter(exchange_id=exchange_id, is_active=True).values_list('id', flat=True))
+    held_ids = [position.security_id for position in positions]
+    matrix = PriceMatrix.load(set(held_ids) | set(benchmark_ids), start, end)
+    if len(matrix) < 2:
+        return _empty_analytics()
+
+    held = matrix.columns(held_ids)
+    shares = np.array([float(position.shares) for position in positions], dtype=np.float64)
+    filled = matrix.filled_closes()
+    returns = weighted_returns(filled[:, held], matrix.dividends[:, held], shares)
+    benchmark = composite_returns(matrix.returns()[:, matrix.columns(benchmark_ids)]) if benchmark_ids else None
+
+    def cumulative(series):
+        return [round(float(value), 6) for value in np.cumprod(1 + np.nan_to_num(series)) - 1]
+
+    return {
+        'start': matrix.dates[0].item(),
+        'end': matrix.dates[-1].item(),
+        'metrics': compute_metrics(returns, benchmark),
+        'series': {
+            'dates': [day.item() for day in matrix.dates[1:]],
+            'portfolio': cumulative(returns),
+            'benchmark': cumulative(benchmark) if benchmark is not None else [],
+        },
+    }
+
+
+def portfolio_analytics(portfolio, days: int, exchange_id: Optional[int] = None) -> Dict:
+    """
+    Analytics of a portfolio's current holdings over the last `days` calendar
+    days, against the composite of `exchange_id` (by default the exchange
+    holding most of its positions). Prefetch the positions with their
+    securities to avoid a query here.
+    """
+    positions = list(portfolio.positions.all())
+    if not positions:
+        return _empty_analytics()
+
+    if exchange_id is None:
+        exchange_ids = [position.security.exchange_id for position in positions]
+        exchange_id = max(set(exchange_ids), key=exchange_ids.count)
+
+    end = get_trading_calendar().latest_session()
+    if end is None:
+        return _empty_analytics()
+    start = get_trading_calendar().window_start(end, days)
+
+    key = (
+        f'portfolio_analytics_{portfolio.id}_{holdings_digest(positions)}_'
+        f'{get_version(PRICE_DATA_VERSION)}_{end}_{days}_{exchange_id}'
+    )
+    analytics = get_or_compute(key, lambda: _compute_analytics(positions, exchange_id, start, end), ANALYTICS_TIMEOUT)
+    return {
+        **analytics,
+        'exchange_id': exchange_id,
+        'target_risk': float(portfolio.target_risk) if portfolio.target_risk is not None else None,
+        'target_return': float(portfolio.target_return) if portfolio.target_return is not None else None,
+    }
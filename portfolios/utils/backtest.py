@@ -0,0 +1,189 @@
+# portfolios/utils/backtest.py
+"""
+Vectorized backtests of target-weight rebalancing strategies.
+
+Between two rebalances the holdings are fixed, so the value of every position
+is its weight at the last rebalance times the compounded growth of its
+security since then. Growth is a cumulative sum of log returns, so the whole
+path is a handful of array operations over the (dates x securities) price
+matrix, and only the per-rebalance cost factors are chained with a cumprod.
+"""
+from datetime import date
+from typing import Dict, Optional
+import logging
+import math
+
+import numpy as np
+
+from fin_data_cl.utils.price_matrix import PriceMatrix, forward_fill
+from fin_data_cl.utils.trading_calendar import get_trading_calendar
+from portfolios.utils.analytics import compute_metrics
+from portfolios.utils.valuation import value_portfolios
+
+logger = logging.getLogger(__name__)
+
+REBALANCING_FREQUENCIES = ('daily', 'weekly', 'monthly', 'quarterly', 'yearly')
+
+
+def rebalance_mask(dates: np.ndarray, frequency: str) -> np.ndarray:
+    """True on the first session of every period, the first date included."""
+    if frequency not in REBALANCING_FREQUENCIES:
+        raise ValueError(f"Unknown rebalancing frequency '{frequency}', use one of {', '.join(REBALANCING_FREQUENCIES)}")
+
+    days = dates.astype('datetime64[D]')
+    if frequency == 'daily':
+        periods = days.astype(np.int64)
+    elif frequency == 'weekly':
+        # 1970-01-01 was a Thursday, shift so weeks start on Mondays
+        periods = (days.astype(np.int64) + 3) // 7
+    elif frequency == 'monthly':
+        periods = days.astype('datetime64[M]').astype(np.int64)
+    elif frequency == 'quarterly':
+        periods = days.astype('datetime64[M]').astype(np.int64) // 3
+    else:
+        periods = days.astype('datetime64[Y]').astype(np.int64)
+
+    mask = np.ones(len(days), dtype=bool)
+    mask[1:] = periods[1:] != periods[:-1]
+    return mask
+
+
+def run_backtest(dates: np.ndarray, closes: np.ndarray, dividends: np.ndarray, weights: np.ndarray,
+                 frequency: str = 'monthly', cost_bps: float = 0.0, reinvest_dividends: bool = True,
+                 initial_value: float = 1.0) -> Dict:
+    """
+    Simulate holding `weights` (summing to 1) and rebalancing back to them
+    at the close of the first session of every `frequency` period.
+
+    Args:
+        dates: Session dates, shape (T,)
+        closes: Closes, shape (T, N), NaN where a security did not trade.
+            Weight on a security not listed yet is held as cash until it is.
+        dividends: Dividends per share, shape (T, N)
+        weights: Target weights, shape (N,)
+        cost_bps: Cost of trading, in basis points of the traded value
+        reinvest_dividends: Reinvest dividends in the paying security,
+            otherwise they are held as cash until the next rebalance
+        initial_value: Value invested at the first close (costs included)
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    cost = cost_bps / 10000.0
+    filled = forward_fill(np.asarray(closes, dtype=np.float64))
+
+    previous = filled[:-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        price_growth = filled[1:] / previous
+        dividend_yield = dividends[1:] / previous
+    priced = ~np.isnan(previous)
+    price_growth = np.where(priced, price_growth, 1.0)
+    dividend_yield = np.where(priced, np.nan_to_num(dividend_yield), 0.0)
+    growth = price_growth + dividend_yield if reinvest_dividends else price_growth
+
+    # log_growth[t] = log of the growth of each security from the first close to t
+    log_growth = np.zeros_like(filled)
+    np.cumsum(np.log(growth), axis=0, out=log_growth[1:])
+
+    rebalances = np.flatnonzero(rebalance_mask(dates, frequency))
+    # Last rebalance strictly before every session (sessions 1..T-1)
+    anchors = rebalances[np.searchsorted(rebalances, np.arange(1, len(dates)), side='left') - 1]
+
+    # Value of 1 invested at the anchor, for every session after it
+    held = np.exp(log_growth[1:] - log_growth[anchors]) * weights
+    relative = held.sum(axis=1)
+    if not reinvest_dividends:
+        # Dividends of the previous day's holdings, accumulated as cash per segment
+        previous_held = np.exp(log_growth[:-1] - log_growth[anchors]) * weights
+        cash = np.concatenate([[0.0], np.cumsum((previous_held * dividend_yield).sum(axis=1))])
+        relative = relative + cash[1:] - cash[anchors]
+
+    # Turnover at every rebalance after the first: distance from the drifted weights back to the targets
+    later = rebalances[1:]
+    drifted = held[later - 1] / relative[later - 1, None]
+    turnover = np.concatenate([[np.abs(weights).sum()], np.abs(drifted - weights).sum(axis=1)])
+    cost_factors = 1 - cost * turnover
+
+    # Value before and right after each rebalance, then of every session from its anchor
+    pre_growth = np.concatenate([[1.0], relative[later - 1]])
+    post_values = initial_value * np.cumprod(pre_growth * cost_factors)
+    pre_values = np.concatenate([[initial_value], post_values[:-1] * relative[later - 1]])
+    nav = np.empty(len(dates))
+    nav[0] = post_values[0]
+    nav[1:] = post_values[np.searchsorted(rebalances, anchors)] * relative
+
+    returns = nav[1:] / nav[:-1] - 1
+    return {
+        'nav': nav,
+        'returns': returns,
+        'rebalance_dates': dates[rebalances],
+        'turnover': turnover,
+        'costs': float((pre_values * cost * turnover).sum()),
+        'metrics': compute_metrics(returns),
+    }
+
+
+def parse_target_weights(weights: str, positions) -> Dict[int, float]:
+    """
+    Parse 'TICKER:weight,...' over the portfolio's holdings into weights by
+    security id, normalized to sum to 1. Raises ValueError on bad input.
+    """
+    by_ticker = {position.security.ticker: position.security_id for position in positions}
+    parsed = {}
+    for item in filter(None, weights.split(',')):
+        ticker, _, weight = item.partition(':')
+        if ticker not in by_ticker:
+            raise ValueError(f"'{ticker}' is not held in this portfolio")
+        parsed[by_ticker[ticker]] = float(weight)
+        if not math.isfinite(parsed[by_ticker[ticker]]):
+            raise ValueError(f"Invalid weight for '{ticker}'")
+        if parsed[by_ticker[ticker]] < 0:
+            raise ValueError("Weights must not be negative")
+    total = sum(parsed.values())
+    if not total:
+        raise ValueError("At least one weight must be positive")
+    return {security_id: weight / total for security_id, weight in parsed.items()}
+
+
+def current_weights(portfolio) -> Dict[int, float]:
+    """Weights of the holdings at their latest value."""
+    valuation = value_portfolios([portfolio])[portfolio.id]
+    weights = {}
+    for position in portfolio.positions.all():
+        weight = valuation.weight(position.id)
+        if weight:
+            weights[position.security_id] = weights.get(position.security_id, 0.0) + weight
+    return weights
+
+
+def _empty_result() -> Dict:
+    return {'dates': [], 'nav': [], 'rebalance_dates': [], 'metrics': {'observations': 0}}
+
+
+def backtest_portfolio(weights: Dict[int, float], days: int, frequency: str,
+                       cost_bps: float = 0.0, reinvest_dividends: bool = True,
+                       end: Optional[date] = None) -> Dict:
+    """Backtest target weights by security id over the last `days` calendar days."""
+    calendar = get_trading_calendar()
+    end = end or calendar.latest_session()
+    if end is None or not weights:
+        return _empty_result()
+
+    security_ids = list(weights)
+    matrix = PriceMatrix.load(security_ids, calendar.window_start(end, days), end)
+    if len(matrix) < 2:
+        return _empty_result()
+
+    columns = matrix.columns(security_ids)
+    result = run_backtest(
+        matrix.dates, matrix.closes[:, columns], matrix.dividends[:, columns],
+        np.array([weights[security_id] for security_id in security_ids]),
+        frequency, cost_bps, reinvest_dividends
+    )
+    logger.debug(f"Backtested {len(security_ids)} securities over {len(matrix)} sessions")
+    return {
+        'dates': [day.item() for day in matrix.dates],
+        'nav': [round(float(value), 6) for value in result['nav']],
+        'rebalance_dates': [day.item() for day in result['rebalance_dates']],
+        'turnover': round(float(result['turnover'][1:].sum()), 6),
+        'costs': round(result['costs'], 6),
+        'metrics': result['metrics'],
+    }
@@ -0,0 +1,223 @@
+# portfolios/utils/optimizer.py
+"""
+Long-only mean-variance optimization towards a portfolio's target risk or return.
+
+Expected returns and a Ledoit-Wolf shrunk covariance are estimated once per
+exchange, window and price data version (warm_covariances runs after the
+price update), so the optimizations of every user reuse the same estimate.
+Frontier portfolios maximize return - risk_aversion / 2 * variance over the
+simplex with projected gradient ascent, and the risk aversion meeting the
+target is found by bisection, since risk and return both fall as it grows.
+"""
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+
+from fin_data_cl.models import Exchange, Security
+from fin_data_cl.utils.price_matrix import PriceMatrix
+from fin_data_cl.utils.trading_calendar import PRICE_DATA_VERSION, get_trading_calendar
+from finriv.utils.cache import get_or_compute, get_version
+from portfolios.models import PortfolioRebalanceHistory
+from portfolios.utils.analytics import TRADING_DAYS
+
+logger = logging.getLogger(__name__)
+
+COVARIANCE_TIMEOUT = 60 * 60 * 24
+DEFAULT_WINDOW_DAYS = 365
+# Share of the window's sessions a security must have traded to be estimated
+MIN_COVERAGE = 0.5
+GRADIENT_ITERATIONS = 500
+BISECTION_STEPS = 40
+
+
+def ledoit_wolf(returns: np.ndarray):
+    """
+    Covariance of demeaned returns (T x N, no NaNs) shrunk towards a scaled
+    identity with the Ledoit-Wolf optimal intensity. Returns (covariance, shrinkage).
+    """
+    observations, count = returns.shape
+    sample = returns.T @ returns / observations
+    mu = np.trace(sample) / count
+    delta = ((sample - mu * np.eye(count)) ** 2).sum() / count
+
+    squared = returns ** 2
+    beta = ((squared.T @ squared).sum() / observations - (sample ** 2).sum()) / (count * observations)
+    shrinkage = min(beta, delta) / delta if delta > 0 else 1.0
+    return (1 - shrinkage) * sample + shrinkage * mu * np.eye(count), float(shrinkage)
+
+
+def estimate(matrix: PriceMatrix) -> Dict:
+    """Annualized expected returns and shrunk covariance of the securities with enough history."""
+    returns = matrix.returns()
+    traded = ~np.isnan(returns)
+    keep = traded.mean(axis=0) >= MIN_COVERAGE
+    returns, traded = returns[:, keep], traded[:, keep]
+
+    means = np.where(traded, returns, 0.0).sum(axis=0) / np.maximum(traded.sum(axis=0), 1)
+    # Days a security did not trade count as no deviation from its mean
+    demeaned = np.where(traded, returns - means, 0.0)
+    covariance, shrinkage = ledoit_wolf(demeaned) if len(means) else (np.empty((0, 0)), 0.0)
+    return {
+        'security_ids': matrix.security_ids[keep],
+        'expected_returns': means * TRADING_DAYS,
+        'covariance': covariance * TRADING_DAYS,
+        'shrinkage': shrinkage,
+        'observations': int(returns.shape[0]),
+    }
+
+
+def get_exchange_covariance(exchange_id: int, days: int = DEFAULT_WINDOW_DAYS) -> Dict:
+    """Shared estimate for the active securities of an exchange over the last `days`."""
+    def compute():
+        calendar = get_trading_calendar()
+        end = calendar.latest_session()
+        security_ids = Security.objects.filter(exchange_id=exchange_id, is_active=True).values_list('id', flat=True)
+        matrix = PriceMatrix.load(security_ids, calendar.window_start(end, days) if end else None, end)
+        logger.info(f"Estimating covariance of exchange {exchange_id} over {len(matrix)} sessions")
+        return estimate(matrix)
+
+    version = get_version(PRICE_DATA_VERSION)
+    return get_or_compute(f'covariance_{exchange_id}_{days}_{version}', compute, COVARIANCE_TIMEOUT)
+
+
+def warm_covariances(days: int = DEFAULT_WINDOW_DAYS) -> int:
+    """Precompute the estimate of every exchange, run after new prices are stored."""
+    exchange_ids = list(Exchange.objects.values_list('id', flat=True))
+    for exchange_id in exchange_ids:
+        get_exchange_covariance(exchange_id, days)
+    return len(exchange_ids)
+
+
+def holdings_estimate(security_ids: List[int], exchange_ids: List[int], days: int = DEFAULT_WINDOW_DAYS) -> Dict:
+    """
+    Estimate restricted to `security_ids`, sliced from the shared exchange
+    estimate when they all trade on one exchange.
+    """
+    if len(set(exchange_ids)) == 1:
+        shared = get_exchange_covariance(exchange_ids[0], days)
+        index = {security_id: position for position, security_id in enumerate(shared['security_ids'].tolist())}
+        if all(security_id in index for security_id in security_ids):
+            columns = [index[security_id] for security_id in security_ids]
+            return {
+                **shared,
+                'security_ids': np.array(security_ids),
+                'expected_returns': shared['expected_returns'][columns],
+                'covariance': shared['covariance'][np.ix_(columns, columns)],
+            }
+
+    calendar = get_trading_calendar()
+    end = calendar.latest_session()
+    matrix = PriceMatrix.load(security_ids, calendar.window_start(end, days) if end else None, end)
+    result = estimate(matrix)
+    missing = set(security_ids) - set(result['security_ids'].tolist())
+    if missing:
+        raise ValueError(f"Not enough price history to estimate {len(missing)} of the holdings")
+    columns = [result['security_ids'].tolist().index(security_id) for security_id in security_ids]
+    return {
+        **result,
+        'security_ids': np.array(security_ids),
+        'expected_returns': result['expected_returns'][columns],
+        'covariance': result['covariance'][np.ix_(columns, columns)],
+    }
+
+
+def project_to_simplex(vector: np.ndarray) -> np.ndarray:
+    """Euclidean projection onto {w >= 0, sum(w) = 1}."""
+    ordered = np.sort(vector)[::-1]
+    cumulative = np.cumsum(ordered) - 1
+    rho = np.flatnonzero(ordered - cumulative / np.arange(1, len(vector) + 1) > 0)[-1]
+    return np.maximum(vector - cumulative[rho] / (rho + 1), 0.0)
+
+
+def frontier_weights(expected_returns: np.ndarray, covariance: np.ndarray, risk_aversion: float,
+                     start: Optional[np.ndarray] = None) -> np.ndarray:
+    """Long-only weights maximizing return - risk_aversion / 2 * variance."""
+    count = len(expected_returns)
+    weights = np.full(count, 1.0 / count) if start is None else start
+    lipschitz = risk_aversion * np.linalg.eigvalsh(covariance)[-1]
+    step = 1.0 / lipschitz if lipschitz > 0 else 1.0
+    for _ in range(GRADIENT_ITERATIONS):
+        updated = project_to_simplex(weights + step * (expected_returns - risk_aversion * covariance @ weights))
+        if np.abs(updated - weights).max() < 1e-10:
+            return updated
+        weights = updated
+    return weights
+
+
+def optimize_weights(expected_returns: np.ndarray, covariance: np.ndarray,
+                     target_risk: Optional[float] = None, target_return: Optional[float] = None) -> np.ndarray:
+    """
+    Frontier weights with the highest return within `target_risk` (annualized
+    volatility), or the lowest risk reaching `target_return`. Without a
+    target, or when it cannot be met, the closest end of the frontier.
+    """
+    low, high = -6.0, 6.0
+    conservative = frontier_weights(expected_returns, covariance, 10 ** high)
+    if target_risk is None and target_return is None:
+        return conservative
+    aggressive = frontier_weights(expected_returns, covariance, 10 ** low)
+
+    risk_target = target_risk is not None
+
+    def meets(weights):
+        if risk_target:
+            return np.sqrt(weights @ covariance @ weights) <= target_risk
+        return weights @ expected_returns >= target_return
+
+    # A risk target is met towards high risk aversion, a return target towards low
+    feasible_end, other_end = (conservative, aggressive) if risk_target else (aggressive, conservative)
+    if meets(other_end):
+        return other_end
+    if not meets(feasible_end):
+        return feasible_end
+
+    feasible, infeasible = (high, low) if risk_target else (low, high)
+    best = feasible_end
+    for _ in range(BISECTION_STEPS):
+        middle = (feasible + infeasible) / 2
+        weights = frontier_weights(expected_returns, covariance, 10 ** middle, best)
+        if meets(weights):
+            feasible, best = middle, weights
+        else:
+            infeasible = middle
+    return best
+
+
+def propose_rebalance(portfolio, current_weights: Dict[int, float], days: int = DEFAULT_WINDOW_DAYS) -> PortfolioRebalanceHistory:
+    """
+    Optimize the portfolio's holdings towards its target risk (or return)
+    and store the result as a rebalance proposal.
+    """
+    positions = list(portfolio.positions.all())
+    if not positions:
+        raise ValueError("The portfolio has no positions to optimize")
+
+    securities = {position.security_id: position.security for position in positions}
+    security_ids = list(securities)
+    holdings = holdings_estimate(security_ids, [securities[security_id].exchange_id for security_id in security_ids], days)
+    target_risk = float(portfolio.target_risk) if portfolio.target_risk is not None else None
+    target_return = float(portfolio.target_return) if portfolio.target_return is not None and target_risk is None else None
+
+    expected_returns, covariance = holdings['expected_returns'], holdings['covariance']
+    weights = optimize_weights(expected_returns, covariance, target_risk, target_return)
+    volatility = float(np.sqrt(weights @ covariance @ weights))
+    expected_return = float(weights @ expected_returns)
+
+    if target_risk is not None:
+        objective = f"target risk {target_risk:.2%}"
+    elif target_return is not None:
+        objective = f"target return {target_return:.2%}"
+    else:
+        objective = "minimum variance"
+
+    return PortfolioRebalanceHistory.objects.create(
+        portfolio=portfolio,
+        old_weights={securities[security_id].ticker: round(weight, 6) for security_id, weight in current_weights.items()},
+        new_weights={securities[security_id].ticker: round(float(weight), 6) for security_id, weight in zip(security_ids, weights)},
+        rebalance_type='optimization_proposal',
+        notes=(
+            f"Mean-variance optimization for {objective} over {days} days: expected return "
+            f"{expected_return:.2%}, volatility {volatility:.2%}, shrinkage {holdings['shrinkage']:.2f}"
+        ),
+    )
@@ -0,0 +1,127 @@
+# portfolios/utils/snapshots.py
+"""
+Daily PortfolioSnapshot generation.
+
+Every position of every portfolio is priced at once against the closes of the
+snapshot date, per-portfolio totals are summed with np.bincount and all
+snapshots are written with a single bulk upsert, so history can be served
+without replaying prices at request time.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+import logging
+
+import numpy as np
+from django.db.models import QuerySet
+
+from fin_data_cl.utils.trading_calendar import get_trading_calendar
+from portfolios.models import Portfolio, PortfolioSnapshot
+from portfolios.utils.valuation import LatestPriceSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Calendar days searched back for the previous snapshot of each portfolio
+PREVIOUS_SNAPSHOT_DAYS = 10
+
+SNAPSHOT_FIELDS = ['total_value', 'cash_position', 'performance_metrics', 'positions']
+
+
+def _to_decimal(value: float) -> Decimal:
+    return Decimal(str(round(value, 2)))
+
+
+def _previous_values(snapshot_date: date) -> Dict[int, float]:
+    """Total value of the last snapshot before `snapshot_date`, per portfolio."""
+    previous = {}
+    rows = PortfolioSnapshot.objects.filter(
+        date__lt=snapshot_date,
+        date__gte=snapshot_date - timedelta(days=PREVIOUS_SNAPSHOT_DAYS)
+    ).order_by('portfolio_id', '-date').values_list('portfolio_id', 'total_value')
+    for portfolio_id, total_value in rows:
+        previous.setdefault(portfolio_id, float(total_value))
+    return previous
+
+
+def build_snapshots(snapshot_date: date, portfolios=None):
+    """
+    Unsaved PortfolioSnapshot objects valuing `portfolios` (all by default)
+    at the closes on or before `snapshot_date`. `portfolios` is a Portfolio
+    queryset, or an iterable of portfolios or portfolio ids.
+    """
+    if portfolios is None:
+        portfolios = Portfolio.objects.all()
+    elif not isinstance(portfolios, QuerySet):
+        portfolios = Portfolio.objects.filter(pk__in=[getattr(portfolio, 'pk', portfolio) for portfolio in portfolios])
+    portfolios = list(portfolios.prefetch_related('positions__security'))
+    positions = [position for portfolio in portfolios for position in portfolio.positions.all()]
+
+    prices = LatestPriceSnapshot.load((position.security_id for position in positions), as_of=snapshot_date)
+    owner = {portfolio.id: index for index, portfolio in enumerate(portfolios)}
+    owners = np.array([owner[position.portfolio_id] for position in positions], dtype=np.int64)
+    shares = np.array([float(position.shares) for position in positions], dtype=np.float64)
+    average_prices = np.array([float(position.average_price) for position in positions], dtype=np.float64)
+    closes = prices.prices_for([position.security_id for position in positions])
+
+    values = shares * closes
+    priced = ~np.isnan(values)
+    totals = np.bincount(owners, weights=np.where(priced, values, 0.0), minlength=len(portfolios))
+    # Cost of the priced positions only, so gains are not distorted by unpriced ones
+    costs = np.bincount(owners, weights=np.where(priced, shares * average_prices, 0.0), minlength=len(portfolios))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weights = values / totals[owners]
+
+    previous = _previous_values(snapshot_date)
+    position_data = [{} for _ in portfolios]
+    for index, position in enumerate(positions):
+        position_data[owners[index]][str(position.security_id)] = {
+            'ticker': position.security.ticker,
+            'shares': float(shares[index]),
+            'average_price': float(average_prices[index]),
+            'price': float(closes[index]) if priced[index] else None,
+            'value': round(float(values[index]), 2) if priced[index] else None,
+            'weight': round(float(weights[index]), 6) if priced[index] and totals[owners[index]] else None,
+        }
+
+    snapshots = []
+    for index, portfolio in enumerate(portfolios):
+        total, cost = float(totals[index]), float(costs[index])
+        metrics = {
+            'total_cost': round(cost, 2),
+            'unrealized_gain': round(total - cost, 2),
+            'unrealized_return': round(total / cost - 1, 6) if cost else None,
+            'unpriced_positions': sum(1 for data in position_data[index].values() if data['price'] is None),
+        }
+        previous_total = previous.get(portfolio.id)
+        metrics['daily_return'] = round(total / previous_total - 1, 6) if previous_total else None
+
+        snapshots.append(PortfolioSnapshot(
+            portfolio=portfolio,
+            date=snapshot_date,
+            total_value=_to_decimal(total),
+            performance_metrics=metrics,
+            positions=position_data[index],
+        ))
+    return snapshots
+
+
+def snapshot_portfolios(snapshot_date: Optional[date] = None, portfolios=None) -> int:
+    """
+    Write the snapshots of `snapshot_date` (the latest trading session by
+    default) in one upsert, replacing any earlier run for the same day.
+    """
+    snapshot_date = snapshot_date or get_trading_calendar().latest_session()
+    if snapshot_date is None:
+        logger.warning("No trading sessions available, skipping portfolio snapshots")
+        return 0
+
+    snapshots = build_snapshots(snapshot_date, portfolios)
+    PortfolioSnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        # Column name, Django 4.1 does not translate the relation name in ON CONFLICT
+        unique_fields=['portfolio_id', 'date'],
+        update_fields=SNAPSHOT_FIELDS,
+    )
+    logger.info(f"Stored {len(snapshots)} portfolio snapshots for {snapshot_date}")
+    return len(snapshots)
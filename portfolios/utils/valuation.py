@@ -0,0 +1,135 @@
+# portfolios/utils/valuation.py
+"""
+Batched portfolio valuation.
+
+The latest close of every security held is loaded once (LatestPriceSnapshot)
+and positions are valued with array arithmetic, instead of one price query
+per position.
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+import logging
+
+import numpy as np
+from django.db.models import OuterRef, Subquery
+
+from fin_data_cl.models import PriceData
+from fin_data_cl.utils.trading_calendar import get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+# Calendar days before the latest session searched for a security's last close
+LOOKBACK_DAYS = 30
+
+
+class LatestPriceSnapshot:
+    """Latest close and its date for a set of securities."""
+
+    def __init__(self, prices: Dict[int, tuple]):
+        self._prices = prices
+
+    def __contains__(self, security_id):
+        return security_id in self._prices
+
+    @classmethod
+    def load(cls, security_ids: Iterable[int], lookback_days: int = LOOKBACK_DAYS,
+             as_of: Optional[date] = None) -> 'LatestPriceSnapshot':
+        """
+        One query bounded to the last `lookback_days` before the latest
+        session, plus one fallback query for securities not traded in it.
+        With `as_of`, closes after that date are ignored.
+        """
+        security_ids = set(security_ids)
+        prices = {}
+        if not security_ids:
+            return cls(prices)
+
+        queryset = PriceData.objects.filter(security_id__in=security_ids, close_price__isnull=False)
+        if as_of:
+            queryset = queryset.filter(date__lte=as_of)
+            latest_session = as_of
+        else:
+            latest_session = get_trading_calendar().latest_session()
+        if latest_session:
+            recent = queryset.filter(date__gte=latest_session - timedelta(days=lookback_days))
+            for security_id, day, close in recent.order_by('security_id', '-date').values_list(
+                    'security_id', 'date', 'close_price'):
+                prices.setdefault(security_id, (day, close))
+
+        missing = security_ids - prices.keys()
+        if missing:
+            logger.debug(f"No close in the last {lookback_days} days for {len(missing)} securities")
+            last_dates = PriceData.objects.filter(security_id=OuterRef('security_id'), close_price__isnull=False)
+            if as_of:
+                last_dates = last_dates.filter(date__lte=as_of)
+            last_date = last_dates.order_by('-date').values('date')[:1]
+            stale = queryset.filter(security_id__in=missing, date=Subquery(last_date))
+            for security_id, day, close in stale.values_list('security_id', 'date', 'close_price'):
+                prices[security_id] = (day, close)
+
+        return cls(prices)
+
+    def price(self, security_id: int):
+        """Latest close as a Decimal, None if the security has no prices."""
+        entry = self._prices.get(security_id)
+        return entry[1] if entry else None
+
+    def price_date(self, security_id: int):
+        entry = self._prices.get(security_id)
+        return entry[0] if entry else None
+
+    def prices_for(self, security_ids: List[int]) -> np.ndarray:
+        """Latest closes as floats, NaN where unknown."""
+        return np.array([
+            float(self._prices[security_id][1]) if security_id in self._prices else np.nan
+            for security_id in security_ids
+        ], dtype=np.float64)
+
+
+class PortfolioValuation:
+    """Values of a portfolio's positions at the snapshot prices."""
+
+    def __init__(self, positions: List, snapshot: LatestPriceSnapshot):
+        self.position_ids = [position.id for position in positions]
+        shares = np.array([float(position.shares) for position in positions], dtype=np.float64)
+        average_prices = np.array([float(position.average_price) for position in positions], dtype=np.float64)
+        self.prices = snapshot.prices_for([position.security_id for position in positions])
+
+        self.values = shares * self.prices
+        self.costs = shares * average_prices
+        self.total_value = float(np.nansum(self.values))
+        self.total_cost = float(np.nansum(self.costs))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.weights = self.values / self.total_value if self.total_value else np.full(len(positions), np.nan)
+        self._index = {position_id: index for index, position_id in enumerate(self.position_ids)}
+
+    def _value(self, array, position_id) -> Optional[float]:
+        value = array[self._index[position_id]]
+        return None if np.isnan(value) else float(value)
+
+    def current_value(self, position_id) -> Optional[float]:
+        """Value of a position, None if its security has no price."""
+        return self._value(self.values, position_id)
+
+    def current_price(self, position_id) -> Optional[float]:
+        return self._value(self.prices, position_id)
+
+    def weight(self, position_id) -> Optional[float]:
+        return self._value(self.weights, position_id)
+
+
+def value_portfolios(portfolios: Iterable, snapshot: Optional[LatestPriceSnapshot] = None) -> Dict[int, PortfolioValuation]:
+    """
+    Value several portfolios with a single price query. Prefetch their
+    positions to avoid one positions query per portfolio.
+    """
+    portfolios = list(portfolios)
+    positions = {portfolio.id: list(portfolio.positions.all()) for portfolio in portfolios}
+    if snapshot is None:
+        snapshot = LatestPriceSnapshot.load(
+            position.security_id for portfolio_positions in positions.values() for position in portfolio_positions
+        )
+    return {
+        portfolio_id: PortfolioValuation(portfolio_positions, snapshot)
+        for portfolio_id, portfolio_positions in positions.items()
+    }
@@ -8,6 +8,7 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 import json
+import math
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
 from rest_framework import viewsets
@@ -19,6 +20,11 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
 from django.core.exceptions import ValidationError
+from .utils.analytics import portfolio_analytics
+from .utils.backtest import REBALANCING_FREQUENCIES, backtest_portfolio, current_weights, parse_target_weights
+from .utils.optimizer import propose_rebalance
+from .utils.valuation import value_portfolios
+from fin_data_cl.utils.trading_calendar import CHART_TIMEFRAME_DAYS
 
 class PortfolioManagementView(LoginRequiredMixin, TemplateView):
     template_name = 'portfolios/management.html'
@@ -111,7 +117,10 @@ class PortfolioViewSet(viewsets.ModelViewSet):
     #permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Portfolio.objects.filter(user=self.request.user).order_by('id')
+        # Positions are shared by the valuation and the nested serializer
+        return Portfolio.objects.filter(user=self.request.user).prefetch_related(
+            'positions__security__exchange'
+        ).order_by('id')
 
     @action(detail=True, methods=['post'])
     def add_position(self, request, pk=None):
@@ -137,4 +146,123 @@ class PortfolioViewSet(viewsets.ModelViewSet):
         position.average_price = request.data.get('average_price', position.average_price)
         position.save()
 
-        return Response(PositionSerializer(position).data)
\ No newline at end of file
+        return Response(PositionSerializer(position).data)
+
+    @action(detail=True, methods=['get'])
+    def valuation(self, request, pk=None):
+        """Current value, cost and weight of every position"""
+        portfolio = self.get_object()
+        valuation = value_portfolios([portfolio])[portfolio.id]
+        positions = [{
+            'id': position.id,
+            'ticker': position.security.ticker,
+            'shares': float(position.shares),
+            'price': valuation.current_price(position.id),
+            'current_value': valuation.current_value(position.id),
+            'weight': valuation.weight(position.id),
+        } for position in portfolio.positions.all()]
+
+        return Response({
+            'total_value': valuation.total_value,
+            'total_cost': valuation.total_cost,
+            'positions': positions,
+        })
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Daily values stored by the snapshot job"""
+        portfolio = self.get_object()
+        snapshots = portfolio.snapshots.order_by('date').values_list('date', 'total_value', 'performance_metrics')
+        return Response([{
+            'date': day,
+            'total_value': float(total_value),
+            'daily_return': metrics.get('daily_return'),
+            'unrealized_return': metrics.get('unrealized_return'),
+        } for day, total_value, metrics in snapshots])
+
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None):
+        """Realized return, volatility, drawdown, Sharpe ratio and beta of the current holdings"""
+        portfolio = self.get_object()
+        timeframe = request.query_params.get('timeframe', '1Y')
+        if timeframe not in CHART_TIMEFRAME_DAYS:
+            return Response(
+                {'error': f"Invalid timeframe, use one of {', '.join(CHART_TIMEFRAME_DAYS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        exchange_id = request.query_params.get('exchange')
+        if exchange_id and not exchange_id.isdigit():
+            return Response(
+                {'error': 'exchange must be an exchange id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        analytics = portfolio_analytics(
+            portfolio, CHART_TIMEFRAME_DAYS[timeframe], int(exchange_id) if exchange_id else None
+        )
+        return Response({'timeframe': timeframe, **analytics})
+
+    @action(detail=True, methods=['get'])
+    def backtest(self, request, pk=None):
+        """
+        Backtest target weights (the current ones by default) rebalanced at
+        the portfolio's frequency, with optional trading costs in bps.
+        """
+        portfolio = self.get_object()
+        params = request.query_params
+        timeframe = params.get('timeframe', '5Y')
+        frequency = params.get('frequency', portfolio.rebalancing_frequency)
+        if timeframe not in CHART_TIMEFRAME_DAYS:
+            return Response(
+                {'error': f"Invalid timeframe, use one of {', '.join(CHART_TIMEFRAME_DAYS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if frequency not in REBALANCING_FREQUENCIES:
+            return Response(
+                {'error': f"Invalid frequency, use one of {', '.join(REBALANCING_FREQUENCIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            cost_bps = float(params.get('cost_bps', 0))
+            if not math.isfinite(cost_bps) or cost_bps < 0:
+                raise ValueError("cost_bps must be a non-negative number")
+            if params.get('weights'):
+                weights = parse_target_weights(params['weights'], portfolio.positions.all())
+            else:
+                weights = current_weights(portfolio)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = backtest_portfolio(
+            weights, CHART_TIMEFRAME_DAYS[timeframe], frequency, cost_bps,
+            reinvest_dividends=params.get('reinvest', 'true').lower() != 'false'
+        )
+        return Response({'timeframe': timeframe, 'frequency': frequency, 'cost_bps': cost_bps, **result})
+
+    @action(detail=True, methods=['post'])
+    def optimize(self, request, pk=None):
+        """
+        Propose mean-variance weights for the holdings meeting the portfolio's
+        target risk (or target return), stored in its rebalance history.
+        """
+        portfolio = self.get_object()
+        timeframe = request.data.get('timeframe', '1Y')
+        if timeframe not in CHART_TIMEFRAME_DAYS:
+            return Response(
+                {'error': f"Invalid timeframe, use one of {', '.join(CHART_TIMEFRAME_DAYS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            proposal = propose_rebalance(portfolio, current_weights(portfolio), CHART_TIMEFRAME_DAYS[timeframe])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'id': proposal.id,
+            'date': proposal.date,
+            'old_weights': proposal.old_weights,
+            'new_weights': proposal.new_weights,
+            'rebalance_type': proposal.rebalance_type,
+            'notes': proposal.notes,
+        }, status=status.HTTP_201_CREATED)
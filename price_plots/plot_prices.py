@@ -1,12 +1,31 @@
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
+import plotly.io as pio
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import List, Optional
 from django.db.models import QuerySet
+import logging
 import numpy as np
 from fin_data_cl.models import PriceData, DividendData, Security
 
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = ['date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume']
+
+
+def moving_average(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    Simple moving average from a cumulative sum, NaN until `period` values
+    are available (same output as pandas rolling(period).mean()).
+    """
+    result = np.full(len(values), np.nan)
+    if period <= 0 or period > len(values):
+        return result
+    cumsum = np.cumsum(np.insert(values.astype(float), 0, 0.0))
+    result[period - 1:] = (cumsum[period:] - cumsum[:-period]) / period
+    return result
+
 
 class StockVisualizer:
     def __init__(self, security: Security):
@@ -28,53 +47,50 @@ class StockVisualizer:
             if not start_date:
                 start_date = end_date - timedelta(days=180)
 
-            # Load price data
-            price_queryset = PriceData.objects.filter(
+            # Load price data in a single query
+            price_rows = list(PriceData.objects.filter(
                 security=self.security,
                 date__range=(start_date, end_date)
-            ).order_by('date')
+            ).order_by('date').values_list(*PRICE_COLUMNS))
 
-            if not price_queryset.exists():
+            if not price_rows:
                 self.errors.append(f"No price data found for security {self.security.full_symbol} in the specified date range")
                 return False
 
-            # Convert queryset to DataFrame
-            self.price_data = pd.DataFrame.from_records(
-                price_queryset.values('date', 'open_price', 'high_price',
-                                      'low_price', 'close_price', 'volume')
-            )
+            self.price_data = pd.DataFrame.from_records(price_rows, columns=PRICE_COLUMNS)
+            price_columns = ['open_price', 'high_price', 'low_price', 'close_price']
+            self.price_data[price_columns] = self.price_data[price_columns].astype(float)
+            self.price_data['volume'] = self.price_data['volume'].astype(float)
 
             # Clean the price data
-            self.price_data = self.price_data.replace([None], np.nan)
-            required_columns = ['open_price', 'high_price', 'low_price', 'close_price']
-            missing_data = self.price_data[required_columns].isnull().any()
+            missing_data = self.price_data[price_columns].isnull().any()
 
             if missing_data.any():
                 missing_cols = missing_data[missing_data].index.tolist()
                 self.errors.append(f"Missing values found in columns: {', '.join(missing_cols)}")
-                self.price_data = self.price_data.fillna(method='ffill').fillna(method='bfill')
+                self.price_data[price_columns] = self.price_data[price_columns].ffill().bfill()
 
             # Validate price relationships
-            invalid_highs = self.price_data[self.price_data['high_price'] < self.price_data['low_price']]
-            if not invalid_highs.empty:
-                self.errors.append(f"Found {len(invalid_highs)} records where high price is less than low price")
-                self.price_data.loc[invalid_highs.index, ['high_price', 'low_price']] = \
-                    self.price_data.loc[invalid_highs.index, ['low_price', 'high_price']].values
+            high = self.price_data['high_price'].to_numpy()
+            low = self.price_data['low_price'].to_numpy()
+            invalid_highs = high < low
+            if invalid_highs.any():
+                self.errors.append(f"Found {int(invalid_highs.sum())} records where high price is less than low price")
+                self.price_data['high_price'] = np.where(invalid_highs, low, high)
+                self.price_data['low_price'] = np.where(invalid_highs, high, low)
 
             # Load dividend data
-            dividend_queryset = DividendData.objects.filter(
+            dividend_rows = list(DividendData.objects.filter(
                 security=self.security,
                 date__range=(start_date, end_date)
-            ).order_by('date')
+            ).order_by('date').values_list('date', 'amount', 'dividend_type'))
 
-            if dividend_queryset.exists():
+            if dividend_rows:
                 self.dividend_data = pd.DataFrame.from_records(
-                    dividend_queryset.values('date', 'amount', 'dividend_type')
+                    dividend_rows, columns=['date', 'amount', 'dividend_type']
                 )
-                if self.dividend_data.empty:
-                    self.errors.append("Dividend data exists but could not be loaded into the DataFrame.")
-                else:
-                    print(self.dividend_data)  # Debugging: check the content of the DataFrame
+                self.dividend_data['amount'] = self.dividend_data['amount'].astype(float)
+                logger.debug(f"Loaded {len(self.dividend_data)} dividends for {self.security.ticker}")
 
             return True
 
@@ -85,10 +101,12 @@ class StockVisualizer:
     def create_candlestick_figure(self,
                                   show_volume: bool = True,
                                   height: int = 800,
-                                  title: Optional[str] = None) -> Optional[go.Figure]:
+                                  title: Optional[str] = None,
+                                  as_html: bool = True) -> Optional[go.Figure]:
         """
         Create interactive candlestick chart with optional volume subplot.
         Include dividends as markers with their own y-axis.
+        Returns an HTML fragment, or the figure itself when as_html is False.
         Returns None if data is not available or invalid.
         """
         if self.price_data is None or self.price_data.empty:
@@ -97,7 +115,7 @@ class StockVisualizer:
 
         try:
             # Ensure dates are sorted for proper plotting
-            self.price_data.sort_values('date', inplace=True)
+            self.price_data.sort_values('date', inplace=True, ignore_index=True)
 
             # Create figure with secondary y-axis for volume and dividends
             fig = make_subplots(
@@ -125,8 +143,10 @@ class StockVisualizer:
             # Add volume bars if enabled
             if show_volume and 'volume' in self.price_data.columns:
                 volume_data = self.price_data['volume'].fillna(0)
-                colors = ['red' if close < open else 'green'
-                          for close, open in zip(self.price_data['close_price'], self.price_data['open_price'])]
+                colors = np.where(
+                    self.price_data['close_price'].to_numpy() < self.price_data['open_price'].to_numpy(),
+                    'red', 'green'
+                )
 
                 fig.add_trace(
                     go.Bar(
@@ -170,7 +190,7 @@ class StockVisualizer:
             )
 
             self.figure = fig
-            return fig.to_html(full_html=False)  # Convert to HTML
+            return fig.to_html(full_html=False) if as_html else fig
 
         except Exception as e:
             self.errors.append(f"Error creating chart: {str(e)}")
@@ -192,7 +212,7 @@ class StockVisualizer:
                     self.errors.append(f"Not enough data for {period}-day MA")
                     continue
 
-                ma = self.price_data['close_price'].rolling(window=period).mean()
+                ma = moving_average(self.price_data['close_price'].to_numpy(), period)
 
                 self.figure.add_trace(
                     go.Scatter(
@@ -209,6 +229,21 @@ class StockVisualizer:
             self.errors.append(f"Error adding moving averages: {str(e)}")
             return False
 
+    def to_json(self,
+                show_volume: bool = True,
+                ma_periods: Optional[List[int]] = None,
+                height: int = 800) -> Optional[str]:
+        """
+        Lean rendering mode: figure JSON (data and layout only) for the
+        client-side Plotly, instead of an HTML fragment embedding plotly.js.
+        Returns None if the figure could not be built.
+        """
+        if self.create_candlestick_figure(show_volume=show_volume, height=height, as_html=False) is None:
+            return None
+        if ma_periods and not self.add_ma_overlay(ma_periods):
+            return None
+        return pio.to_json(self.figure, validate=False, remove_uids=True)
+
     def get_errors(self) -> List[str]:
         """Return list of accumulated errors."""
         return self.errors
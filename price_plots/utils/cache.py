@@ -1,5 +1,7 @@
 from django.core.cache import cache
 from django.conf import settings
+from fin_data_cl.utils.trading_calendar import PRICE_DATA_VERSION
+from finriv.utils.cache import get_or_compute, get_version
 
 def get_analysis_cache_key(security_id, timerange):
     return f'stock_analysis:{security_id}:{timerange}'
@@ -11,3 +13,13 @@ def cache_analysis_data(security_id, timerange, data):
 def get_cached_analysis_data(security_id, timerange):
     cache_key = get_analysis_cache_key(security_id, timerange)
     return cache.get(cache_key)
+
+def get_figure_cache_key(security_id, timerange, ma_periods, show_volume):
+    overlays = '-'.join(str(period) for period in sorted(set(ma_periods))) or 'none'
+    version = get_version(PRICE_DATA_VERSION)
+    return f'stock_figure:{security_id}:{timerange}:{overlays}:{int(show_volume)}:{version}'
+
+def get_or_render_figure(security_id, timerange, ma_periods, show_volume, render):
+    """Rendered figure JSON, shared across workers until the next price ingest."""
+    cache_key = get_figure_cache_key(security_id, timerange, ma_periods, show_volume)
+    return get_or_compute(cache_key, render, settings.ANALYSIS_CACHE_TIMEOUT)
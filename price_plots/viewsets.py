@@ -11,6 +11,7 @@ import logging
 from fin_data_cl.models import Security, PriceData
 from fin_data_cl.serializers import PriceDataSerializer
 from fin_data_cl.viewsets import BaseFinancialViewSet
+from fin_data_cl.utils.trading_calendar import get_trading_calendar
 from datetime import datetime
 logger = logging.getLogger(__name__)
 
@@ -24,6 +25,7 @@ class EnhancedPriceDataViewSet(BaseFinancialViewSet):
     serializer_class = PriceDataSerializer
     supports_time_range = True
     supports_latest = True
+    uses_trading_calendar = True
     queryset = PriceData.objects.all()
 
     def _calculate_technical_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -92,8 +94,10 @@ class EnhancedPriceDataViewSet(BaseFinancialViewSet):
             security = Security.objects.get(ticker=ticker)
             queryset = self.get_queryset().filter(security=security)
 
-            # Calculate date range
-            end_date = queryset.order_by('-date').values('date').first()['date']
+            # Calculate date range, ending at the exchange's latest session
+            end_date = get_trading_calendar(security.exchange.code).latest_session()
+            if end_date is None or not queryset.filter(date=end_date).exists():
+                end_date = queryset.order_by('-date').values('date').first()['date']
             start_date = self._get_start_date(end_date, timeframe)
 
             # Filter and order data
@@ -0,0 +1,101 @@
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.utils import trading_calendar
+from portfolios.models import Portfolio, Position
+from portfolios.utils.backtest import rebalance_mask, run_backtest
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+DATES = np.array(['2024-01-02', '2024-01-03', '2024-02-01', '2024-02-02'], dtype='datetime64[D]')
+CLOSES = np.array([[10.0, 20.0], [11.0, 20.0], [12.0, 22.0], [12.0, 24.0]])
+DIVIDENDS = np.array([[0.0, 0.0], [0.0, 0.0], [0.0, 0.0], [1.0, 0.0]])
+
+
+class BacktestTests(SimpleTestCase):
+
+    def test_rebalance_mask(self):
+        np.testing.assert_array_equal(rebalance_mask(DATES, 'monthly'), [True, False, True, False])
+        np.testing.assert_array_equal(rebalance_mask(DATES, 'yearly'), [True, False, False, False])
+        with self.assertRaises(ValueError):
+            rebalance_mask(DATES, 'hourly')
+
+    def test_buy_and_hold_with_dividends(self):
+        reinvested = run_backtest(DATES, CLOSES, DIVIDENDS, np.array([0.5, 0.5]), 'yearly')
+        np.testing.assert_allclose(reinvested['nav'], [1.0, 1.05, 1.15, 1.25])
+
+        # The dividend is held as cash instead, worth the same on the day it is paid
+        in_cash = run_backtest(DATES, CLOSES, DIVIDENDS, np.array([0.5, 0.5]), 'yearly', reinvest_dividends=False)
+        np.testing.assert_allclose(in_cash['nav'], reinvested['nav'])
+
+    def test_transaction_costs(self):
+        result = run_backtest(DATES, CLOSES, DIVIDENDS, np.array([0.5, 0.5]), 'monthly', cost_bps=100)
+
+        # Buying in costs 1%, the February rebalance trades 0.6 - 1.15 / 2 twice
+        np.testing.assert_allclose(result['turnover'], [1.0, 0.05 / 1.15])
+        self.assertAlmostEqual(result['nav'][2], 0.99 * 1.15)
+        self.assertAlmostEqual(result['costs'], 0.01 + 0.99 * 1.15 * 0.01 * 0.05 / 1.15)
+
+    def test_fifty_securities_over_ten_years(self):
+        # Timing is reported by `manage.py benchmark_backtest`, not asserted here
+        sessions, securities = 2520, 50
+        rng = np.random.default_rng(0)
+        dates = np.datetime64('2014-01-01') + np.arange(sessions)
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (sessions, securities)), axis=0))
+        closes[rng.random(closes.shape) < 0.1] = np.nan
+        dividends = np.zeros_like(closes)
+        dividends[::63] = 0.5
+        weights = np.full(securities, 1 / securities)
+
+        result = run_backtest(dates, closes, dividends, weights, 'daily', cost_bps=10, reinvest_dividends=False)
+
+        self.assertEqual(len(result['nav']), sessions)
+        self.assertTrue(np.isfinite(result['nav']).all())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BacktestEndpointTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.user = User.objects.create_user('investor', 'investor@example.com')
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='Growth', rebalancing_frequency='weekly')
+        for ticker, step in [('AAA', 1), ('BBB', -1)]:
+            security = Security.objects.create(ticker=ticker, exchange=exchange, name=ticker)
+            for day in range(20):
+                PriceData.objects.create(
+                    security=security, date=date(2024, 1, 1) + timedelta(days=day), close_price=Decimal(100 + step * day)
+                )
+            Position.objects.create(portfolio=cls.portfolio, security=security, shares=10, average_price=Decimal(100))
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+        self.client.force_login(self.user)
+
+    def test_backtest_of_current_weights(self):
+        url = f'/portfolios/api/portfolios/{self.portfolio.id}/backtest/'
+        data = self.client.get(url, {'timeframe': '1M', 'cost_bps': 5}).json()
+
+        self.assertEqual(data['frequency'], 'weekly')
+        self.assertEqual(len(data['nav']), 20)
+        self.assertEqual(len(data['rebalance_dates']), 3)
+        self.assertGreater(data['costs'], 0)
+
+        only_aaa = self.client.get(url, {'timeframe': '1M', 'weights': 'AAA:1'}).json()
+        self.assertAlmostEqual(only_aaa['nav'][-1], 1.19)
+        self.assertEqual(self.client.get(url, {'weights': 'ZZZ:1'}).status_code, 400)
+        for weights in ('AAA:nan', 'AAA:inf,BBB:1'):
+            self.assertEqual(self.client.get(url, {'weights': weights}).status_code, 400)
+        for cost_bps in ('-5', 'nan', 'inf'):
+            self.assertEqual(self.client.get(url, {'cost_bps': cost_bps}).status_code, 400)
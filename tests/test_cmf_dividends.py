@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time
+from decimal import Decimal
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+from django.test import TestCase
+
+from fin_data_cl.models import Exchange, Security, DividendData
+from finriv.utils.cmf_dividends import (
+    DIVIDEND_COLUMNS, DividendJob, DividendSink, build_jobs, last_dividend_dates, select_dividends
+)
+
+
+def cmf_sheet(rows):
+    """Sheet shaped like the CMF dividend statistics, the amount per share in column 12."""
+    return pd.DataFrame(
+        [[None] * 3 + [fecha, serie, tipo] + [None] * 6 + [amount, rate] for fecha, serie, tipo, amount, rate in rows],
+        columns=['c0', 'c1', 'c2', 'Fecha', 'Serieafecta', 'Tipodedividendo(1)'] + [f'c{i}' for i in range(6, 12)]
+        + ['Monto', 'Tasadecambio']
+    )
+
+
+class CmfDividendsTests(TestCase):
+    """Dividend jobs, delta starts and the incremental CSV sink."""
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        andina = Security.objects.create(ticker='ANDINA-B', exchange=exchange, name='Andina B')
+        Security.objects.create(ticker='CAP', exchange=exchange, name='CAP')
+        for day in [date(2023, 5, 2), date(2024, 5, 3)]:
+            DividendData.objects.create(security=andina, date=day, amount=Decimal(30), dividend_type=1)
+
+    def test_delta_jobs_start_after_the_last_stored_dividend(self):
+        companies = pd.DataFrame({
+            'Ticker': ['ANDINA-B', 'CAP', 'BROKEN'],
+            'RUT': ['91144000-8', '91297000-0', 'ERROR'],
+        })
+        last_dates = last_dividend_dates(companies['Ticker'])
+        self.assertEqual(last_dates, {'ANDINA-B': date(2024, 5, 3)})
+
+        andina, cap = build_jobs(companies, 2013, 2024, last_dates)
+        self.assertEqual((andina.series, andina.since), ('B', date(2024, 5, 3)))
+        self.assertIn('sociedad%5B%5D=91144000&tipodiv=0&mes=5&anno=2024&mes2=0&anno2=2024', andina.url)
+        self.assertEqual((cap.series, cap.since), ('U', None))
+        self.assertIn('mes=0&anno=2013&', cap.url)
+
+    def test_select_dividends(self):
+        sheet = cmf_sheet([
+            ('2024-05-03', 'B', 1, 30.0, 1.0),  # Already stored
+            ('2024-05-20', 'A', 1, 25.0, 1.0),  # Other series
+            ('2024-06-10', 'U', 2, 0.5, 900.0),  # Paid in dollars
+            ('2024-07-01', 'B', 4, 1.0, 1.0),  # Type not selected
+            ('2024-08-15', 'B', 1, 12.0, 1.0),
+        ])
+        dividends = select_dividends(sheet, DividendJob('ANDINA-B', 'B', '', date(2024, 5, 3)), [1, 2, 3])
+
+        self.assertEqual(list(dividends.columns), DIVIDEND_COLUMNS)
+        self.assertEqual(dividends['Date'].dt.date.tolist(), [date(2024, 6, 10), date(2024, 8, 15)])
+        self.assertEqual(dividends['Dividend'].tolist(), [450.0, 12.0])
+        self.assertEqual(set(dividends['Ticker']), {'ANDINA-B'})
+
+    def test_sink_appends_results_as_they_arrive(self):
+        with TemporaryDirectory() as folder:
+            path = Path(folder) / 'Dividends' / 'Dividends_delta.csv'
+            path.parent.mkdir()
+            path.write_text('stale contents of a previous run\n')
+            sink = DividendSink(path)
+            frames = [
+                pd.DataFrame({'Date': [f'2024-0{i}-01'], 'Dividend': [float(i)], 'Ticker': [f'T{i}'],
+                              'Series': ['U'], 'DividendType': [1]})
+                for i in range(1, 10)
+            ]
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(sink.append, frames + [pd.DataFrame(columns=DIVIDEND_COLUMNS)]))
+
+            written = pd.read_csv(path)
+            self.assertEqual(sink.rows, 9)
+            self.assertEqual(list(written.columns), DIVIDEND_COLUMNS)
+            self.assertEqual(sorted(written['Ticker']), [f'T{i}' for i in range(1, 10)])
@@ -0,0 +1,145 @@
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from finriv.utils.cmf_parsing import (
+    build_rut_index, extract_hrefs, match_company_links, parse_issuer_list, rut_number
+)
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+BASE_URL = 'https://www.cmfchile.cl/institucional/mercados/'
+
+
+def company_link(rut: int, row: int) -> str:
+    return (
+        f'entidad.php?mercado=V&amp;rut={rut}&amp;grupo=&amp;tipoentidad=RVEMI'
+        f'&amp;row=AAAwy2ACTAAAB{row:05d}&amp;vig=VI&amp;control=svs&amp;pestania=3'
+    )
+
+
+def novedades_page(ruts) -> str:
+    """Page shaped like the CMF IFRS filings list: navigation links and one row per issuer."""
+    navigation = ''.join(f'<li><a href="/portal/seccion_{i}.html">Sección {i}</a></li>' for i in range(80))
+    rows = ''.join(
+        f'<tr><td><a href=\'{company_link(rut, row)}\'>Emisor {row}</a></td><td>{rut}-K</td></tr>'
+        for row, rut in enumerate(ruts)
+    )
+    return f'<html><body><ul>{navigation}</ul><table>{rows}</table></body></html>'
+
+
+def naive_match(hrefs, ruts):
+    """Previous matching: test every company against every link."""
+    out = ['Not Found'] * len(ruts)
+    for href in hrefs:
+        for position, rut in enumerate(ruts):
+            number = str(rut).split('-')[0].replace('.', '')
+            if number in href:
+                out[position] = f'{BASE_URL}{href}'
+    return out
+
+
+class CmfParsingTests(SimpleTestCase):
+
+    def test_rut_number(self):
+        self.assertEqual(rut_number('90.227.000-0'), '90227000')
+        self.assertEqual(rut_number('96505760-K'), '96505760')
+        self.assertIsNone(rut_number('ERROR'))
+
+    def test_extract_hrefs_unescapes(self):
+        hrefs = extract_hrefs(novedades_page([96505760]).encode('utf-8'))
+        self.assertEqual(len(hrefs), 81)
+        self.assertIn('entidad.php?mercado=V&rut=96505760&grupo=', hrefs[-1])
+
+    def test_series_share_a_link(self):
+        ruts = ['96505760-K', '90227000-0', '96505760-K', 'ERROR', '11111111-1']
+        hrefs = extract_hrefs(novedades_page([90227000, 96505760]))
+        links = match_company_links(hrefs, ruts, BASE_URL)
+
+        self.assertEqual(build_rut_index(ruts)['96505760'], [0, 2])
+        self.assertEqual(links[0], links[2])
+        self.assertTrue(links[0].startswith(f'{BASE_URL}entidad.php?mercado=V&rut=96505760'))
+        self.assertIn('rut=90227000', links[1])
+        self.assertEqual(links[3:], ['Not Found', 'Not Found'])
+
+    def test_no_partial_rut_matches(self):
+        # A RUT inside a longer digit run is not the company's link
+        links = match_company_links(['entidad.php?rut=1965057600'], ['96505760-K'])
+        self.assertEqual(links, ['Not Found'])
+
+    def test_matches_naive_matching(self):
+        ruts = [f'{76000000 + 7919 * i}-{i % 10}' for i in range(300)]
+        hrefs = extract_hrefs(novedades_page(76000000 + 7919 * i for i in range(0, 300, 2)))
+        links = match_company_links(hrefs, ruts, BASE_URL)
+
+        self.assertEqual(links, naive_match(hrefs, ruts))
+        self.assertEqual(sum(link != 'Not Found' for link in links), 150)
+
+    def test_every_listed_company_is_matched(self):
+        # Timing is reported by `manage.py benchmark_scraping`, not asserted here
+        ruts = [f'{76000000 + 7919 * i}-{i % 10}' for i in range(300)]
+        hrefs = extract_hrefs(novedades_page(76000000 + 7919 * i for i in range(300)))
+        links = match_company_links(hrefs, ruts, BASE_URL)
+
+        self.assertNotIn('Not Found', links)
+        self.assertEqual(links, naive_match(hrefs, ruts))
+
+
+class IssuerListTests(SimpleTestCase):
+    """Issuer list of the Bolsa de Santiago, from the text pdfminer extracts."""
+
+    def test_fixture(self):
+        text = (FIXTURES / 'nomina_emisores.txt').read_text(encoding='utf-8')
+        # pdfminer separates pages with form feeds
+        self.assertEqual(text.count('\f'), 2)
+        issuers = parse_issuer_list(text)
+
+        self.assertEqual(len(issuers), 17)
+        self.assertEqual(issuers[0], {
+            'Ticker': 'AAISA', 'RUT': '96515580-5', 'Name': 'ADMINISTRADORA AMERICANA DE INVERSIONES S.A.'
+        })
+        by_ticker = {issuer['Ticker']: issuer for issuer in issuers}
+        # Entries spread over several lines
+        self.assertEqual(by_ticker['BCI']['Name'], 'BANCO DE CRÉDITO E INVERSIONES')
+        # Series B listed with series A
+        self.assertEqual(by_ticker['ANDINA-B'], {**by_ticker['ANDINA-A'], 'Ticker': 'ANDINA-B'})
+        self.assertEqual(by_ticker['ANDINA-A']['Name'], 'EMBOTELLADORA ANDINA S.A.')
+        # Two digit counters, RUTs without dots or with a lowercase verifier
+        self.assertEqual(by_ticker['CONCHATORO']['RUT'], '90227000-0')
+        self.assertEqual(by_ticker['COPEC']['RUT'], '90690000-9')
+        self.assertEqual(by_ticker['FALABELLA']['RUT'], '90749000-K')
+        # Entries after a page header
+        self.assertEqual(by_ticker['ECL']['Name'], 'ENGIE ENERGÍA CHILE S.A.')
+        self.assertEqual(issuers[-1]['Ticker'], 'VAPORES')
+
+    def test_entry_split_across_pages(self):
+        text = (
+            'NOMINA EMISORES\n1 AAA FIRST S.A. 0001 90.000.000-1\n2 BBB SECOND\nPagina 1 de 2\n\f'
+            'NOMINA EMISORES\nCOMPANY S.A. 0002 91.000.000-2\n3 CCC THIRD S.A. 0003 92.000.000-3\n\f'
+        )
+        issuers = parse_issuer_list(text)
+
+        self.assertEqual([issuer['Ticker'] for issuer in issuers], ['AAA', 'BBB', 'CCC'])
+        self.assertEqual(issuers[1], {'Ticker': 'BBB', 'RUT': '91000000-2', 'Name': 'SECOND COMPANY S.A.'})
+
+    def test_entry_without_rut_is_logged(self):
+        with self.assertLogs('finriv.utils.cmf_parsing', level='WARNING') as logs:
+            issuers = parse_issuer_list('HEADER\n1 AAA FIRST S.A. 0001 90.000.000-1\n2 BBB SECOND\f\nHEADER\n')
+
+        self.assertEqual([issuer['Ticker'] for issuer in issuers], ['AAA'])
+        self.assertIn('2 BBB SECOND', logs.output[0])
+
+    def test_long_list(self):
+        # Timing is reported by `manage.py benchmark_scraping`, not asserted here
+        lines = []
+        for page in range(60):
+            lines.append('BOLSA DE SANTIAGO\nNÓMINA EMISORES DE ACCIONES\n')
+            for row in range(50):
+                number = page * 50 + row + 1
+                lines.append(f'{number} TICK{number} EMPRESA NUMERO {number} S.A.\n{number:04d} {76000000 + number}-5')
+            lines.append(f'Página {page + 1} de 60\n\f')
+        text = '\n'.join(lines)
+
+        issuers = parse_issuer_list(text)
+
+        self.assertEqual(len(issuers), 3000)
+        self.assertEqual(issuers[-1], {'Ticker': 'TICK3000', 'RUT': '76003000-5', 'Name': 'EMPRESA NUMERO 3000 S.A.'})
@@ -0,0 +1,75 @@
+from datetime import date, time
+from decimal import Decimal
+
+from django.test import SimpleTestCase, TestCase
+
+from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.utils.series_alignment import align_series
+
+
+class AlignSeriesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.rows = [
+            ('AAA', date(2024, 5, 2), Decimal('10')),
+            ('AAA', date(2024, 5, 3), Decimal('12')),
+            ('BBB', date(2024, 5, 3), Decimal('50')),
+            ('BBB', date(2024, 5, 6), Decimal('40')),
+        ]
+
+    def test_series_share_the_date_index(self):
+        aligned = align_series(self.rows, ['close_price'])
+
+        self.assertEqual(aligned['dates'], ['2024-05-02', '2024-05-03', '2024-05-06'])
+        self.assertEqual(aligned['tickers'], ['AAA', 'BBB'])
+        self.assertEqual(aligned['series']['close_price'], {
+            'AAA': [10.0, 12.0, None],
+            'BBB': [None, 50.0, 40.0],
+        })
+
+    def test_rebase_and_zscore(self):
+        rebased = align_series(self.rows, ['close_price'], normalize='rebase')['series']['close_price']
+        self.assertEqual(rebased, {'AAA': [100.0, 120.0, None], 'BBB': [None, 100.0, 80.0]})
+
+        scores = align_series(self.rows, ['close_price'], normalize='zscore')['series']['close_price']
+        self.assertEqual(scores['AAA'], [-1.0, 1.0, None])
+
+    def test_unknown_normalization(self):
+        with self.assertRaises(ValueError):
+            align_series(self.rows, ['close_price'], normalize='log')
+
+
+class CompareEndpointTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        for ticker, closes in {'AAA': ('10', '11'), 'BBB': ('20', '18')}.items():
+            security = Security.objects.create(ticker=ticker, exchange=exchange, name=ticker)
+            for day, close in zip((date(2024, 5, 2), date(2024, 5, 3)), closes):
+                PriceData.objects.create(security=security, date=day, close_price=Decimal(close))
+
+    def test_single_query_for_all_securities(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/price-data/compare/?tickers=AAA,BBB&normalize=rebase')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['series']['close_price'], {
+            'AAA': [100.0, 110.0],
+            'BBB': [100.0, 90.0],
+        })
+
+    def test_rejects_non_numeric_metrics(self):
+        response = self.client.get('/api/v1/price-data/compare/?tickers=AAA&metrics=security_id')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_malformed_dates(self):
+        response = self.client.get('/api/v1/price-data/compare/?tickers=AAA&start_date=garbage')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+        response = self.client.get('/api/v1/price-data/compare/?tickers=AAA&start_date=2024-05-03&end_date=2024-05-03')
+        self.assertEqual(response.json()['dates'], ['2024-05-03'])
@@ -0,0 +1,111 @@
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.utils import correlation, trading_calendar
+from fin_data_cl.utils.correlation import CorrelationState, get_correlation_state, pairwise_correlation
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class PairwiseCorrelationTests(SimpleTestCase):
+
+    def test_matches_pandas_pairwise_complete(self):
+        rng = np.random.default_rng(3)
+        returns = rng.normal(size=(200, 6))
+        returns[:, 1] += returns[:, 0]
+        returns[rng.random(returns.shape) < 0.3] = np.nan
+
+        expected = pd.DataFrame(returns).corr(min_periods=20).to_numpy()
+        np.testing.assert_allclose(pairwise_correlation(returns, min_overlap=20), expected, atol=1e-10)
+
+    def test_sparse_pairs_are_left_out(self):
+        returns = np.array([[0.01, np.nan], [0.02, 0.01], [-0.01, np.nan], [0.0, -0.02]])
+        correlation = pairwise_correlation(returns, min_overlap=3)
+        self.assertEqual(correlation[0, 0], 1.0)
+        self.assertTrue(np.isnan(correlation[0, 1]))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CorrelationStateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.securities = [
+            Security.objects.create(ticker=ticker, exchange=cls.exchange, name=ticker) for ticker in ('AAA', 'BBB', 'CCC')
+        ]
+        cls.rng = np.random.default_rng(4)
+        cls.add_sessions(0, 60)
+
+    @classmethod
+    def add_sessions(cls, first, last):
+        rows = []
+        for column, security in enumerate(cls.securities):
+            for day in range(first, last):
+                # CCC is illiquid and misses every other session
+                if column == 2 and day % 2:
+                    continue
+                close = 100 + 10 * np.sin(day / (3 + column)) + cls.rng.normal()
+                rows.append(PriceData(security=security, date=date(2024, 1, 1) + timedelta(days=day),
+                                      close_price=Decimal(f'{close:.2f}')))
+        PriceData.objects.bulk_create(rows)
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+
+    def test_incremental_refresh_matches_rebuild(self):
+        get_correlation_state(self.exchange.id, 30)
+
+        self.add_sessions(60, 75)
+        trading_calendar.invalidate_trading_calendars()
+        refreshed = get_correlation_state(self.exchange.id, 30)
+        rebuilt = CorrelationState.build(self.exchange.id, 30)
+
+        np.testing.assert_array_equal(refreshed.dates, rebuilt.dates)
+        np.testing.assert_allclose(refreshed.correlation(min_overlap=5)[0], rebuilt.correlation(min_overlap=5)[0])
+
+    def test_lock_held_by_another_worker(self):
+        key = f'correlation_state_{self.exchange.id}_30'
+        built = CorrelationState.build(self.exchange.id, 30)
+        built.version = 0
+        cache.add(f'{key}:lock', 1, 60)
+
+        # Cold cache: wait for the worker holding the lock instead of building as well
+        def other_worker_stores(_):
+            cache.set(key, built)
+
+        with mock.patch.object(correlation.time, 'sleep', side_effect=other_worker_stores), \
+                mock.patch.object(CorrelationState, 'build') as build:
+            waited = get_correlation_state(self.exchange.id, 30)
+            # Stale state: served as is while the other worker refreshes
+            stale = get_correlation_state(self.exchange.id, 30)
+        np.testing.assert_array_equal(waited.dates, built.dates)
+        self.assertEqual((waited.version, stale.version), (0, 0))
+        build.assert_not_called()
+        self.assertIsNotNone(cache.get(f'{key}:lock'))
+
+    def test_endpoint(self):
+        get_correlation_state(self.exchange.id, 30)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/price-data/correlation/?exchange=SCL&timeframe=1M&min_overlap=5')
+        data = response.json()
+
+        self.assertEqual(data['symbols'], ['AAA.SN', 'BBB.SN', 'CCC.SN'])
+        self.assertEqual(data['correlation'][0][0], 1.0)
+        self.assertEqual(data['observations'][2][2], 15)
+        self.assertEqual(data['observations'][0][2], 15)
+
+        response = self.client.get('/api/v1/price-data/correlation/?tickers=AAA,BBB&timeframe=1M')
+        self.assertEqual(len(response.json()['correlation']), 2)
+        self.assertEqual(self.client.get('/api/v1/price-data/correlation/').status_code, 400)
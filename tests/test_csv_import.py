@@ -0,0 +1,64 @@
+from decimal import Decimal
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from fin_data_cl.utils.csv_import import CsvImporter, ImportStats, to_date, to_decimal, to_integer, to_text
+
+
+class CsvImporterTests(SimpleTestCase):
+    """Chunked, typed reading with counted rejects."""
+
+    def setUp(self):
+        folder = TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = Path(folder.name) / 'rows.csv'
+        self.importer = CsvImporter(
+            columns={'Date': to_date(), 'Amount': to_decimal, 'Ticker': to_text, 'Type': to_integer},
+            required=['Date', 'Ticker'],
+            chunk_size=2,
+        )
+
+    def write(self, rows):
+        self.path.write_text('Date,Amount,Ticker,Type,Ignored\n' + ''.join(f'{row}\n' for row in rows))
+
+    def test_converts_and_rejects(self):
+        self.write([
+            '2024-01-02,10.555,CAP ,1.0,x',
+            '2024-01-03,abc,CAP,1.5,x',  # Invalid optional values are left empty
+            '2024-13-01,1,CAP,1,x',
+            '2024-01-04,1,,1,x',
+        ])
+        stats = ImportStats()
+        chunks = list(self.importer.iter_chunks(self.path, stats))
+        rows = pd.concat(chunks)
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 0])
+        self.assertEqual(list(rows.columns), ['Date', 'Amount', 'Ticker', 'Type'])
+        self.assertEqual(rows['Amount'].iloc[0], Decimal('10.555'))
+        self.assertEqual(rows['Ticker'].tolist(), ['CAP', 'CAP'])
+        self.assertTrue(pd.isna(rows['Amount'].iloc[1]) and pd.isna(rows['Type'].iloc[1]))
+        self.assertEqual((stats.rows, stats.rejected, stats.invalid_values), (4, 2, 2))
+        self.assertEqual(stats.rejects, [(4, 'invalid Date'), (5, 'missing Ticker')])
+
+    def test_run_writes_valid_chunks(self):
+        self.write([f'2024-01-{day:02d},{day},T{day % 3},1,x' for day in range(1, 8)])
+        written = []
+
+        def write(chunk):
+            written.append(len(chunk))
+            return len(chunk), 0
+
+        stats = self.importer.run(self.path, write)
+
+        self.assertEqual(written, [2, 2, 2, 1])
+        self.assertEqual((stats.rows, stats.created, stats.updated, stats.rejected), (7, 7, 0, 0))
+        self.assertGreater(stats.rows_per_second, 0)
+        self.assertIn('7 rows in', stats.summary())
+
+    def test_missing_column(self):
+        self.path.write_text('Date,Ticker\n2024-01-02,CAP\n')
+        with self.assertRaisesRegex(ValueError, 'Amount, Type'):
+            list(self.importer.iter_chunks(self.path))
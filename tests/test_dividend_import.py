@@ -0,0 +1,69 @@
+from datetime import date, time
+from decimal import Decimal
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase
+
+from fin_data_cl.models import Exchange, Security, DividendData
+from management_commands.management.commands.get_dividends import DividendImporter
+
+
+class DividendImporterTests(TestCase):
+    """Dividend files loaded with a constant number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.cap = Security.objects.create(ticker='CAP', exchange=cls.exchange, name='CAP')
+        DividendData.objects.create(security=cls.cap, date=date(2023, 5, 10), amount=Decimal(100), dividend_type=1)
+
+    def setUp(self):
+        self.importer = DividendImporter()
+
+    def import_rows(self, rows, chunk_size=2):
+        with TemporaryDirectory() as folder:
+            path = Path(folder) / 'Dividends.csv'
+            path.write_text('Date,Dividend,Ticker,Series,DividendType\n' + ''.join(f'{row}\n' for row in rows))
+            return self.importer.import_file(path, chunk_size=chunk_size)
+
+    def test_bulk_import(self):
+        stats = self.import_rows([
+            '2023-05-10,120.5,CAP,U,1',  # Updates the stored dividend
+            '2024-05-08,80,CAP,U,2',
+            '2024-04-30,15.25,ANDINA-B,B,1.0',  # New security
+            'not a date,1,CAP,U,1',
+            '2024-04-30,16.75,ANDINA-B,B,2',  # Same day in a later chunk, the last one wins
+        ])
+
+        self.assertEqual((stats.rows, stats.rejected, stats.created, stats.updated), (5, 1, 2, 2))
+        self.assertEqual(stats.rejects, [(5, 'invalid Date')])
+        andina = Security.objects.get(ticker='ANDINA-B', exchange=self.exchange)
+        self.assertEqual(andina.name, 'ANDINA-B Security')
+        self.assertEqual(DividendData.objects.get(security=andina).amount, Decimal('16.75'))
+        self.assertEqual(DividendData.objects.get(security=andina).dividend_type, 2)
+        stored = DividendData.objects.get(security=self.cap, date=date(2023, 5, 10))
+        self.assertEqual(stored.amount, Decimal('120.50'))
+        self.assertEqual(DividendData.objects.count(), 3)
+
+    def test_queries_do_not_grow_with_the_file(self):
+        # Small enough for one SQLite insert, which splits batches by its parameter limit
+        tickers = [f'T{i}' for i in range(10)]
+        Security.objects.bulk_create([Security(ticker=ticker, exchange=self.exchange, name=ticker) for ticker in tickers])
+        dividends = [
+            {'ticker': ticker, 'date': date(year, quarter, 15), 'amount': Decimal(f'{year - 2000}.5'), 'dividend_type': 1}
+            for ticker in tickers for year in range(2019, 2024) for quarter in (3, 6, 9)
+        ]
+
+        # Securities, stored dividends, and the insert in a savepoint
+        with self.assertNumQueries(5):
+            created, updated = self.importer.save_dividend_data(dividends)
+        self.assertEqual((created, updated), (150, 0))
+
+        # Securities are resolved once per import
+        with self.assertNumQueries(4):
+            self.assertEqual(self.importer.save_dividend_data(dividends), (0, 150))
+        self.assertEqual(DividendData.objects.filter(security__ticker__startswith='T').count(), 150)
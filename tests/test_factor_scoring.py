@@ -0,0 +1,105 @@
+from datetime import date, time
+from decimal import Decimal
+
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, FinancialRatio
+from fin_data_cl.utils import screener_engine
+from fin_data_cl.utils.factor_scoring import compute_scores, parse_weights, weight_vector
+from fin_data_cl.utils.screener_engine import SCREEN_RATIOS, RatioSnapshot
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_snapshot(values):
+    count = len(values)
+    return RatioSnapshot(
+        ratio_ids=range(count), security_ids=range(count), exchange_ids=[1] * count,
+        tickers=[f'T{i}' for i in range(count)], exchanges=['SCL'] * count,
+        full_symbols=[f'T{i}.SN' for i in range(count)], dates=[date(2024, 3, 31)] * count,
+        prices=[np.nan] * count, values=values,
+    )
+
+
+class FactorMatrixTests(SimpleTestCase):
+
+    def test_outliers_are_winsorized_and_valuation_is_flipped(self):
+        values = np.full((101, len(SCREEN_RATIOS)), np.nan)
+        pe, roe = SCREEN_RATIOS.index('pe_ratio'), SCREEN_RATIOS.index('return_on_equity')
+        values[:, pe] = np.append(np.arange(1.0, 101.0), 100000.0)
+        values[:100, roe] = np.arange(100.0)
+        factors = make_snapshot(values).factors
+
+        self.assertLess(abs(factors[:, pe]).max(), 2)
+        self.assertEqual(np.nanargmax(factors[:, pe]), 0)  # lowest P/E scores best
+        self.assertEqual(np.nanargmax(factors[:, roe]), 99)
+        self.assertTrue(np.isnan(factors[100, roe]))
+
+    def test_non_positive_multiples_are_not_factors(self):
+        values = np.full((4, len(SCREEN_RATIOS)), np.nan)
+        pe, peg = SCREEN_RATIOS.index('pe_ratio'), SCREEN_RATIOS.index('peg_ratio')
+        values[:, pe] = [-5.0, 0.0, 8.0, 20.0]
+        values[:, peg] = 0.0
+        factors = make_snapshot(values).factors
+        weights = weight_vector({'pe_ratio': 1.0})
+        scores, _ = compute_scores(factors, weights)
+
+        # A loss-maker's negative P/E does not rank above a positive one
+        self.assertTrue(np.isnan(scores[:2]).all())
+        self.assertGreater(scores[2], scores[3])
+        self.assertTrue(np.isnan(factors[:, peg]).all())
+
+    def test_scores_reweight_missing_factors(self):
+        factors = np.array([[1.0, np.nan], [1.0, -1.0], [np.nan, np.nan]])
+        scores, coverage = compute_scores(factors, np.array([0.5, 0.5]))
+
+        np.testing.assert_allclose(scores[:2], [1.0, 0.0])
+        np.testing.assert_allclose(coverage, [0.5, 1.0, 0.0])
+        self.assertTrue(np.isnan(scores[2]))
+
+    def test_parse_weights(self):
+        self.assertEqual(parse_weights('pe_ratio:2,dividend_yield'), {'pe_ratio': 2.0, 'dividend_yield': 1.0})
+        for invalid in ('price:1', 'peg_ratio:1', 'pe_ratio:-1', 'pe_ratio:0', 'pe_ratio:x', 'pe_ratio:nan', 'pe_ratio:inf'):
+            with self.assertRaises(ValueError):
+                parse_weights(invalid)
+        self.assertAlmostEqual(weight_vector({'pe_ratio': 3, 'pb_ratio': 1}).sum(), 1.0)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ScoreEndpointTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        for ticker, pe, dividend_yield in [('AAA', '8', '6'), ('BBB', '12', '2'), ('CCC', '30', None)]:
+            security = Security.objects.create(ticker=ticker, exchange=exchange, name=ticker)
+            FinancialRatio.objects.create(
+                security=security, date=date(2024, 3, 31), pe_ratio=Decimal(pe),
+                dividend_yield=dividend_yield and Decimal(dividend_yield)
+            )
+
+    def setUp(self):
+        cache.clear()
+        screener_engine._snapshot = None
+
+    def test_ranked_by_composite_score(self):
+        url = '/api/v1/financial-ratios/score/?weights=pe_ratio:1,dividend_yield:1'
+        results = self.client.get(url).json()['results']
+
+        self.assertEqual([row['ticker'] for row in results], ['AAA', 'BBB', 'CCC'])
+        self.assertEqual([row['rank'] for row in results], [1, 2, 3])
+        self.assertEqual(results[2]['coverage'], 0.5)
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_unknown_preset(self):
+        response = self.client.get('/api/v1/financial-ratios/score/?preset=momentum')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/financial-ratios/score/?exchange_id=abc').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/financial-ratios/score/?limit=0').status_code, 400)
@@ -0,0 +1,137 @@
+from datetime import date, time
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from django.test import TestCase
+
+from fin_data_cl.models import Exchange, Security, FinancialData
+from fin_data_cl.utils.financial_import import import_financial_data, quarterly_table
+
+
+def statements_csv(records):
+    """Database_in_CLP.csv layout: a values row, then a codes row, per ticker and date."""
+    rows = []
+    for ticker, month, values, codes in records:
+        rows.append({'Date': month, 'Ticker': ticker, **values})
+        rows.append({'Date': month, 'Ticker': ticker, **codes})
+    frame = pd.DataFrame(rows)
+    frame.columns = [column.title().replace('_', ' ') for column in frame.columns]
+    return frame
+
+
+def previous_importer(df, metric):
+    """Per-row de-accumulation of the previous process_data, for one metric."""
+    out = {}
+    values = df.iloc[0::2].reset_index(drop=True)
+    codes = df.iloc[1::2].reset_index(drop=True)
+    frame = pd.DataFrame({'ticker': values['ticker'], 'month': values['date'],
+                          'value': values[metric], 'code': codes[metric]})
+    for ticker, rows in frame.sort_values(['ticker', 'month'], kind='stable').groupby('ticker', sort=False):
+        previous = 0.0
+        for row in rows.itertuples():
+            if pd.isna(row.value) or pd.isna(row.code):
+                continue
+            if row.month % 100 // 3 == 1:
+                previous = 0.0
+            value = row.value - previous if row.code in (11, 12) else row.value
+            previous += value
+            out[(ticker, row.month)] = value
+    return out
+
+
+class FinancialImportTests(TestCase):
+    """Vectorized quarterly de-accumulation and the bulk import."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        for ticker in ['AAA', 'BBB']:
+            Security.objects.create(ticker=ticker, exchange=cls.exchange, name=ticker)
+
+    def test_year_to_date_values_become_quarters(self):
+        df = statements_csv([
+            ('AAA', 202303, {'revenue': 100, 'assets': 1000}, {'revenue': 12, 'assets': 10}),
+            ('AAA', 202306, {'revenue': 250, 'assets': 1100}, {'revenue': 12, 'assets': 10}),
+            ('AAA', 202309, {'revenue': 80, 'assets': 1150}, {'revenue': 10, 'assets': 10}),
+            ('AAA', 202312, {'revenue': 500, 'assets': None}, {'revenue': 11, 'assets': 10}),
+            ('AAA', 202403, {'revenue': 120, 'assets': 1300}, {'revenue': 12, 'assets': 10}),
+        ])
+        df.columns = df.columns.str.lower()
+        table = quarterly_table(df, ['revenue', 'assets'])
+
+        self.assertEqual(table['revenue'].tolist(), [100, 150, 80, 170, 120])
+        self.assertEqual(table['assets'].tolist()[:3], [1000, 1100, 1150])
+        self.assertTrue(np.isnan(table.loc[('AAA', pd.Timestamp(2023, 12, 1)), 'assets']))
+
+    def test_matches_previous_importer(self):
+        rng = np.random.default_rng(7)
+        records = []
+        for ticker in ['AAA', 'BBB', 'CCC']:
+            for year in range(2015, 2024):
+                for month in (3, 6, 9, 12):
+                    if rng.random() < 0.1:
+                        continue  # Missing quarters, first ones included
+                    values = {metric: None if rng.random() < 0.1 else float(rng.integers(-500, 5000))
+                              for metric in ('revenue', 'ebit')}
+                    codes = {metric: None if rng.random() < 0.05 else int(rng.choice([10, 11, 12]))
+                             for metric in ('revenue', 'ebit')}
+                    records.append((ticker, year * 100 + month, values, codes))
+        df = statements_csv(records)
+        df.columns = df.columns.str.lower()
+        table = quarterly_table(df, ['revenue', 'ebit'])
+
+        for metric in ('revenue', 'ebit'):
+            expected = previous_importer(df, metric)
+            computed = {
+                (ticker, day.year * 100 + day.month): value
+                for (ticker, day), value in table[metric].dropna().items()
+            }
+            self.assertEqual(computed.keys(), expected.keys())
+            for key, value in expected.items():
+                self.assertAlmostEqual(computed[key], value, places=6)
+
+    def test_import_upserts_in_bulk(self):
+        df = statements_csv([
+            (ticker, month, {'revenue': 100 * (i + 1), 'equity': 10.555}, {'revenue': 10, 'equity': 10})
+            for ticker in ['AAA', 'BBB', 'ZZZ'] for i, month in enumerate([202303, 202306, 202309])
+        ])
+        with TemporaryDirectory() as folder:
+            path = Path(folder) / 'statements.csv'
+            df.to_csv(path, index=False)
+            out = StringIO()
+            with self.assertNumQueries(10):
+                # Exchange, securities, then per chunk of 4: stored rows, and the insert within a savepoint
+                # Read 4 rows at a time, an odd size would split value and code rows
+                call_command('process_data', exchange='scl', file=str(path), batch_size=4, chunk_size=3, stdout=out)
+            self.assertIn('Imported 9 quarters from 18 rows', out.getvalue())
+            self.assertIn('6 created, 0 updated, 0 rejected', out.getvalue())
+            self.assertIn('1 tickers skipped', out.getvalue())
+
+            df.loc[0, 'Revenue'] = 999
+            df.to_csv(path, index=False)
+            call_command('process_data', exchange='SCL', file=str(path), stdout=out)
+            self.assertIn('0 created, 6 updated', out.getvalue())
+
+        self.assertEqual(FinancialData.objects.count(), 6)
+        row = FinancialData.objects.get(security__ticker='AAA', date=date(2023, 3, 1))
+        self.assertEqual(row.revenue, Decimal('999.00'))
+        self.assertEqual(row.equity, Decimal('10.56'))
+
+    def test_import_keeps_one_row_per_key(self):
+        aaa = Security.objects.get(ticker='AAA')
+        FinancialData.objects.create(security=aaa, date=date(2023, 3, 1), revenue=Decimal(1))
+        table = pd.DataFrame(
+            {'revenue': [5.0]}, index=pd.MultiIndex.from_tuples([('AAA', pd.Timestamp(2023, 3, 1))], names=['ticker', 'date'])
+        )
+        result = import_financial_data(table, self.exchange)
+
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        self.assertEqual(FinancialData.objects.get(security=aaa).revenue, Decimal(5))
@@ -0,0 +1,158 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Lock, Thread
+import time
+
+import requests
+from django.test import SimpleTestCase
+
+from finriv.utils.http_downloads import (
+    DOWNLOADED, FAILED, NOT_MODIFIED, UNCHANGED, ConcurrentDownloader, HttpDocumentCache, build_session,
+    get_http_cache
+)
+
+BODY = bytes(range(256)) * 1024
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    lock = Lock()
+    active = 0
+    peak = 0
+    bodies_sent = 0
+    version = 'v1'
+
+    def do_GET(self):
+        if self.path.startswith('/missing'):
+            self.send_error(404)
+            return
+        if self.path.startswith('/tagged'):
+            # ETag of the current version, 304 when the client already has it
+            etag = f'"{self.version}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_body(self.version.encode(), {'ETag': etag, 'Last-Modified': 'Mon, 02 Sep 2024 10:00:00 GMT'})
+            return
+        if self.path.startswith('/plain'):
+            # No validators, every request returns the whole document
+            self.send_body(self.version.encode(), {})
+            return
+        with self.lock:
+            FileHandler.active += 1
+            FileHandler.peak = max(FileHandler.peak, FileHandler.active)
+        time.sleep(0.05)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+        with self.lock:
+            FileHandler.active -= 1
+
+    def send_body(self, body, headers):
+        with self.lock:
+            FileHandler.bodies_sent += 1
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConcurrentDownloaderTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        FileHandler.peak = 0
+        FileHandler.bodies_sent = 0
+        FileHandler.version = 'v1'
+
+    def test_downloads_are_streamed_within_the_host_limit(self):
+        downloader = ConcurrentDownloader(build_session(retries=0), max_workers=6, per_host=2)
+        with TemporaryDirectory() as folder:
+            jobs = [(f'{self.base_url}/file/{i}', Path(folder) / 'reports' / f'{i}.pdf') for i in range(8)]
+            jobs.append((f'{self.base_url}/missing', Path(folder) / 'missing.pdf'))
+            statuses = downloader.download_all(jobs)
+
+            self.assertEqual(sum(status == DOWNLOADED for status in statuses.values()), 8)
+            self.assertEqual(statuses[Path(folder) / 'missing.pdf'], FAILED)
+            self.assertEqual((Path(folder) / 'reports' / '3.pdf').read_bytes(), BODY)
+            self.assertEqual(list(Path(folder).rglob('*.part')), [])
+        self.assertEqual(FileHandler.peak, 2)
+
+    def test_pages_are_fetched_concurrently(self):
+        # Timing is reported by `manage.py benchmark_scraping`, here the server counts overlapping requests
+        downloader = ConcurrentDownloader(build_session(retries=0), max_workers=4, per_host=4)
+        sizes = downloader.map(lambda i: len(downloader.get(f'{self.base_url}/page/{i}').content), range(8))
+
+        self.assertEqual(sizes, [len(BODY)] * 8)
+        self.assertGreater(FileHandler.peak, 1)
+        self.assertLessEqual(FileHandler.peak, 4)
+
+    def test_conditional_requests_skip_unchanged_documents(self):
+        with TemporaryDirectory() as folder:
+            cache_path = Path(folder) / 'http_cache.json'
+            jobs = [(f'{self.base_url}/tagged/list', Path(folder) / 'list.pdf'),
+                    (f'{self.base_url}/plain/list', Path(folder) / 'plain.pdf')]
+
+            def fetch():
+                downloader = ConcurrentDownloader(build_session(retries=0), cache=HttpDocumentCache(cache_path))
+                statuses = downloader.download_all(jobs)
+                return [statuses[path] for _, path in jobs]
+
+            self.assertEqual(fetch(), [DOWNLOADED, DOWNLOADED])
+            # A new run reads the validators back from disk
+            self.assertEqual(fetch(), [NOT_MODIFIED, UNCHANGED])
+            self.assertEqual(FileHandler.bodies_sent, 3)
+
+            FileHandler.version = 'v2'
+            self.assertEqual(fetch(), [DOWNLOADED, DOWNLOADED])
+            self.assertEqual((Path(folder) / 'list.pdf').read_bytes(), b'v2')
+            self.assertEqual(HttpDocumentCache(cache_path).get(jobs[0][0])['etag'], '"v2"')
+
+            # Without the document on disk the request is not conditional
+            (Path(folder) / 'list.pdf').unlink()
+            self.assertEqual(fetch()[0], DOWNLOADED)
+            self.assertEqual(list(Path(folder).rglob('*.part')), [])
+
+
+class HttpDocumentCacheTests(SimpleTestCase):
+    """Several users of one cache file do not overwrite each other's entries."""
+
+    def test_saves_merge_with_the_file(self):
+        with TemporaryDirectory() as folder:
+            path = Path(folder) / 'http_cache.json'
+            first, second = HttpDocumentCache(path), HttpDocumentCache(path)
+            response = requests.Response()
+            response.headers['ETag'] = '"v1"'
+
+            first.record('http://cmf/a', Path(folder) / 'a.pdf', response, 'aa')
+            second.record('http://cmf/b', Path(folder) / 'b.pdf', response, 'bb')
+            first.save()
+            second.save()
+
+            saved = HttpDocumentCache(path)
+            self.assertEqual((saved.get('http://cmf/a')['sha256'], saved.get('http://cmf/b')['sha256']), ('aa', 'bb'))
+            self.assertIsNotNone(second.get('http://cmf/a'))
+
+    def test_one_instance_per_file(self):
+        with TemporaryDirectory() as folder:
+            self.assertIs(get_http_cache(Path(folder) / 'http_cache.json'),
+                          get_http_cache(Path(folder) / '.' / 'http_cache.json'))
@@ -0,0 +1,54 @@
+from datetime import date, time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.more_views.index import build_market_snapshot, get_market_snapshot
+from fin_data_cl.utils import trading_calendar
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MarketSnapshotTests(TestCase):
+    """Dashboard breadth and movers computed from a single windowed query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        closes = {
+            'UP': ('100', '110'),
+            'DOWN': ('100', '95'),
+            'FLAT': ('50', '50'),
+            'NEW': (None, '20'),
+        }
+        for ticker, (previous, latest) in closes.items():
+            security = Security.objects.create(ticker=ticker, exchange=exchange, name=ticker)
+            if previous is not None:
+                PriceData.objects.create(security=security, date=date(2024, 5, 2),
+                                         close_price=Decimal(previous))
+            PriceData.objects.create(security=security, date=date(2024, 5, 3),
+                                     close_price=Decimal(latest))
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+
+    def test_breadth_and_movers(self):
+        snapshot = build_market_snapshot(date(2024, 5, 3), 'D')
+
+        self.assertEqual(snapshot['previous_date'], date(2024, 5, 2))
+        breadth = snapshot['market_breadth']
+        self.assertEqual((breadth['gainers'], breadth['losers'], breadth['unchanged']), (1, 1, 2))
+        self.assertEqual(snapshot['top_gainers'][0], {'symbol': 'UP', 'change': '+10.00%', 'price': '$110.00'})
+        self.assertEqual(snapshot['bottom_performers'][0], {'symbol': 'DOWN', 'change': '-5.00%', 'price': '$95.00'})
+
+    def test_cached_snapshot_needs_no_queries(self):
+        get_market_snapshot(date(2024, 5, 3), 'D')
+        with self.assertNumQueries(0):
+            get_market_snapshot(date(2024, 5, 3), 'D')
@@ -0,0 +1,93 @@
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.utils import trading_calendar
+from portfolios.models import Portfolio, Position, PortfolioRebalanceHistory
+from portfolios.utils.optimizer import get_exchange_covariance, ledoit_wolf, optimize_weights, project_to_simplex
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+EXPECTED_RETURNS = np.array([0.05, 0.10, 0.20])
+COVARIANCE = np.diag([0.1, 0.2, 0.4]) ** 2
+
+
+class OptimizerTests(SimpleTestCase):
+
+    def test_projection_onto_simplex(self):
+        np.testing.assert_allclose(project_to_simplex(np.array([0.5, 0.5, 0.5])), [1 / 3] * 3)
+        np.testing.assert_allclose(project_to_simplex(np.array([2.0, 0.0, -1.0])), [1.0, 0.0, 0.0])
+
+    def test_shrinkage_grows_with_fewer_observations(self):
+        rng = np.random.default_rng(1)
+        mixing = rng.normal(size=(10, 10))
+        few = ledoit_wolf(rng.normal(size=(20, 10)) @ mixing)[1]
+        many = ledoit_wolf(rng.normal(size=(2000, 10)) @ mixing)[1]
+        self.assertGreater(few, many)
+        # Uncorrelated returns of equal variance are shrunk all the way to the identity
+        self.assertEqual(ledoit_wolf(rng.normal(size=(2000, 10)))[1], 1.0)
+
+    def test_targets_are_met_on_the_frontier(self):
+        minimum_variance = optimize_weights(EXPECTED_RETURNS, COVARIANCE)
+        # Inverse-variance weights
+        np.testing.assert_allclose(minimum_variance, [16 / 21, 4 / 21, 1 / 21], atol=1e-4)
+
+        weights = optimize_weights(EXPECTED_RETURNS, COVARIANCE, target_risk=0.15)
+        self.assertAlmostEqual(np.sqrt(weights @ COVARIANCE @ weights), 0.15, places=4)
+        self.assertAlmostEqual(weights.sum(), 1.0)
+        self.assertTrue((weights >= 0).all())
+
+        weights = optimize_weights(EXPECTED_RETURNS, COVARIANCE, target_return=0.12)
+        self.assertAlmostEqual(weights @ EXPECTED_RETURNS, 0.12, places=4)
+
+        # Unreachable return, the best the frontier offers
+        np.testing.assert_allclose(optimize_weights(EXPECTED_RETURNS, COVARIANCE, target_return=0.5), [0, 0, 1])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProposalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.exchange = exchange
+        cls.user = User.objects.create_user('investor', 'investor@example.com')
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='Growth', target_risk=Decimal('0.2'))
+        rng = np.random.default_rng(2)
+        for ticker, volatility in [('AAA', 0.005), ('BBB', 0.02), ('CCC', 0.03)]:
+            security = Security.objects.create(ticker=ticker, exchange=exchange, name=ticker)
+            closes = 100 * np.exp(np.cumsum(rng.normal(0.0005, volatility, 120)))
+            PriceData.objects.bulk_create([
+                PriceData(security=security, date=date(2024, 1, 1) + timedelta(days=day), close_price=Decimal(f'{close:.2f}'))
+                for day, close in enumerate(closes)
+            ])
+            Position.objects.create(portfolio=cls.portfolio, security=security, shares=10, average_price=Decimal(100))
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+
+    def test_proposal_is_stored(self):
+        self.client.force_login(self.user)
+        response = self.client.post(f'/portfolios/api/portfolios/{self.portfolio.id}/optimize/')
+
+        self.assertEqual(response.status_code, 201)
+        proposal = PortfolioRebalanceHistory.objects.get(portfolio=self.portfolio)
+        self.assertEqual(proposal.rebalance_type, 'optimization_proposal')
+        self.assertEqual(set(proposal.new_weights), {'AAA', 'BBB', 'CCC'})
+        self.assertAlmostEqual(sum(proposal.new_weights.values()), 1.0, places=4)
+        self.assertIn('target risk 20.00%', proposal.notes)
+
+    def test_exchange_estimate_is_shared(self):
+        get_exchange_covariance(self.exchange.id)
+        with self.assertNumQueries(0):
+            estimate = get_exchange_covariance(self.exchange.id)
+        self.assertEqual(estimate['covariance'].shape, (3, 3))
@@ -0,0 +1,87 @@
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, PriceData, DividendData
+from fin_data_cl.utils import trading_calendar
+from fin_data_cl.utils.price_matrix import PriceMatrix, forward_fill
+from portfolios.models import Portfolio, Position
+from portfolios.utils.analytics import compute_metrics, weighted_returns
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class MetricTests(SimpleTestCase):
+
+    def test_metrics_of_a_known_series(self):
+        returns = np.array([0.1, -0.5, 0.2, np.nan])
+        metrics = compute_metrics(returns, benchmark=returns / 2, risk_free_rate=0.0)
+
+        self.assertEqual(metrics['observations'], 3)
+        self.assertAlmostEqual(metrics['time_weighted_return'], 1.1 * 0.5 * 1.2 - 1)
+        self.assertAlmostEqual(metrics['max_drawdown'], -0.5)
+        self.assertAlmostEqual(metrics['beta'], 2.0)
+
+    def test_weighted_returns_ignore_new_listings(self):
+        closes = forward_fill(np.array([[10.0, np.nan], [11.0, 50.0], [11.0, 55.0]]))
+        dividends = np.array([[0.0, 0.0], [0.0, 0.0], [1.0, 0.0]])
+        returns = weighted_returns(closes, dividends, np.array([10.0, 2.0]))
+
+        # Day 1: only the first security was priced the day before
+        np.testing.assert_allclose(returns, [0.1, (120 + 110) / 210 - 1])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PortfolioAnalyticsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.user = User.objects.create_user('investor', 'investor@example.com')
+        start = date(2024, 1, 1)
+        cls.aaa = Security.objects.create(ticker='AAA', exchange=exchange, name='AAA')
+        cls.bbb = Security.objects.create(ticker='BBB', exchange=exchange, name='BBB')
+        for day in range(30):
+            PriceData.objects.create(security=cls.aaa, date=start + timedelta(days=day), close_price=Decimal(100 + day))
+            if day % 3:
+                # Illiquid, does not trade every third day
+                PriceData.objects.create(security=cls.bbb, date=start + timedelta(days=day), close_price=Decimal(50 - day))
+        DividendData.objects.create(security=cls.bbb, date=start + timedelta(days=3), amount=Decimal(2), dividend_type=1)
+
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='Growth', target_risk=Decimal('0.15'))
+        Position.objects.create(portfolio=cls.portfolio, security=cls.aaa, shares=10, average_price=Decimal(100))
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+
+    def test_dividend_lands_on_next_traded_session(self):
+        matrix = PriceMatrix.load([self.aaa.id, self.bbb.id])
+        column = matrix.columns([self.bbb.id])[0]
+        self.assertEqual(matrix.dates[np.flatnonzero(matrix.dividends[:, column])[0]].item(), date(2024, 1, 5))
+
+    def test_analytics_endpoint_is_cached(self):
+        self.client.force_login(self.user)
+        url = f'/portfolios/api/portfolios/{self.portfolio.id}/analytics/?timeframe=1M'
+        data = self.client.get(url).json()
+
+        self.assertEqual(data['metrics']['observations'], 29)
+        self.assertAlmostEqual(data['metrics']['time_weighted_return'], 129 / 100 - 1)
+        self.assertEqual(data['metrics']['max_drawdown'], 0.0)
+        self.assertLess(data['metrics']['beta'], 1)
+        self.assertEqual(data['target_risk'], 0.15)
+        self.assertEqual(len(data['series']['dates']), 29)
+
+        # session, user, then the portfolio with its prefetched positions
+        with self.assertNumQueries(6):
+            self.client.get(url)
+
+        self.assertEqual(self.client.get(url.replace('1M', '2D')).status_code, 400)
+        self.assertEqual(self.client.get(url + '&exchange=abc').status_code, 400)
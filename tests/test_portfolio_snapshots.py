@@ -0,0 +1,79 @@
+from datetime import date, time
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.utils import trading_calendar
+from portfolios.models import Portfolio, Position, PortfolioSnapshot
+from portfolios.utils.snapshots import build_snapshots, snapshot_portfolios
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PortfolioSnapshotTests(TestCase):
+    """Daily snapshots of every portfolio, written with one upsert."""
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.user = User.objects.create_user('investor', 'investor@example.com')
+        aaa = Security.objects.create(ticker='AAA', exchange=exchange, name='AAA')
+        bbb = Security.objects.create(ticker='BBB', exchange=exchange, name='BBB')
+        for day, close in [(date(2024, 1, 2), 10), (date(2024, 1, 3), 11)]:
+            PriceData.objects.create(security=aaa, date=day, close_price=Decimal(close))
+        # BBB does not trade on the 3rd, its last close is carried
+        PriceData.objects.create(security=bbb, date=date(2024, 1, 2), close_price=Decimal(20))
+
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='Growth')
+        Position.objects.create(portfolio=cls.portfolio, security=aaa, shares=10, average_price=Decimal(8))
+        Position.objects.create(portfolio=cls.portfolio, security=bbb, shares=5, average_price=Decimal(20))
+        cls.empty = Portfolio.objects.create(user=cls.user, name='Empty')
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+
+    def test_snapshots_use_closes_of_the_day(self):
+        self.assertEqual(snapshot_portfolios(date(2024, 1, 2)), 2)
+        call_command('snapshot_portfolios', stdout=StringIO())
+
+        first = PortfolioSnapshot.objects.get(portfolio=self.portfolio, date=date(2024, 1, 2))
+        latest = PortfolioSnapshot.objects.get(portfolio=self.portfolio, date=date(2024, 1, 3))
+        self.assertEqual(first.total_value, Decimal('200.00'))
+        self.assertEqual(latest.total_value, Decimal('210.00'))
+        self.assertEqual(latest.performance_metrics['daily_return'], 0.05)
+        self.assertEqual(latest.performance_metrics['unrealized_gain'], 30.0)
+        self.assertEqual(latest.positions[str(self.portfolio.positions.get(security__ticker='BBB').security_id)]['price'], 20.0)
+        self.assertEqual(PortfolioSnapshot.objects.get(portfolio=self.empty, date=date(2024, 1, 3)).total_value, 0)
+
+    def test_rerun_updates_in_place(self):
+        snapshot_portfolios(date(2024, 1, 3))
+        Position.objects.filter(portfolio=self.portfolio, security__ticker='AAA').update(shares=20)
+        snapshot_portfolios(date(2024, 1, 3))
+
+        snapshots = PortfolioSnapshot.objects.filter(portfolio=self.portfolio)
+        self.assertEqual(snapshots.count(), 1)
+        self.assertEqual(snapshots.get().total_value, Decimal('320.00'))
+
+    def test_build_for_selected_portfolios(self):
+        for portfolios in ([self.portfolio.id], [self.portfolio], Portfolio.objects.filter(pk=self.portfolio.pk)):
+            snapshots = build_snapshots(date(2024, 1, 3), portfolios)
+            self.assertEqual([snapshot.portfolio_id for snapshot in snapshots], [self.portfolio.id])
+            self.assertEqual(snapshots[0].total_value, Decimal('210.00'))
+
+    def test_history_endpoint(self):
+        snapshot_portfolios(date(2024, 1, 2))
+        snapshot_portfolios(date(2024, 1, 3))
+        self.client.force_login(self.user)
+
+        history = self.client.get(f'/portfolios/api/portfolios/{self.portfolio.id}/history/').json()
+        self.assertEqual([row['total_value'] for row in history], [200.0, 210.0])
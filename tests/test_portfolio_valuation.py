@@ -0,0 +1,82 @@
+from datetime import date, time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.utils import trading_calendar
+from portfolios.models import Portfolio, Position
+from portfolios.utils.valuation import LatestPriceSnapshot, value_portfolios
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PortfolioValuationTests(TestCase):
+    """Portfolios valued with one price query, however many positions they hold."""
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.user = User.objects.create_user('investor', 'investor@example.com')
+        securities = {}
+        for ticker, closes in {'AAA': [10, 12], 'BBB': [20, 25], 'CCC': [5]}.items():
+            security = Security.objects.create(ticker=ticker, exchange=exchange, name=ticker)
+            for day, close in zip([date(2024, 1, 2), date(2024, 1, 3)], closes):
+                PriceData.objects.create(security=security, date=day, close_price=Decimal(close))
+            securities[ticker] = security
+        # Delisted long ago, only found by the fallback query
+        securities['OLD'] = Security.objects.create(ticker='OLD', exchange=exchange, name='OLD')
+        PriceData.objects.create(security=securities['OLD'], date=date(2020, 1, 2), close_price=Decimal(7))
+        securities['NEW'] = Security.objects.create(ticker='NEW', exchange=exchange, name='NEW')
+        cls.securities = securities
+
+        cls.portfolios = []
+        for name, holdings in [('Growth', {'AAA': 10, 'BBB': 2, 'NEW': 5}), ('Income', {'CCC': 100, 'OLD': 1})]:
+            portfolio = Portfolio.objects.create(user=cls.user, name=name)
+            for ticker, shares in holdings.items():
+                Position.objects.create(
+                    portfolio=portfolio, security=securities[ticker],
+                    shares=Decimal(shares), average_price=Decimal(1)
+                )
+            cls.portfolios.append(portfolio)
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+
+    def test_latest_close_per_security(self):
+        snapshot = LatestPriceSnapshot.load(security.id for security in self.securities.values())
+
+        self.assertEqual(snapshot.price(self.securities['AAA'].id), Decimal(12))
+        self.assertEqual(snapshot.price(self.securities['CCC'].id), Decimal(5))
+        self.assertEqual(snapshot.price_date(self.securities['OLD'].id), date(2020, 1, 2))
+        self.assertIsNone(snapshot.price(self.securities['NEW'].id))
+
+    def test_values_and_unpriced_positions(self):
+        growth, income = self.portfolios
+        valuations = value_portfolios(Portfolio.objects.prefetch_related('positions'))
+
+        self.assertEqual(valuations[growth.id].total_value, 170.0)
+        self.assertEqual(valuations[income.id].total_value, 507.0)
+        unpriced = growth.positions.get(security__ticker='NEW')
+        self.assertIsNone(valuations[growth.id].current_value(unpriced.id))
+        self.assertEqual(growth.get_total_value(), 170.0)
+        self.assertEqual(self.securities['BBB'].get_latest_price(), Decimal(25))
+
+    def test_list_queries_do_not_grow_with_positions(self):
+        self.client.force_login(self.user)
+        trading_calendar.get_trading_calendar().load_sessions()
+        # session, user, count, portfolios, positions, securities, exchanges, latest prices, fallback prices
+        with self.assertNumQueries(9):
+            response = self.client.get('/portfolios/api/portfolios/')
+
+        results = response.json()['results']
+        self.assertEqual([row['total_value'] for row in results], [170.0, 507.0])
+        values = {row['security']['ticker']: row['current_value'] for row in results[0]['positions']}
+        self.assertEqual(values, {'AAA': 120.0, 'BBB': 50.0, 'NEW': None})
@@ -0,0 +1,64 @@
+import csv
+from datetime import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from fin_data_cl.models import Exchange, Security, SavedScreen, SavedScreenResult
+from management_commands.management.commands.migrate_to_postgre import copy_fields, copy_row, iter_dump, merge_order
+
+
+class CopyLoaderTests(TestCase):
+    """JSON Lines dump turned into COPY rows, without a PostgreSQL server."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.security = Security.objects.create(ticker='CAP', exchange=cls.exchange, name='CAP "Acero", S.A.')
+        user = User.objects.create(username='analyst')
+        cls.screen = SavedScreen.objects.create(user=user, name='Value', filters=['pe:<:10'], exchange=cls.exchange)
+
+    def test_dump_is_streamed_by_model(self):
+        with TemporaryDirectory() as folder:
+            path = Path(folder) / 'dump.jsonl'
+            call_command('dumpdata', 'fin_data_cl', format='jsonl', output=str(path))
+            groups = {label: list(records) for label, records in iter_dump(path)}
+
+        self.assertEqual(len(groups['fin_data_cl.security']), 1)
+        record = groups['fin_data_cl.security'][0]
+        fields = copy_fields(Security)
+        line = copy_row(record, fields)
+        values = dict(zip([field.column for field in fields], next(csv.reader([line]))))
+
+        self.assertEqual(values['id'], str(self.security.pk))
+        self.assertEqual(values['exchange_id'], str(self.exchange.pk))
+        self.assertEqual(values['name'], 'CAP "Acero", S.A.')
+        self.assertEqual(values['is_active'], 'true')
+
+        screen = groups['fin_data_cl.savedscreen'][0]
+        fields = copy_fields(SavedScreen)
+        values = dict(zip([field.column for field in fields], next(csv.reader([copy_row(screen, fields)]))))
+        self.assertEqual(values['filters'], '["pe:<:10"]')
+
+    def test_nulls_are_unquoted(self):
+        fields = copy_fields(Exchange)
+        record = {'pk': 3, 'fields': {field.name: None for field in fields[1:]}}
+        record['fields']['code'] = ''
+        line = copy_row(record, fields)
+
+        expected = ['"3"'] + ['""' if field.name == 'code' else '' for field in fields[1:]]
+        self.assertEqual(line, ','.join(expected) + '\n')
+
+    def test_foreign_key_targets_first(self):
+        order = merge_order([SavedScreenResult, Security, SavedScreen, Exchange])
+
+        self.assertLess(order.index(Exchange), order.index(Security))
+        self.assertLess(order.index(Security), order.index(SavedScreenResult))
+        self.assertLess(order.index(SavedScreen), order.index(SavedScreenResult))
+        self.assertEqual(len(order), 4)
@@ -0,0 +1,107 @@
+from datetime import date, time
+from io import StringIO
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, FinancialRatio, SavedScreen, SavedScreenEvent
+from fin_data_cl.utils import screener_engine
+from fin_data_cl.utils.saved_screens import finish_ratio_run, reset_screen_results
+from fin_data_cl.utils.screener_engine import RATIO_DATA_VERSION, get_ratio_snapshot
+from finriv.utils.cache import get_version
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SavedScreenTests(TestCase):
+    """Saved screen results maintained incrementally after ratio runs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.securities = {}
+        for ticker, pe in {'AAA': '8', 'BBB': '12', 'CCC': '20'}.items():
+            security = Security.objects.create(ticker=ticker, exchange=exchange, name=ticker)
+            FinancialRatio.objects.create(security=security, date=date(2024, 3, 31), pe_ratio=Decimal(pe))
+            cls.securities[ticker] = security
+        cls.user = User.objects.create_user('investor', 'investor@example.com')
+
+    def setUp(self):
+        cache.clear()
+        screener_engine._snapshot = None
+        self.screen = SavedScreen.objects.create(user=self.user, name='Cheap', filters=['pe_ratio:lt:10'], notify=True)
+        reset_screen_results(self.screen)
+
+    def result_tickers(self, screen):
+        return sorted(screen.results.values_list('security__ticker', flat=True))
+
+    def run_ratios(self, new_pe):
+        """Store new ratios the way a ratio run does, then publish them."""
+        previous_version = get_version(RATIO_DATA_VERSION)
+        previous = get_ratio_snapshot()
+        for ticker, pe in new_pe.items():
+            FinancialRatio.objects.create(
+                security=self.securities[ticker], date=date(2024, 6, 30), pe_ratio=Decimal(pe)
+            )
+        return finish_ratio_run(previous, previous_version)
+
+    def test_only_changed_securities_are_reevaluated(self):
+        self.assertEqual(self.result_tickers(self.screen), ['AAA'])
+
+        stats = self.run_ratios({'AAA': '15', 'BBB': '9', 'CCC': '20'})
+
+        self.assertEqual(stats['changed_securities'], 2)
+        self.assertEqual(self.result_tickers(self.screen), ['BBB'])
+        events = {(event.security.ticker, event.event_type) for event in self.screen.events.all()}
+        self.assertEqual(events, {('BBB', SavedScreenEvent.ENTRY), ('AAA', SavedScreenEvent.EXIT)})
+
+    def test_relative_screens_are_reevaluated_in_full(self):
+        relative = SavedScreen.objects.create(user=self.user, name='Top', filters=['pe_ratio:top:1'])
+        reset_screen_results(relative)
+        self.assertEqual(self.result_tickers(relative), ['CCC'])
+
+        # CCC is unchanged but no longer the highest of its exchange
+        self.run_ratios({'BBB': '30'})
+        self.assertEqual(self.result_tickers(relative), ['BBB'])
+
+    def test_digest_reports_new_entries_once(self):
+        self.run_ratios({'BBB': '9'})
+
+        call_command('send_screen_digest', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Cheap: BBB.SN', mail.outbox[0].body)
+
+        call_command('send_screen_digest', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_digest_skips_users_without_email(self):
+        self.user.email = ''
+        self.user.save()
+        self.run_ratios({'BBB': '9'})
+
+        call_command('send_screen_digest', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(SavedScreenEvent.objects.filter(notified=False, event_type=SavedScreenEvent.ENTRY).exists())
+
+    def test_screens_are_scoped_to_their_user(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/api/v1/saved-screens/', {
+            'name': 'Expensive', 'filters': ['pe_ratio:gt:15']
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['result_count'], 1)
+
+        results = self.client.get(f"/api/v1/saved-screens/{response.json()['id']}/results/").json()
+        self.assertEqual([row['ticker'] for row in results], ['CCC'])
+
+        other = User.objects.create_user('other', 'other@example.com')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get('/api/v1/saved-screens/').json()['count'], 0)
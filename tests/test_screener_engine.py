@@ -0,0 +1,113 @@
+import json
+from datetime import date, time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, FinancialRatio
+from fin_data_cl.utils import screener_engine
+from fin_data_cl.utils.screener_engine import get_ratio_snapshot, invalidate_ratio_snapshot, parse_filters
+from fin_data_cl.views import ScreenerService, filter_ratios
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ScreenerEngineTests(TestCase):
+    """Vectorized screening over the latest ratio of every security."""
+
+    @classmethod
+    def setUpTestData(cls):
+        santiago = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        new_york = Exchange.objects.create(
+            code='NYSE', name='New York Stock Exchange', timezone='America/New_York',
+            suffix='NYQ', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.santiago = santiago
+        # ticker: (exchange, old pe, latest pe, latest dividend yield)
+        ratios = {
+            'AAA': (santiago, '30', '8', '5'),
+            'BBB': (santiago, '5', '12', None),
+            'CCC': (santiago, '9', None, '2'),
+            'DDD': (new_york, '6', '6', '7'),
+        }
+        for ticker, (exchange, old_pe, pe, dividend_yield) in ratios.items():
+            security = Security.objects.create(ticker=ticker, exchange=exchange, name=ticker)
+            FinancialRatio.objects.create(security=security, date=date(2023, 12, 31), pe_ratio=Decimal(old_pe))
+            FinancialRatio.objects.create(
+                security=security, date=date(2024, 3, 31), price=Decimal('100'),
+                pe_ratio=pe and Decimal(pe), dividend_yield=dividend_yield and Decimal(dividend_yield)
+            )
+
+    def setUp(self):
+        cache.clear()
+        screener_engine._snapshot = None
+
+    def test_filters_apply_to_latest_ratios_only(self):
+        results = ScreenerService.get_filtered_ratios(['pe_ratio:lt:10'])
+        self.assertEqual(sorted(row['ticker'] for row in results), ['AAA', 'DDD'])
+
+        aaa = next(row for row in results if row['ticker'] == 'AAA')
+        self.assertEqual(aaa['date'], date(2024, 3, 31))
+        self.assertEqual(aaa['full_symbol'], 'AAA.SN')
+        self.assertEqual(aaa['pe_ratio'], 8.0)
+
+    def test_sort_rank_and_top_n(self):
+        results = ScreenerService.get_filtered_ratios(
+            [], exchange_id=self.santiago.id, sort_by='dividend_yield', descending=True, limit=2
+        )
+        self.assertEqual([(row['ticker'], row['rank']) for row in results], [('AAA', 2), ('CCC', 3)])
+
+    def test_exchange_relative_filters(self):
+        def tickers(*filters):
+            return sorted(row['ticker'] for row in ScreenerService.get_filtered_ratios(list(filters)))
+
+        self.assertEqual(tickers('pe_ratio:pct_lte:50'), ['AAA'])
+        self.assertEqual(tickers('pe_ratio:pct_gte:50'), ['BBB'])
+        self.assertEqual(tickers('pe_ratio:top:1'), ['BBB', 'DDD'])
+        self.assertEqual(tickers('pe_ratio:bottom:1'), ['AAA', 'DDD'])
+        # Single-member exchanges have no spread, so no z-score
+        self.assertEqual(tickers('dividend_yield:z_gt:0.5'), ['AAA'])
+        self.assertEqual(tickers('dividend_yield:z_lt:-0.5', 'pe_ratio:lt:100'), [])
+
+    def test_invalid_filters_are_ignored(self):
+        self.assertEqual(parse_filters(['pe_ratio:lt:x', 'price:gt:1', 'pe_ratio:eq:1', 'pe_ratio:gt:1']),
+                         [('pe_ratio', 'gt', 1.0)])
+
+    def test_snapshot_reloads_after_ratio_run(self):
+        self.assertEqual(len(get_ratio_snapshot()), 4)
+        with self.assertNumQueries(0):
+            get_ratio_snapshot()
+
+        FinancialRatio.objects.filter(security__ticker='DDD').delete()
+        invalidate_ratio_snapshot()
+        self.assertEqual(len(get_ratio_snapshot()), 3)
+
+    def test_screen_endpoint(self):
+        response = self.client.get('/api/v1/financial-ratios/screen/', {
+            'filters[]': ['dividend_yield:gte:1'], 'sort': 'pe_ratio', 'limit': '5'
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row['security']['ticker'] for row in data], ['DDD', 'AAA', 'CCC'])
+        self.assertEqual([row['rank'] for row in data], [1, 2, 0])
+
+    def test_screen_endpoint_validates_parameters(self):
+        url = '/api/v1/financial-ratios/screen/'
+        self.assertEqual(self.client.get(url, {'exchange_id': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'limit': '0'}).status_code, 400)
+        self.assertEqual(len(self.client.get(url, {'exchange_id': str(self.santiago.id)}).json()), 3)
+        self.assertEqual(ScreenerService.get_filtered_ratios([], limit=0), [])
+
+    def test_filter_ratios_validates_parameters(self):
+        # Same checks as the screen action
+        factory = RequestFactory()
+        for params in ({'limit': '0'}, {'limit': '-1'}, {'limit': 'abc'}, {'exchange_id': 'abc'}):
+            self.assertEqual(filter_ratios(factory.get('/', params)).status_code, 400)
+        response = filter_ratios(factory.get('/', {'limit': '2'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)), 2)
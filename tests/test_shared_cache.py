@@ -0,0 +1,57 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from finriv.utils.cache import get_or_compute
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class GetOrComputeTests(SimpleTestCase):
+    """Stampede protection of the shared cache helper."""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def slow_compute(self):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return {'value': 42}
+
+    def test_cold_miss_is_computed_once(self):
+        """Concurrent misses on the same key are coalesced into one computation."""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute('k', self.slow_compute, 300)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{'value': 42}] * 8)
+
+    def test_expired_value_refreshed_by_single_worker(self):
+        """An expired entry is recomputed once while others keep the stale copy."""
+        cache.set('k', ('stale', 0.0, time.time() - 1), 600)
+        cache.add('k:lock', 1, 60)  # another worker is already refreshing
+
+        self.assertEqual(get_or_compute('k', self.slow_compute, 300), 'stale')
+        self.assertEqual(self.calls, 0)
+
+        cache.delete('k:lock')
+        self.assertEqual(get_or_compute('k', self.slow_compute, 300), {'value': 42})
+        self.assertEqual(self.calls, 1)
+
+    def test_fresh_value_is_served_from_cache(self):
+        get_or_compute('k', self.slow_compute, 300)
+        get_or_compute('k', self.slow_compute, 300)
+        self.assertEqual(self.calls, 1)
@@ -0,0 +1,77 @@
+import json
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.utils import trading_calendar
+from price_plots.plot_prices import StockVisualizer, moving_average
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class MovingAverageTests(SimpleTestCase):
+
+    def test_matches_pandas_rolling_mean(self):
+        values = np.random.default_rng(0).normal(100, 5, 300)
+        for period in (1, 20, 50, 200):
+            expected = pd.Series(values).rolling(window=period).mean().to_numpy()
+            np.testing.assert_allclose(moving_average(values, period), expected)
+
+    def test_period_longer_than_data(self):
+        self.assertTrue(np.isnan(moving_average(np.arange(5.0), 10)).all())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StockFigureTests(TestCase):
+    """Lean JSON rendering of the candlestick figure."""
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.security = Security.objects.create(ticker='AAA', exchange=exchange, name='AAA')
+        start = date(2024, 1, 1)
+        for day in range(60):
+            close = Decimal(100 + (day % 7) - 3)
+            PriceData.objects.create(
+                security=cls.security, date=start + timedelta(days=day),
+                open_price=Decimal(100), high_price=close + 2, low_price=close - 2,
+                close_price=close, volume=1000 + day
+            )
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+
+    def test_json_figure_has_volume_colours_and_overlays(self):
+        visualizer = StockVisualizer(self.security)
+        self.assertTrue(visualizer.load_data(date(2024, 1, 1), date(2024, 3, 31)))
+
+        figure = json.loads(visualizer.to_json(ma_periods=[20]))
+        traces = {trace['name']: trace for trace in figure['data']}
+
+        self.assertEqual(set(traces), {'OHLC', 'Volume', '20MA'})
+        closes = visualizer.price_data['close_price'].to_numpy()
+        expected_colours = np.where(closes < 100, 'red', 'green').tolist()
+        self.assertEqual(traces['Volume']['marker']['color'], expected_colours)
+
+    def test_figure_endpoint_is_cached(self):
+        url = '/api/v1/price-data/figure/?ticker=AAA&timeframe=Max&ma=20'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        with self.assertNumQueries(1):  # the security lookup only
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, response.content)
+
+    def test_unknown_ticker(self):
+        response = self.client.get('/api/v1/price-data/figure/?ticker=ZZZ')
+        self.assertEqual(response.status_code, 404)
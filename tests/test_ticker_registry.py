@@ -0,0 +1,58 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import os
+
+from django.test import SimpleTestCase
+
+from finriv.utils.ticker_registry import TickerRecord, TickerRegistry, get_registry
+
+REGISTERED = (
+    'Ticker,RUT,Name\n'
+    'ANDINA-A,91144000-8,EMBOTELLADORA ANDINA S.A.\n'
+    'ANDINA-B,91144000-8,EMBOTELLADORA ANDINA S.A.\n'
+    'CAP,91297000-0,CAP S.A.\n'
+)
+
+
+class TickerRegistryTests(SimpleTestCase):
+    """Registered tickers kept in memory until the file changes."""
+
+    def setUp(self):
+        self.folder = TemporaryDirectory()
+        self.path = Path(self.folder.name) / 'registered_stocks.csv'
+        self.path.write_text(REGISTERED)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_lookups(self):
+        registry = TickerRegistry(self.path)
+
+        self.assertEqual(registry.get('CAP').name, 'CAP S.A.')
+        self.assertIsNone(registry.get('SQM-B'))
+        self.assertEqual([record.ticker for record in registry.by_rut('91.144.000-8')], ['ANDINA-A', 'ANDINA-B'])
+        self.assertEqual([record.ticker for record in registry.by_rut('91144000')], ['ANDINA-A', 'ANDINA-B'])
+        self.assertEqual(registry.dataframe()['Ticker'].tolist(), ['ANDINA-A', 'ANDINA-B', 'CAP'])
+        with self.assertRaises(AttributeError):
+            registry.get('CAP').sector = 'Mining'
+
+    def test_file_is_read_again_only_when_it_changes(self):
+        registry = TickerRegistry(self.path)
+        cap = registry.get('CAP')
+        frame = registry.dataframe()
+        frame.loc[0, 'Ticker'] = 'CHANGED'
+        self.assertIs(registry.get('CAP'), cap)
+        self.assertEqual(registry.dataframe().loc[0, 'Ticker'], 'ANDINA-A')
+
+        self.path.write_text(REGISTERED + 'SQM-B,93007000-9,SOCIEDAD QUIMICA Y MINERA DE CHILE S.A.\n')
+        stat = self.path.stat()
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(registry.get('SQM-B').rut, '93007000-9')
+        self.assertIsNot(registry.get('CAP'), cap)
+
+        self.path.unlink()
+        self.assertEqual(registry.all(), [])
+
+    def test_registry_is_shared_per_file(self):
+        self.assertIs(get_registry(self.path), get_registry(Path(str(self.path))))
+        self.assertIsInstance(get_registry(self.path).get('CAP'), TickerRecord)
@@ -0,0 +1,106 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from fin_data_cl.models import Exchange, Security, PriceData
+from fin_data_cl.utils import trading_calendar
+from fin_data_cl.utils.trading_calendar import TradingCalendar, get_trading_calendar, invalidate_trading_calendars
+from finriv.utils.exchanges import ExchangeRegistry
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+SESSIONS = [date(2024, 5, 2), date(2024, 5, 3), date(2024, 5, 6), date(2024, 5, 7)]
+
+
+class TradingCalendarLookupTests(SimpleTestCase):
+    """Binary-search lookups over the sorted sessions."""
+
+    def setUp(self):
+        self.calendar = TradingCalendar(SESSIONS)
+
+    def test_session_lookups(self):
+        self.assertEqual(self.calendar.session_on_or_before(date(2024, 5, 5)), date(2024, 5, 3))
+        self.assertEqual(self.calendar.session_on_or_before(date(2024, 5, 6)), date(2024, 5, 6))
+        self.assertIsNone(self.calendar.session_on_or_before(date(2024, 5, 1)))
+        self.assertEqual(self.calendar.previous_session(date(2024, 5, 6)), date(2024, 5, 3))
+        self.assertEqual(self.calendar.sessions_back(date(2024, 5, 7), 3), date(2024, 5, 2))
+        self.assertIsNone(self.calendar.sessions_back(date(2024, 5, 7), 4))
+        self.assertEqual(self.calendar.window_start(date(2024, 5, 7), 2), date(2024, 5, 6))
+        self.assertEqual(self.calendar.sessions_between(date(2024, 5, 3), date(2024, 5, 6)),
+                         [date(2024, 5, 3), date(2024, 5, 6)])
+
+    def test_latest_session_waits_for_market_close(self):
+        calendar = TradingCalendar(SESSIONS, ExchangeRegistry().get_exchange('SCL'))
+        santiago = ZoneInfo('America/Santiago')
+
+        during_session = datetime(2024, 5, 7, 12, 0, tzinfo=santiago)
+        after_close = datetime(2024, 5, 7, 17, 0, tzinfo=santiago)
+        self.assertEqual(calendar.latest_session(during_session), date(2024, 5, 6))
+        self.assertEqual(calendar.latest_session(after_close), date(2024, 5, 7))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SharedTradingCalendarTests(TestCase):
+    """Calendars are shared through the cache and rebuilt after a price ingest."""
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.security = Security.objects.create(ticker='AAA', exchange=exchange, name='AAA')
+        for day in SESSIONS[:2]:
+            PriceData.objects.create(security=cls.security, date=day, close_price=Decimal('10'))
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+
+    def test_calendar_is_memoized_until_invalidated(self):
+        self.assertEqual(get_trading_calendar('SCL').sessions, SESSIONS[:2])
+        with self.assertNumQueries(0):
+            get_trading_calendar('SCL')
+
+        PriceData.objects.create(security=self.security, date=SESSIONS[2], close_price=Decimal('11'))
+        self.assertEqual(len(get_trading_calendar('SCL')), 2)
+
+        invalidate_trading_calendars()
+        self.assertEqual(get_trading_calendar('SCL').sessions, SESSIONS[:3])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class LatestPricesTests(TestCase):
+    """The calendar sets the tolerance of /latest/, not the date of a filtered security."""
+
+    @classmethod
+    def setUpTestData(cls):
+        exchange = Exchange.objects.create(
+            code='SCL', name='Santiago Stock Exchange', timezone='America/Santiago',
+            suffix='SN', trading_start=time(9, 30), trading_end=time(16, 0)
+        )
+        cls.active = Security.objects.create(ticker='AAA', exchange=exchange, name='AAA')
+        cls.stale = Security.objects.create(ticker='BBB', exchange=exchange, name='BBB')
+        for day in SESSIONS:
+            PriceData.objects.create(security=cls.active, date=day, close_price=Decimal('10'))
+        PriceData.objects.create(security=cls.stale, date=SESSIONS[0], close_price=Decimal('20'))
+
+    def setUp(self):
+        cache.clear()
+        trading_calendar._calendars.clear()
+
+    def latest(self, **params):
+        return self.client.get('/api/v1/price-data/latest/', params).json()
+
+    def test_stale_security_keeps_its_last_row(self):
+        rows = self.latest(security=self.stale.pk)
+
+        self.assertEqual([(row['security']['ticker'], row['date']) for row in rows], [('BBB', '2024-05-02')])
+
+    def test_all_securities_within_one_session(self):
+        rows = self.latest()
+
+        self.assertEqual([(row['security']['ticker'], row['date']) for row in rows], [('AAA', '2024-05-07')])